@@ -0,0 +1,225 @@
+"""
+Benchmark de carga de la Lambda a escala de flota.
+
+Ejecuta el código real de la Lambda contra el backend simulado de
+simulated_aws.py (sin acceso a AWS) y mide por separado:
+  - discovery:  descubrimiento + plan (discover_target_plan)
+  - submission: envío de los backups del plan (run_target_backup)
+  - handler:    invocación completa de lambda_handler (contenedor frío)
+  - handler_warm: segunda invocación en el mismo contenedor (caché de
+    descubrimiento caliente)
+
+Para cada fase se informa del tiempo total, las llamadas API por operación y
+el pico de memoria (tracemalloc; desactivable con --no-memory porque añade
+sobrecarga al tiempo medido).
+
+Uso:
+    python benchmarks/fleet_benchmark.py --instances 5000 --clusters 200 --latency-ms 20
+    python benchmarks/fleet_benchmark.py --throttle-probability 0.05 --output fleet.json
+    python benchmarks/fleet_benchmark.py --baseline fleet.json --max-regression 0.2
+
+Con --baseline el script termina con código 1 si alguna fase empeora más que
+--max-regression (fracción) en tiempo, llamadas API o pico de memoria.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+PHASES = ('discovery', 'submission', 'handler', 'handler_warm')
+COMPARED_METRICS = ('wall_seconds', 'total_api_calls', 'peak_memory_mb')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark de la Lambda contra una flota simulada')
+    parser.add_argument('--instances', type=int, default=2000, help='Instancias RDS de la flota')
+    parser.add_argument('--clusters', type=int, default=100, help='Clusters de la flota (Aurora, DocumentDB y Neptune)')
+    parser.add_argument('--members-per-cluster', type=int, default=2)
+    parser.add_argument('--tag-density', type=float, default=0.5,
+                        help='Fracción de recursos con el tag de backup')
+    parser.add_argument('--latency-ms', type=float, default=10.0, help='Latencia simulada por llamada API')
+    parser.add_argument('--throttle-probability', type=float, default=0.0,
+                        help='Probabilidad de ThrottlingException en start_backup_job')
+    parser.add_argument('--job-seconds-per-gb', type=float, default=0.0,
+                        help='Duración simulada de cada backup job por GB (0 = instantáneo)')
+    parser.add_argument('--discovery-strategy', default='inline')
+    parser.add_argument('--submit-rate', type=float, default=500.0,
+                        help='BACKUP_SUBMIT_RATE usado en el benchmark (req/s)')
+    parser.add_argument('--workers', type=int, default=16, help='BACKUP_MAX_WORKERS usado en el benchmark')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='DISCOVERY_PIPELINE=true: el handler envía mientras descubre')
+    parser.add_argument('--result-sink', default='none', choices=('none', 'log', 'store'),
+                        help='RESULT_SINK usado en el benchmark (log imprime cada registro)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-memory', action='store_true', help='No medir el pico de memoria')
+    parser.add_argument('--output', help='Fichero JSON donde guardar el resultado')
+    parser.add_argument('--baseline', help='Resultado JSON de una versión anterior para comparar')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Empeoramiento máximo permitido por métrica (0.2 = 20%%)')
+    return parser.parse_args()
+
+def configure_env(args):
+    """
+    La configuración de la Lambda se lee al importar el módulo, así que el
+    entorno se prepara antes del import
+    """
+    os.environ.setdefault('BACKUP_ROLE_ARN', 'arn:aws:iam::123456789012:role/benchmark-backup-role')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    os.environ['DISCOVERY_STRATEGY'] = args.discovery_strategy
+    os.environ['BACKUP_SUBMIT_RATE'] = str(args.submit_rate)
+    os.environ['BACKUP_MAX_WORKERS'] = str(args.workers)
+    os.environ['RESULT_SINK'] = args.result_sink
+    os.environ['DISCOVERY_PIPELINE'] = 'true' if args.pipeline else 'false'
+    os.environ['TRACK_JOBS_SECONDS'] = '0'
+    os.environ['COORDINATOR_MODE'] = 'false'
+    os.environ.pop('TARGET_REGIONS', None)
+    os.environ.pop('TARGET_ROLE_ARNS', None)
+
+def measure(backend, fn, track_memory):
+    """
+    Ejecuta fn midiendo tiempo, llamadas al backend y pico de memoria. Lo
+    que la Lambda imprime (registros EMF y del sink 'log') se descarta
+    """
+    backend.reset_counters()
+    if track_memory:
+        tracemalloc.start()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - started
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    calls = dict(sorted(backend.calls.items()))
+    return result, {
+        'wall_seconds': round(wall, 3),
+        'api_calls': calls,
+        'total_api_calls': sum(calls.values()),
+        'peak_memory_mb': round(peak / (1024 * 1024), 2) if peak is not None else None
+    }
+
+def run_benchmark(args):
+    configure_env(args)
+    sys.path.insert(0, BENCHMARK_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import lambda_source
+    from simulated_aws import SimulatedAWS
+    from startup_benchmark import git_revision
+
+    # Los logs se generan (su coste forma parte de la medida) pero no se imprimen
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    backend = SimulatedAWS(
+        instances=args.instances,
+        clusters=args.clusters,
+        members_per_cluster=args.members_per_cluster,
+        tag_density=args.tag_density,
+        latency_ms=args.latency_ms,
+        throttle_probability=args.throttle_probability,
+        job_seconds_per_gb=args.job_seconds_per_gb,
+        seed=args.seed,
+        tag_key=lambda_source.BACKUP_TAG_KEY,
+        tag_value=lambda_source.BACKUP_TAG_VALUE
+    )
+    lambda_source.register_client_hook(backend.attach)
+    target = lambda_source.DEFAULT_TARGET
+    track_memory = not args.no_memory
+    phases = {}
+
+    (results, plan), phases['discovery'] = measure(
+        backend, lambda: lambda_source.discover_target_plan(target), track_memory
+    )
+    phases['discovery']['planned'] = len(lambda_source.plan_resources(plan))
+
+    results, phases['submission'] = measure(
+        backend,
+        lambda: lambda_source.run_target_backup(target, plan=plan, run_timestamp='benchmark-submission'),
+        track_memory
+    )
+    phases['submission']['successful'] = results['successful']
+    phases['submission']['failed'] = results['failed']
+    phases['submission']['throttled'] = results['submission']['throttled']
+    phases['submission']['final_rate'] = results['submission']['final_rate']
+
+    # Las fases anteriores ya llenaron la caché de descubrimiento
+    lambda_source.DISCOVERY_CACHE.clear()
+    response, phases['handler'] = measure(
+        backend, lambda: lambda_source.lambda_handler({}, None), track_memory
+    )
+    phases['handler']['status_code'] = response['statusCode']
+    phases['handler']['first_result_seconds'] = json.loads(response['body'])['submission']['first_result_seconds']
+    
+    response, phases['handler_warm'] = measure(
+        backend, lambda: lambda_source.lambda_handler({}, None), track_memory
+    )
+    phases['handler_warm']['status_code'] = response['statusCode']
+    phases['handler_warm']['discovery_cache'] = json.loads(response['body'])['discovery']['cache']
+
+    return {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'fleet': {
+            'instances': args.instances,
+            'clusters': args.clusters,
+            'tagged_resources': backend.tagged_resources(),
+            'tag_density': args.tag_density,
+            'latency_ms': args.latency_ms,
+            'throttle_probability': args.throttle_probability,
+            'job_seconds_per_gb': args.job_seconds_per_gb,
+            'discovery_strategy': args.discovery_strategy,
+            'pipeline': args.pipeline,
+            'submit_rate': args.submit_rate,
+            'result_sink': args.result_sink,
+            'workers': args.workers
+        },
+        'phases': phases
+    }
+
+def compare(baseline, result, max_regression):
+    """
+    Devuelve la lista de métricas que empeoran más de max_regression
+    """
+    regressions = []
+    for phase in PHASES:
+        for metric in COMPARED_METRICS:
+            before = baseline['phases'].get(phase, {}).get(metric)
+            after = result['phases'][phase].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            print(f"{phase}.{metric}: {before} -> {after} ({change:+.1%})")
+            if change > max_regression:
+                regressions.append(f"{phase}.{metric}")
+    return regressions
+
+def main():
+    args = parse_args()
+    result = run_benchmark(args)
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('fleet') != result['fleet']:
+            print("Aviso: la flota del baseline no coincide con la de esta ejecución", file=sys.stderr)
+        regressions = compare(baseline, result, args.max_regression)
+        if regressions:
+            print(f"Regresiones superiores al {args.max_regression:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+"""
+Backend simulado de RDS, AWS Backup y Resource Groups Tagging API.
+
+Se instala sobre los clientes reales de botocore con register_client_hook de
+la Lambda: el evento 'before-parameter-build' guarda los parámetros de la
+llamada y 'before-call' devuelve una respuesta ya parseada, de modo que no se
+hace ninguna petición HTTP. Todo el resto del cliente (validación de
+parámetros, paginadores, excepciones de ClientError) es el de botocore.
+
+La flota es sintética y reproducible (semilla fija): tamaño, densidad de tags,
+clusters Aurora con sus miembros, latencia por llamada, probabilidad de
+throttling en start_backup_job y duración de los jobs (segundos por GB) son
+configurables. seed_recovery_points() añade recovery points históricos para
+medir la aplicación de retención sobre vaults grandes.
+"""
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from itertools import chain
+from datetime import datetime, timedelta, timezone
+
+from botocore.awsrequest import AWSResponse
+
+SIMULATED_SERVICES = ('rds', 'backup', 'resourcegroupstaggingapi')
+
+STANDALONE_ENGINES = ('postgres', 'mysql', 'mariadb')
+# describe_db_clusters también devuelve los clusters de DocumentDB y Neptune
+CLUSTER_ENGINES = ('aurora-postgresql', 'aurora-mysql', 'docdb', 'neptune')
+STORAGE_SIZES_GB = (20, 50, 100, 250, 500, 1000, 4000)
+
+class SimulatedAWS:
+    """
+    Flota simulada y manejadores de las operaciones que usa la Lambda
+    """
+
+    def __init__(self, instances=1000, tag_density=0.5, clusters=0, members_per_cluster=2,
+                 latency_ms=0.0, throttle_probability=0.0, job_seconds_per_gb=0.0, seed=42,
+                 region='us-east-1', account_id='123456789012',
+                 tag_key='Backup', tag_value='True'):
+        self.rng = random.Random(seed)
+        self.region = region
+        self.account_id = account_id
+        self.tag_key = tag_key
+        self.tag_value = tag_value
+        self.latency = latency_ms / 1000.0
+        self.throttle_probability = throttle_probability
+        self.job_seconds_per_gb = job_seconds_per_gb
+        self.calls = Counter()
+        self.backup_jobs = []
+        self.deleted_recovery_points = set()
+        self._jobs_by_recovery_point = {}
+        self._listings = {}
+        self._jobs_by_token = {}
+        self._lock = threading.Lock()
+        self.db_instances = []
+        self.db_clusters = []
+        self._build_fleet(instances, tag_density, clusters, members_per_cluster)
+        self.tags_by_arn = {}
+        self.size_by_arn = {}
+        for resource in self.db_instances + self.db_clusters:
+            arn = resource.get('DBInstanceArn') or resource['DBClusterArn']
+            self.tags_by_arn[arn] = resource['TagList']
+            self.size_by_arn[arn] = resource['AllocatedStorage']
+        self._handlers = {
+            ('rds', 'DescribeDBInstances'): self._describe_db_instances,
+            ('rds', 'DescribeDBClusters'): self._describe_db_clusters,
+            ('rds', 'ListTagsForResource'): self._list_tags_for_resource,
+            ('resourcegroupstaggingapi', 'GetResources'): self._get_resources,
+            ('backup', 'StartBackupJob'): self._start_backup_job,
+            ('backup', 'ListBackupJobs'): self._list_backup_jobs,
+            ('backup', 'ListRecoveryPointsByBackupVault'): self._list_recovery_points,
+            ('backup', 'UpdateRecoveryPointLifecycle'): self._update_recovery_point_lifecycle,
+            ('backup', 'DeleteRecoveryPoint'): self._delete_recovery_point,
+            ('backup', 'ListTags'): self._list_recovery_point_tags
+        }
+
+    # ------------------------------------------------------------
+    # Flota sintética
+    # ------------------------------------------------------------
+
+    def _arn(self, kind, identifier):
+        return f"arn:aws:rds:{self.region}:{self.account_id}:{kind}:{identifier}"
+
+    def _tags(self, tag_density):
+        tags = [{'Key': 'Environment', 'Value': self.rng.choice(('dev', 'staging', 'prod'))}]
+        if self.rng.random() < tag_density:
+            tags.append({'Key': self.tag_key, 'Value': self.tag_value})
+        return tags
+
+    def _build_fleet(self, instances, tag_density, clusters, members_per_cluster):
+        members = min(instances, clusters * members_per_cluster)
+        for c in range(clusters):
+            identifier = f"cluster-{c:05d}"
+            self.db_clusters.append({
+                'DBClusterIdentifier': identifier,
+                'DBClusterArn': self._arn('cluster', identifier),
+                'Engine': self.rng.choice(CLUSTER_ENGINES),
+                'Status': 'available',
+                'AllocatedStorage': 1,
+                'DBClusterMembers': [],
+                'TagList': self._tags(tag_density)
+            })
+
+        for i in range(instances):
+            identifier = f"db-{i:05d}"
+            instance = {
+                'DBInstanceIdentifier': identifier,
+                'DBInstanceArn': self._arn('db', identifier),
+                'DBInstanceStatus': 'available',
+                'AllocatedStorage': self.rng.choice(STORAGE_SIZES_GB),
+                'TagList': self._tags(tag_density)
+            }
+            if i < members:
+                cluster = self.db_clusters[i % clusters]
+                instance['Engine'] = cluster['Engine']
+                instance['DBClusterIdentifier'] = cluster['DBClusterIdentifier']
+                cluster['DBClusterMembers'].append({
+                    'DBInstanceIdentifier': identifier,
+                    'IsClusterWriter': not cluster['DBClusterMembers']
+                })
+            else:
+                instance['Engine'] = self.rng.choice(STANDALONE_ENGINES)
+            self.db_instances.append(instance)
+
+    def seed_recovery_points(self, count, max_age_days=60, delete_after_days=5, automated_fraction=0.8,
+                             vault='Default'):
+        """
+        Añade `count` recovery points ya completados con antigüedad aleatoria
+        de hasta max_age_days; una fracción lleva los tags que escribe la Lambda
+        """
+        now = datetime.now(timezone.utc)
+        resources = self.db_instances + self.db_clusters
+        with self._lock:
+            for _ in range(count):
+                resource = self.rng.choice(resources)
+                arn = resource.get('DBInstanceArn') or resource['DBClusterArn']
+                created = now - timedelta(days=self.rng.uniform(0, max_age_days))
+                tags = {'Name': 'seeded'}
+                if self.rng.random() < automated_fraction:
+                    tags.update({'AutomatedBackup': 'True', 'CreatedBy': 'Lambda'})
+                self._add_job(self._new_job(
+                    vault, arn, created, created, {'DeleteAfterDays': delete_after_days}, tags
+                ))
+
+    def seed_job_history(self, runs=3, seconds_per_gb=2.0, jitter=0.2, vault='Default'):
+        """
+        Añade `runs` jobs completados por recurso, uno por día, con una
+        duración de seconds_per_gb por GB (±jitter) para el modelo de duración
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for resource in self.db_instances + self.db_clusters:
+                arn = resource.get('DBInstanceArn') or resource['DBClusterArn']
+                size_gb = self.size_by_arn.get(arn, 1)
+                for day in range(1, runs + 1):
+                    created = now - timedelta(days=day)
+                    seconds = size_gb * seconds_per_gb * self.rng.uniform(1 - jitter, 1 + jitter)
+                    self._add_job(self._new_job(
+                        vault, arn, created, created + timedelta(seconds=seconds), {}, {'Name': 'history'}
+                    ))
+
+    def tagged_resources(self):
+        """
+        Número de recursos etiquetados para backup (instancias y clusters)
+        """
+        return sum(
+            1 for tags in self.tags_by_arn.values()
+            if {'Key': self.tag_key, 'Value': self.tag_value} in tags
+        )
+
+    # ------------------------------------------------------------
+    # Integración con botocore
+    # ------------------------------------------------------------
+
+    def attach(self, service, client):
+        """
+        Hook para register_client_hook: simula los servicios conocidos y deja
+        pasar el resto de clientes sin cambios
+        """
+        if service not in SIMULATED_SERVICES:
+            return
+        client.meta.events.register('before-parameter-build', self._capture_params)
+        client.meta.events.register('before-call', self._handle)
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _capture_params(self, params, context, **kwargs):
+        context['simulated_params'] = dict(params)
+
+    def _handle(self, model, context, **kwargs):
+        service = model.service_model.service_name
+        handler = self._handlers.get((service, model.name))
+        if handler is None:
+            return None
+        with self._lock:
+            self.calls[f"{service}.{model.name}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        status, parsed = handler(context.get('simulated_params', {}))
+        parsed.setdefault('ResponseMetadata', {
+            'RequestId': str(uuid.uuid4()), 'HTTPStatusCode': status, 'HTTPHeaders': {}, 'RetryAttempts': 0
+        })
+        return AWSResponse(None, status, {}, None), parsed
+
+    @staticmethod
+    def _error(code, message):
+        return 400, {'Error': {'Code': code, 'Message': message}}
+
+    def _listing(self, operation, params, token_param, build):
+        """
+        Resultado completo de un listado paginado: se calcula en la primera
+        página y las siguientes lo reutilizan, como una instantánea del servidor
+        """
+        key = (operation, repr(sorted((k, v) for k, v in params.items() if k != token_param)))
+        if not params.get(token_param) or key not in self._listings:
+            self._listings[key] = build()
+        return self._listings[key]
+
+    @staticmethod
+    def _page(items, params, token_param, limit_param, default_limit, result_key, token_key):
+        start = int(params.get(token_param) or 0)
+        limit = params.get(limit_param) or default_limit
+        response = {result_key: items[start:start + limit]}
+        if start + limit < len(items):
+            response[token_key] = str(start + limit)
+        return 200, response
+
+    # ------------------------------------------------------------
+    # Operaciones simuladas
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _by_identifier(resources, identifier, id_key, arn_key):
+        """
+        Filtro DBInstanceIdentifier/DBClusterIdentifier (acepta identificador o ARN)
+        """
+        return [r for r in resources if identifier in (r[id_key], r[arn_key])]
+
+    def _describe_db_instances(self, params):
+        instances = self.db_instances
+        if params.get('DBInstanceIdentifier'):
+            instances = self._by_identifier(
+                instances, params['DBInstanceIdentifier'], 'DBInstanceIdentifier', 'DBInstanceArn'
+            )
+            if not instances:
+                return self._error('DBInstanceNotFound', f"{params['DBInstanceIdentifier']} not found")
+        return self._page(instances, params, 'Marker', 'MaxRecords', 100, 'DBInstances', 'Marker')
+
+    def _describe_db_clusters(self, params):
+        clusters = self.db_clusters
+        if params.get('DBClusterIdentifier'):
+            clusters = self._by_identifier(
+                clusters, params['DBClusterIdentifier'], 'DBClusterIdentifier', 'DBClusterArn'
+            )
+            if not clusters:
+                return self._error('DBClusterNotFoundFault', f"{params['DBClusterIdentifier']} not found")
+        return self._page(clusters, params, 'Marker', 'MaxRecords', 100, 'DBClusters', 'Marker')
+
+    def _list_tags_for_resource(self, params):
+        arn = params['ResourceName']
+        if arn not in self.tags_by_arn:
+            return self._error('DBInstanceNotFound', f"{arn} not found")
+        return 200, {'TagList': self.tags_by_arn[arn]}
+
+    def _get_resources(self, params):
+        mappings = self._listing('GetResources', params, 'PaginationToken', lambda: self._tag_mappings(params))
+        return self._page(
+            mappings, params, 'PaginationToken', 'ResourcesPerPage', 100,
+            'ResourceTagMappingList', 'PaginationToken'
+        )
+
+    def _tag_mappings(self, params):
+        resource_types = params.get('ResourceTypeFilters') or ['rds:db', 'rds:cluster']
+        wanted = {f['Key']: set(f.get('Values', [])) for f in params.get('TagFilters', [])}
+        mappings = []
+        with self._lock:
+            snapshot_tags = {
+                job['RecoveryPointArn']: [{'Key': k, 'Value': v} for k, v in job['RecoveryPointTags'].items()]
+                for job in self.backup_jobs
+                if job['RecoveryPointArn'] not in self.deleted_recovery_points
+            }
+        for arn, tags in chain(self.tags_by_arn.items(), snapshot_tags.items()):
+            if f"rds:{arn.split(':')[5]}" not in resource_types:
+                continue
+            tag_map = {t['Key']: t['Value'] for t in tags}
+            if all(k in tag_map and (not v or tag_map[k] in v) for k, v in wanted.items()):
+                mappings.append({'ResourceARN': arn, 'Tags': tags})
+        return mappings
+
+    def _start_backup_job(self, params):
+        if self.throttle_probability and self.rng.random() < self.throttle_probability:
+            return self._error('ThrottlingException', 'Rate exceeded')
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            token = params.get('IdempotencyToken')
+            job = self._jobs_by_token.get(token)
+            if job is None:
+                size_gb = self.size_by_arn.get(params['ResourceArn'], 1)
+                job = self._new_job(
+                    params['BackupVaultName'], params['ResourceArn'], now,
+                    now + timedelta(seconds=size_gb * self.job_seconds_per_gb),
+                    params.get('Lifecycle'), params.get('RecoveryPointTags')
+                )
+                self._add_job(job)
+                if token:
+                    self._jobs_by_token[token] = job
+        return 200, {'BackupJobId': job['BackupJobId'], 'CreationDate': job['CreationDate']}
+
+    def _new_job(self, vault, resource_arn, created, completed, lifecycle, tags):
+        job_id = str(uuid.uuid4()).upper()
+        kind = 'snapshot' if ':db:' in resource_arn else 'cluster-snapshot'
+        return {
+            'BackupJobId': job_id,
+            'BackupVaultName': vault,
+            'ResourceArn': resource_arn,
+            'RecoveryPointArn': self._arn(kind, f"awsbackup:job-{job_id.lower()}"),
+            'CreationDate': created,
+            'CompletionDate': completed,
+            'BackupSizeInBytes': self.size_by_arn.get(resource_arn, 1) * 1024 ** 3,
+            'ResourceType': 'RDS' if ':db:' in resource_arn else 'Aurora',
+            'Lifecycle': dict(lifecycle or {}),
+            'RecoveryPointTags': dict(tags or {})
+        }
+
+    def _add_job(self, job):
+        self.backup_jobs.append(job)
+        self._jobs_by_recovery_point[job['RecoveryPointArn']] = job
+
+    @staticmethod
+    def _job_view(job, now):
+        """
+        Estado del job en este instante: RUNNING hasta su CompletionDate
+        """
+        view = dict(job)
+        del view['RecoveryPointTags']
+        if now < job['CompletionDate']:
+            view['State'] = 'RUNNING'
+            del view['CompletionDate']
+            del view['BackupSizeInBytes']
+        else:
+            view['State'] = 'COMPLETED'
+        return view
+
+    def _jobs_in_vault(self, params, vault_param):
+        vault = params.get(vault_param)
+        created_after = params.get('ByCreatedAfter')
+        complete_after = params.get('ByCompleteAfter')
+        state = params.get('ByState')
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            jobs = [self._job_view(job, now) for job in self.backup_jobs]
+        return [
+            job for job in jobs
+            if (vault is None or job['BackupVaultName'] == vault)
+            and (created_after is None or job['CreationDate'] >= created_after)
+            and (complete_after is None or job.get('CompletionDate', complete_after) > complete_after)
+            and (state is None or job['State'] == state)
+        ]
+
+    def _list_backup_jobs(self, params):
+        jobs = self._listing('ListBackupJobs', params, 'NextToken', lambda: self._jobs_in_vault(params, 'ByBackupVaultName'))
+        return self._page(jobs, params, 'NextToken', 'MaxResults', 1000, 'BackupJobs', 'NextToken')
+
+    def _list_recovery_points(self, params):
+        points = self._listing('ListRecoveryPointsByBackupVault', params, 'NextToken', lambda: self._recovery_points(params))
+        return self._page(points, params, 'NextToken', 'MaxResults', 1000, 'RecoveryPoints', 'NextToken')
+
+    def _recovery_points(self, params):
+        return [
+            {
+                'RecoveryPointArn': job['RecoveryPointArn'],
+                'BackupVaultName': job['BackupVaultName'],
+                'ResourceArn': job['ResourceArn'],
+                'ResourceType': job['ResourceType'],
+                'CreationDate': job['CreationDate'],
+                'Lifecycle': dict(job['Lifecycle']),
+                'Status': 'COMPLETED'
+            }
+            for job in self._jobs_in_vault(params, 'BackupVaultName')
+            if job['State'] == 'COMPLETED' and job['RecoveryPointArn'] not in self.deleted_recovery_points
+        ]
+
+    def _find_recovery_point(self, arn):
+        if arn in self.deleted_recovery_points:
+            return None
+        return self._jobs_by_recovery_point.get(arn)
+
+    def _update_recovery_point_lifecycle(self, params):
+        with self._lock:
+            job = self._find_recovery_point(params['RecoveryPointArn'])
+            if job is None:
+                return self._error('ResourceNotFoundException', f"{params['RecoveryPointArn']} not found")
+            job['Lifecycle'] = dict(params.get('Lifecycle') or {})
+        return 200, {'RecoveryPointArn': job['RecoveryPointArn'], 'Lifecycle': job['Lifecycle']}
+
+    def _delete_recovery_point(self, params):
+        with self._lock:
+            if self._find_recovery_point(params['RecoveryPointArn']) is None:
+                return self._error('ResourceNotFoundException', f"{params['RecoveryPointArn']} not found")
+            self.deleted_recovery_points.add(params['RecoveryPointArn'])
+        return 200, {}
+
+    def _list_recovery_point_tags(self, params):
+        with self._lock:
+            job = self._find_recovery_point(params['ResourceArn'])
+        if job is None:
+            return self._error('ResourceNotFoundException', f"{params['ResourceArn']} not found")
+        return 200, {'Tags': dict(job['RecoveryPointTags'])}
@@ -0,0 +1,123 @@
+"""
+Benchmark de arranque en frío de la Lambda.
+
+Cada iteración lanza un intérprete nuevo (como un cold start) y mide:
+  - import:      importar lambda_source
+  - first_client: crear el primer cliente (rds) con la configuración de la Lambda
+  - first_call:  primera llamada describe_db_instances (respuesta simulada con
+                 botocore Stubber, sin acceso a AWS)
+
+Uso:
+    python benchmarks/startup_benchmark.py --iterations 20 --output startup.json
+    python benchmarks/startup_benchmark.py --baseline startup.json --max-regression 0.2
+
+Con --baseline el script termina con código 1 si la mediana total empeora más
+que --max-regression (fracción) respecto a la versión anterior.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ('import', 'first_client', 'first_call', 'total')
+
+# Código ejecutado en cada intérprete nuevo
+MEASURE_SNIPPET = '''
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import lambda_source
+t1 = time.perf_counter()
+client = lambda_source.get_client('rds')
+t2 = time.perf_counter()
+from botocore.stub import Stubber
+with Stubber(client) as stubber:
+    stubber.add_response('describe_db_instances', {'DBInstances': []})
+    client.describe_db_instances()
+t3 = time.perf_counter()
+print(json.dumps({
+    'import': t1 - t0,
+    'first_client': t2 - t1,
+    'first_call': t3 - t2,
+    'total': t3 - t0
+}))
+'''
+
+def benchmark_env():
+    """
+    Entorno mínimo para importar la Lambda sin credenciales reales
+    """
+    env = dict(os.environ)
+    env.setdefault('BACKUP_ROLE_ARN', 'arn:aws:iam::123456789012:role/benchmark-backup-role')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    env.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    return env
+
+def run_iteration(env):
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE_SNIPPET, REPO_DIR],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def summarize(samples):
+    summary = {}
+    for phase in PHASES:
+        values = sorted(sample[phase] * 1000 for sample in samples)
+        summary[phase] = {
+            'median_ms': round(statistics.median(values), 2),
+            'p90_ms': round(values[min(len(values) - 1, int(len(values) * 0.9))], 2),
+            'min_ms': round(values[0], 2)
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de arranque en frío de la Lambda')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--output', help='Fichero JSON donde guardar el resultado')
+    parser.add_argument('--baseline', help='Resultado JSON de una versión anterior para comparar')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Empeoramiento máximo permitido de la mediana total (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    env = benchmark_env()
+    samples = [run_iteration(env) for _ in range(args.iterations)]
+    result = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'iterations': args.iterations,
+        'phases': summarize(samples)
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        before = baseline['phases']['total']['median_ms']
+        after = result['phases']['total']['median_ms']
+        change = (after - before) / before if before else 0.0
+        print(f"Mediana total: {before} ms ({baseline.get('revision')}) -> {after} ms ({result['revision']}), {change:+.1%}")
+        if change > args.max_regression:
+            print(f"Regresión de arranque superior al {args.max_regression:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
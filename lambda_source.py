@@ -1,17 +1,89 @@
 import boto3
+import bisect
+import gzip
+import hashlib
+import heapq
 import os
 import json
-from datetime import datetime, timedelta
+import queue
+import random
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from collections import OrderedDict
+from functools import partial
+from itertools import chain
+from datetime import datetime, timedelta, timezone
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
+import multiprocessing
+import sqlite3
+import statistics
 
 # Configuración de logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Clientes AWS
-backup_client = boto3.client('backup')
-rds_client = boto3.client('rds')
+# Variables de entorno del envío concurrente
+BACKUP_MAX_WORKERS = int(os.environ.get('BACKUP_MAX_WORKERS', '8'))
+BACKUP_SUBMIT_RATE = float(os.environ.get('BACKUP_SUBMIT_RATE', '5'))
+
+# Errores de AWS Backup que indican que hay que bajar el ritmo
+THROTTLE_ERROR_CODES = ('ThrottlingException', 'LimitExceededException')
+
+# Clasificación de errores de start_backup_job: los transitorios se reintentan
+# con backoff corto, los de capacidad del vault (límite de jobs concurrentes)
+# se aplazan con un backoff más largo y el resto son definitivos
+RETRYABLE_ERROR_CODES = (
+    'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailable',
+    'ServiceUnavailableException', 'InternalFailure', 'InternalServerError',
+    'RequestTimeout', 'RequestTimeoutException', 'EndpointConnectionError',
+    'ConnectTimeoutError', 'ReadTimeoutError', 'ConnectionClosedError',
+    'LedgerUnavailable'
+)
+DEFERRED_ERROR_CODES = ('LimitExceededException',)
+
+# Variables de entorno de la cola de reintentos
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '4'))
+RETRY_BUDGET = int(os.environ.get('RETRY_BUDGET', '200'))
+RETRY_BASE_SECONDS = float(os.environ.get('RETRY_BASE_SECONDS', '2'))
+RETRY_DEFERRED_SECONDS = float(os.environ.get('RETRY_DEFERRED_SECONDS', '30'))
+RETRY_MAX_BACKOFF_SECONDS = float(os.environ.get('RETRY_MAX_BACKOFF_SECONDS', '120'))
+
+# Configuración de los clientes AWS (se crean de forma perezosa con get_client)
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('BOTO_MAX_POOL_CONNECTIONS', str(max(10, BACKUP_MAX_WORKERS)))),
+    connect_timeout=float(os.environ.get('BOTO_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.environ.get('BOTO_READ_TIMEOUT', '30')),
+    tcp_keepalive=os.environ.get('BOTO_TCP_KEEPALIVE', 'true').lower() == 'true',
+    retries={
+        'mode': os.environ.get('BOTO_RETRY_MODE', 'adaptive'),
+        'max_attempts': int(os.environ.get('BOTO_MAX_ATTEMPTS', '5'))
+    }
+)
+
+# start_backup_job no se reintenta dentro de botocore: el throttling y
+# LimitExceeded deben llegar a AdaptiveRateLimiter y RetryQueue, que son los
+# que reintentan. Con adaptive/5 cada reintento de la cola serían hasta 5
+# intentos de SDK y el limitador casi nunca vería el throttling. En botocore
+# 'max_attempts' cuenta reintentos; 'total_max_attempts' cuenta la llamada
+# inicial, así que 1 es un único intento HTTP.
+SUBMIT_CLIENT_CONFIG = Config(
+    retries={
+        'mode': 'standard',
+        'total_max_attempts': int(os.environ.get('BOTO_SUBMIT_MAX_ATTEMPTS', '1'))
+    }
+)
+
+# Funciones llamadas con (servicio, cliente) cada vez que se crea un cliente
+_client_hooks = []
+
+# Modos del payload que inician o continúan un backup (None: schedule o invocación manual)
+BACKUP_MODES = (None, 'continue', 'coordinator')
 
 # Variables de entorno
 BACKUP_VAULT_NAME = os.environ.get('BACKUP_VAULT_NAME', 'Default')
@@ -19,58 +91,249 @@ RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', '5'))
 BACKUP_TAG_KEY = os.environ.get('BACKUP_TAG_KEY', 'Backup')
 BACKUP_TAG_VALUE = os.environ.get('BACKUP_TAG_VALUE', 'True')
 IAM_ROLE_ARN = os.environ['BACKUP_ROLE_ARN']
+DISCOVERY_STRATEGY = os.environ.get('DISCOVERY_STRATEGY', 'inline')
+MIN_BACKUP_INTERVAL_HOURS = float(os.environ.get('MIN_BACKUP_INTERVAL_HOURS', '0'))
+DRY_RUN = os.environ.get('DRY_RUN', 'false').lower() == 'true'
+BACKUP_RESOURCE_TYPES = os.environ.get('BACKUP_RESOURCE_TYPES', 'RDS,Aurora,DocumentDB,Neptune')
+
+# Variables de entorno de la caché de descubrimiento (contenedores calientes)
+DISCOVERY_CACHE_TTL_SECONDS = float(os.environ.get('DISCOVERY_CACHE_TTL_SECONDS', '300'))
+DISCOVERY_CACHE_MAX_ENTRIES = int(os.environ.get('DISCOVERY_CACHE_MAX_ENTRIES', '16'))
+
+# Variables de entorno del descubrimiento en pipeline
+DISCOVERY_PIPELINE = os.environ.get('DISCOVERY_PIPELINE', 'false').lower() == 'true'
+DISCOVERY_QUEUE_SIZE = int(os.environ.get('DISCOVERY_QUEUE_SIZE', '100'))
+
+# Variables de entorno del planificador de envíos
+SCHEDULE_ORDER = os.environ.get('SCHEDULE_ORDER', 'discovery')
+SCHEDULE_WINDOW_MINUTES = float(os.environ.get('SCHEDULE_WINDOW_MINUTES', '0'))
+MAX_IN_FLIGHT_JOBS = int(os.environ.get('MAX_IN_FLIGHT_JOBS', '0'))
+SCHEDULE_POLL_SECONDS = float(os.environ.get('SCHEDULE_POLL_SECONDS', '30'))
+BACKUP_PRIORITY_TAG_KEY = os.environ.get('BACKUP_PRIORITY_TAG_KEY', 'BackupPriority')
+
+# Variables de entorno del modelo de duración de jobs
+DURATION_MODEL_MODE = os.environ.get('DURATION_MODEL_MODE', 'off')
+DURATION_MODEL_LOOKBACK_DAYS = float(os.environ.get('DURATION_MODEL_LOOKBACK_DAYS', '14'))
+DURATION_MODEL_REFRESH_HOURS = float(os.environ.get('DURATION_MODEL_REFRESH_HOURS', '24'))
+RUN_FINISH_BY_UTC = os.environ.get('RUN_FINISH_BY_UTC', '')
+
+# Variables de entorno de la aplicación de retención (mode=retention)
+RETENTION_ACTION_RATE = float(os.environ.get('RETENTION_ACTION_RATE', '10'))
+RETENTION_DELETE_EXPIRED = os.environ.get('RETENTION_DELETE_EXPIRED', 'false').lower() == 'true'
+
+# Variables de entorno del seguimiento de jobs
+TRACK_JOBS_SECONDS = int(os.environ.get('TRACK_JOBS_SECONDS', '0'))
+TRACK_POLL_INTERVAL_SECONDS = int(os.environ.get('TRACK_POLL_INTERVAL_SECONDS', '30'))
+TRACK_LOOKBACK_HOURS = float(os.environ.get('TRACK_LOOKBACK_HOURS', '24'))
+
+# Variables de entorno del presupuesto de tiempo y checkpoints
+TIME_BUDGET_MARGIN_SECONDS = int(os.environ.get('TIME_BUDGET_MARGIN_SECONDS', '60'))
+MAX_CONTINUATIONS = int(os.environ.get('MAX_CONTINUATIONS', '10'))
+STATE_BUCKET = os.environ.get('STATE_BUCKET', '')
+STATE_DIR = os.environ.get('STATE_DIR', '/tmp/rds-backup-state')
+
+# Variables de entorno del modo coordinador/worker
+COORDINATOR_MODE = os.environ.get('COORDINATOR_MODE', 'false').lower() == 'true'
+SHARD_SIZE = int(os.environ.get('SHARD_SIZE', '200'))
+SHARD_DISPATCHER = os.environ.get('SHARD_DISPATCHER', 'lambda')
+COORDINATOR_MAX_WORKERS = int(os.environ.get('COORDINATOR_MAX_WORKERS', '20'))
+
+# Variables de entorno del fan-out multi-región / multi-cuenta
+TARGET_REGIONS = os.environ.get('TARGET_REGIONS', '')
+TARGET_ROLE_ARNS = os.environ.get('TARGET_ROLE_ARNS', '')
+TARGET_BACKUP_ROLE_NAME = os.environ.get('TARGET_BACKUP_ROLE_NAME', IAM_ROLE_ARN.split('/')[-1])
+FANOUT_MAX_TARGETS = int(os.environ.get('FANOUT_MAX_TARGETS', '8'))
+
+# Variables de entorno de las métricas (CloudWatch Embedded Metric Format)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'RDSBackupAutomation')
+
+# Variables de entorno del inventario incremental
+INVENTORY_MODE = os.environ.get('INVENTORY_MODE', 'off')
+INVENTORY_TABLE = os.environ.get('INVENTORY_TABLE', '')
+INVENTORY_RECONCILE_HOURS = float(os.environ.get('INVENTORY_RECONCILE_HOURS', '24'))
+
+# Variables de entorno de la agregación de resultados
+RESULT_SINK = os.environ.get('RESULT_SINK', 'log')
+RESULT_SINK_BATCH = int(os.environ.get('RESULT_SINK_BATCH', '1000'))
+FAILURE_SAMPLE_SIZE = int(os.environ.get('FAILURE_SAMPLE_SIZE', '20'))
+
+# Variables de entorno del historial de ejecuciones
+RUN_HISTORY_ENABLED = os.environ.get('RUN_HISTORY_ENABLED', 'true').lower() == 'true'
+
+# Variables de entorno del lease de ejecución y el registro de envíos
+RUN_LEASE_ENABLED = os.environ.get('RUN_LEASE_ENABLED', 'false').lower() == 'true'
+RUN_LEASE_TABLE = os.environ.get('RUN_LEASE_TABLE', '')
+RUN_LEASE_NAME = os.environ.get('RUN_LEASE_NAME', 'backup')
+RUN_LEASE_TTL_SECONDS = float(os.environ.get('RUN_LEASE_TTL_SECONDS', '120'))
+RUN_LEASE_CONFLICT = os.environ.get('RUN_LEASE_CONFLICT', 'exit')
+RUN_LEASE_RESUME_HOURS = float(os.environ.get('RUN_LEASE_RESUME_HOURS', '6'))
+RUN_LEDGER_RETENTION_HOURS = float(os.environ.get('RUN_LEDGER_RETENTION_HOURS', '48'))
+
+# Estadísticas de descubrimiento (una por thread, es decir, por destino)
+_discovery_state = threading.local()
 
 def lambda_handler(event, context):
     """
     Función principal que orquesta el proceso de backup
     """
     try:
+        API_METRICS.reset()
+        event = event or {}
+        DISCOVERY_CACHE.bypass = bool(event.get('bypass_cache') or event.get('reconcile'))
+        if event.get('mode') == 'track':
+            return run_tracking(event, context)
+        if event.get('mode') == 'worker':
+            return run_worker(event, context)
+        if event.get('mode') == 'retention':
+            return run_retention(event, context)
+        if event.get('source') in INVENTORY_EVENT_SOURCES:
+            return run_inventory_event(event, context)
+        
+        # Solo el schedule de EventBridge, una invocación manual o una
+        # continuación inician un backup completo: un evento o modo que esta
+        # versión no conoce se descarta en lugar de respaldar toda la flota
+        if event.get('mode') not in BACKUP_MODES or event.get('source', 'aws.events') != 'aws.events':
+            logger.warning(f"⏭️  Evento no reconocido (mode={event.get('mode')}, source={event.get('source')}), se ignora")
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Unsupported event', 'mode': event.get('mode'), 'source': event.get('source')})
+            }
+        
+        # Continuación de una ejecución anterior que se quedó sin tiempo
+        checkpoint = None
+        if event.get('mode') == 'continue':
+            checkpoint = claim_checkpoint(event)
+            if checkpoint is None:
+                logger.warning(f"Continuación {event.get('checkpoint_key')} ya procesada o inexistente, nada que hacer")
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({'message': 'Continuation already processed', 'run_id': event.get('run_id')})
+                }
+        run = checkpoint['run'] if checkpoint else new_run()
+        
+        # Lease: si otra ejecución está en curso, salir o unirse a lo pendiente
+        joined = None
+        if RUN_LEASE_ENABLED and not event.get('dry_run', DRY_RUN):
+            status, lease_run = RUN_LEASE.acquire(run)
+            if status == 'held':
+                # lease_run es None si el lease cambió de manos mientras se leía
+                entries = []
+                if lease_run is not None and RUN_LEASE_CONFLICT == 'join':
+                    entries = RUN_LEASE.published_plans(lease_run['run_id'])
+                if not entries:
+                    held_by = lease_run['run_id'] if lease_run else None
+                    logger.info(f"⏭️  Ejecución {held_by} en curso (lease ocupado), nada que hacer")
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps({'message': 'Run already in progress', 'run_id': held_by})
+                    }
+                logger.info(f"🤝 Uniéndose a la ejecución {lease_run['run_id']}: {len(entries)} destinos publicados")
+                run = dict(lease_run, hop=0)
+                RUN_LEASE.join(run)
+                joined = entries
+            elif status == 'resumed':
+                logger.warning(f"♻️  Lease caducado: se retoma la ejecución {lease_run['run_id']} (salto {lease_run['hop']})")
+                run = lease_run
+        
         logger.info("Iniciando proceso de backup automatizado")
         logger.info(f"Vault: {BACKUP_VAULT_NAME}, Retención: {RETENTION_DAYS} días")
         logger.info(f"Buscando recursos con tag {BACKUP_TAG_KEY}={BACKUP_TAG_VALUE}")
         
-        # Obtener instancias RDS y clusters Aurora con el tag especificado
-        rds_instances = get_tagged_rds_instances()
-        aurora_clusters = get_tagged_aurora_clusters()
+        logger.info(f"Run {run['run_id']} (salto {run['hop']})")
+        part = f"join-{RUN_LEASE.invocation_id[:8]}" if joined else f"hop-{run['hop']}"
+        RESULT_RECORDS.open(f"results/{run['run_id']}", part)
+        RUN_HISTORY.open(run['run_id'], run['run_timestamp'], part)
+        
+        dry_run = bool(event.get('dry_run', DRY_RUN))
+        if dry_run:
+            logger.info("🧪 Modo dry-run: se mostrará el plan sin llamar a start_backup_job")
         
-        backup_results = {
-            'successful': [],
-            'failed': [],
-            'total_processed': 0,
-            'timestamp': datetime.now().isoformat()
+        # Seguimiento opcional de los jobs en la misma invocación
+        track_until = None
+        if TRACK_JOBS_SECONDS > 0 and not dry_run:
+            track_until = tracking_deadline(TRACK_JOBS_SECONDS, context)
+        
+        options = {
+            'dry_run': dry_run,
+            'track_until': track_until,
+            'deadline': execution_deadline(context),
+            'run_timestamp': run['run_timestamp'],
+            'force_scan': bool(event.get('reconcile', False))
         }
         
-        # Procesar instancias RDS
-        for instance in rds_instances:
-            result = create_rds_backup(instance)
-            backup_results['total_processed'] += 1
-            if result['success']:
-                backup_results['successful'].append(result)
-            else:
-                backup_results['failed'].append(result)
-        
-        # Procesar clusters Aurora
-        for cluster in aurora_clusters:
-            result = create_aurora_backup(cluster)
-            backup_results['total_processed'] += 1
-            if result['success']:
-                backup_results['successful'].append(result)
-            else:
-                backup_results['failed'].append(result)
+        # Un destino (la región/cuenta de la Lambda) o fan-out en paralelo
+        if checkpoint or joined:
+            entries = checkpoint['remaining'] if checkpoint else joined
+            fanout = checkpoint['fanout'] if checkpoint else len(entries) > 1 or entries[0]['target'] is not None
+            targets = [target_from_spec(entry['target']) for entry in entries]
+            plans = [entry['plan'] for entry in entries]
+        else:
+            targets = resolve_targets(event)
+            fanout = bool(targets)
+            targets = targets or [DEFAULT_TARGET]
+            plans = [None] * len(targets)
+        
+        coordinator = not joined and (event.get('mode') == 'coordinator' or (COORDINATOR_MODE and not checkpoint))
+        if coordinator:
+            backup_results = run_coordinator(targets, fanout, run['run_id'], context, **options)
+        elif fanout:
+            backup_results = run_fanout(targets, plans=plans, **options)
+        else:
+            backup_results = run_target_backup(targets[0], plan=plans[0], **options)
+            if 'remaining' in backup_results:
+                backup_results['remaining'] = [{'target': None, 'plan': backup_results['remaining']}]
+        
+        # Checkpoint y auto-invocación si no dio tiempo a enviar todo el plan
+        remaining = backup_results.pop('remaining', None)
+        if joined:
+            # Lo que no dio tiempo a enviar queda para la ejecución titular
+            remaining = None
+            backup_results['joined'] = True
+        processed_this_hop = backup_results['total_processed']
+        if checkpoint:
+            backup_results = merge_backup_results(checkpoint['results'], backup_results)
+        backup_results['run_id'] = run['run_id']
+        backup_results['hops'] = run['hop'] + 1
+        
+        backup_results['records'] = RESULT_RECORDS.close()
+        backup_results['history'] = RUN_HISTORY.close()
+        
+        if remaining:
+            backup_results['continuation'] = schedule_continuation(
+                run, backup_results, remaining, fanout, processed_this_hop, context
+            )
+            # La continuación conserva el lease; si no se programó, la ejecución termina aquí
+            RUN_LEASE.close(release=not backup_results['continuation']['scheduled'])
+            return {
+                'statusCode': 202,
+                'body': json.dumps(backup_results, default=str, indent=2)
+            }
+        
+        RUN_LEASE.close(release=True)
         
         # Log de resultados finales
         logger.info("=" * 60)
         logger.info(f"✅ PROCESO COMPLETADO")
         logger.info(f"Total procesados: {backup_results['total_processed']}")
-        logger.info(f"Exitosos: {len(backup_results['successful'])}")
-        logger.info(f"Fallidos: {len(backup_results['failed'])}")
+        logger.info(f"Exitosos: {backup_results['successful']}")
+        logger.info(f"Fallidos: {backup_results['failed']}")
+        logger.info(f"Omitidos (backup reciente): {backup_results['skipped']}")
         logger.info("=" * 60)
         
         if backup_results['failed']:
-            logger.warning(f"⚠️  Recursos con fallos: {[r['resource'] for r in backup_results['failed']]}")
+            logger.warning(f"⚠️  Fallos por código de error: {backup_results['by_error_code']}")
+            logger.warning(f"⚠️  Recursos con fallos (muestra): {[r['resource'] for r in backup_results['failure_sample']]}")
+        
+        failed_targets = [
+            name for name, section in backup_results.get('targets', {}).items()
+            if 'error' in section
+        ]
+        if failed_targets:
+            logger.warning(f"⚠️  Destinos con error: {failed_targets}")
         
         return {
-            'statusCode': 200 if len(backup_results['failed']) == 0 else 207,
+            'statusCode': 200 if not backup_results['failed'] and not failed_targets else 207,
             'body': json.dumps(backup_results, default=str, indent=2)
         }
         
@@ -80,189 +343,3623 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        RESULT_RECORDS.close()
+        RUN_HISTORY.close()
+        RUN_LEASE.close()
+        API_METRICS.emit({'Mode': (event or {}).get('mode') or 'backup'})
+
+def run_target_backup(target, dry_run=False, track_until=None, deadline=None,
+                      run_timestamp=None, plan=None, force_scan=False):
+    """
+    Descubre, planifica y envía los backups de un destino (región/cuenta).
+    Con track_until (time.monotonic()) sigue los jobs hasta ese límite.
+    Al llegar al deadline deja de enviar y devuelve lo pendiente en
+    'remaining'; con un plan ya calculado (continuación) omite el descubrimiento.
+    force_scan ignora el inventario incremental y reconcilia con un escaneo completo.
+    """
+    run_started = datetime.now(timezone.utc)
+    
+    if plan is None and not dry_run and pipeline_enabled():
+        return run_pipelined_backup(target, track_until, deadline, run_timestamp)
+    
+    if plan is None:
+        backup_results, plan = discover_target_plan(target, force_scan=force_scan)
+    else:
+        logger.info(f"[{target.name}] Reanudando con plan recibido: {len(plan_resources(plan))} recursos pendientes")
+        backup_results = new_target_results(plan, {'resumed_from_plan': True})
+        if 'resume_discovery' in plan:
+            resume_discovery(target, plan, backup_results)
+    
+    if dry_run:
+        log_backup_plan(plan, target)
+        backup_results['dry_run'] = True
+        backup_results['plan'].update(plan_identifiers(plan))
+        return backup_results
+    
+    # Enviar backups de instancias RDS y clusters Aurora en paralelo
+    backup_fns = target_backup_fns(target, run_timestamp)
+    jobs = [(backup_fns[kind], resource) for kind, resource in order_plan(plan)]
+    backup_results = submit_target_jobs(target, jobs, backup_results, deadline, track_until, run_started)
+    # El orden elegido al estimar el plan se conserva en las continuaciones
+    if 'order' in plan:
+        backup_results['submission']['order'] = plan['order']
+        if 'remaining' in backup_results:
+            backup_results['remaining']['order'] = plan['order']
+    return backup_results
+
+def resume_discovery(target, plan, backup_results):
+    """
+    Completa el plan de un pipeline cortado por el deadline o por un error
+    de descubrimiento: recorre de nuevo la cuenta y añade al plan solo los
+    recursos que aquel salto no llegó a ver
+    """
+    marker = plan.pop('resume_discovery')
+    seen = set(marker['seen']) | {resource['arn'] for _, resource in plan_resources(plan)}
+    
+    index = None
+    if MIN_BACKUP_INTERVAL_HOURS > 0:
+        with API_METRICS.phase('planning'):
+            index = build_recovery_point_index(target)
+    
+    stats = reset_discovery_stats()
+    added = 0
+    with API_METRICS.phase('discovery'):
+        for kind, resource in iter_backup_plan(target, index):
+            if kind == 'skipped':
+                if resource['resource_arn'] not in seen:
+                    record_outcome(backup_results, 'skipped', dict(resource, target=target.name))
+                continue
+            if resource['arn'] not in seen:
+                plan[kind].append(resource)
+                added += 1
+    
+    logger.info(f"[{target.name}] Descubrimiento reanudado: {added} recursos nuevos en el plan")
+    backup_results['discovery'] = {
+        'strategy': stats['strategy'],
+        'source': 'pipeline_resume',
+        'resumed_from_plan': True,
+        'added': added,
+        'api_calls': dict(stats['api_calls']),
+        'total_api_calls': sum(stats['api_calls'].values())
+    }
+
+def target_backup_fns(target, run_timestamp=None):
+    """
+    Función de backup de cada tipo del plan para un destino; todas
+    comparten create_backup y solo cambia el driver
+    """
+    return {
+        kind: partial(create_backup, driver, target=target, run_timestamp=run_timestamp)
+        for kind, driver in RESOURCE_DRIVERS.items()
+    }
+
+def submit_target_jobs(target, jobs, backup_results, deadline=None, track_until=None, run_started=None):
+    """
+    Envía los jobs (función de backup, recurso) de un destino registrando
+    cada resultado según llega; los no enviados antes del deadline quedan
+    en backup_results['remaining']. Con track_until sigue después los jobs.
+    """
+    run_started = run_started or datetime.now(timezone.utc)
+    limiter = AdaptiveRateLimiter(BACKUP_SUBMIT_RATE)
+    retry_queue = RetryQueue()
+    scheduler = SubmissionScheduler(target, MAX_IN_FLIGHT_JOBS)
+    remaining = new_plan()
+    job_ids = []
+    first_result_seconds = None
+    
+    with API_METRICS.phase('submission'):
+        for _, (backup_fn, resource), result in stream_backups(
+            jobs, limiter, deadline=deadline, retry_queue=retry_queue, scheduler=scheduler
+        ):
+            if result is None:
+                # El primer argumento de la función de backup es el driver del tipo
+                remaining[backup_fn.args[0].kind].append(resource)
+                continue
+            if first_result_seconds is None:
+                first_result_seconds = round((datetime.now(timezone.utc) - run_started).total_seconds(), 3)
+            result['target'] = target.name
+            if result.get('skipped'):
+                record_outcome(backup_results, 'skipped', result)
+            elif result['success']:
+                job_ids.append(result['backup_job_id'])
+                record_outcome(backup_results, 'successful', result)
+            else:
+                record_outcome(backup_results, 'failed', result)
+    
+    backup_results['submission'] = limiter.stats()
+    backup_results['submission']['workers'] = BACKUP_MAX_WORKERS
+    backup_results['submission']['retries'] = retry_queue.stats()
+    backup_results['submission']['schedule'] = scheduler.stats()
+    backup_results['submission']['first_result_seconds'] = first_result_seconds
+    
+    if plan_resources(remaining):
+        logger.warning(f"[{target.name}] Sin tiempo: quedan {len(plan_resources(remaining))} recursos pendientes")
+        if scheduler.ceiling_blocked:
+            # Esperando a que el vault baje del techo: la continuación no
+            # cuenta el salto como agotado aunque no haya enviado nada
+            remaining['ceiling_blocked'] = True
+        backup_results['remaining'] = remaining
+        return backup_results
+    
+    if track_until is not None and job_ids:
+        tracker = BackupJobTracker(target, since=run_started, job_ids=job_ids)
+        with API_METRICS.phase('tracking'):
+            tracker.wait(track_until)
+        tracker.write_records()
+        backup_results['tracking'] = tracker.summary()
+    
+    return backup_results
+
+def pipeline_enabled():
+    """
+    El pipeline envía en orden de descubrimiento, así que requiere
+    SCHEDULE_ORDER=discovery, sin ventana de escalonado y sin inventario
+    """
+    if not DISCOVERY_PIPELINE:
+        return False
+    if SCHEDULE_ORDER != 'discovery' or SCHEDULE_WINDOW_MINUTES > 0 or INVENTORY_MODE == 'incremental':
+        logger.warning(
+            "DISCOVERY_PIPELINE ignorado: requiere SCHEDULE_ORDER=discovery, "
+            "SCHEDULE_WINDOW_MINUTES=0 e INVENTORY_MODE=off"
+        )
+        return False
+    return True
+
+def run_pipelined_backup(target, track_until=None, deadline=None, run_timestamp=None):
+    """
+    Descubre y envía a la vez: un thread productor pagina la cuenta y deja
+    cada recurso del plan en una cola acotada que consume el envío, así que el
+    primer backup sale tras la primera página y la memoria no crece con el
+    tamaño de la flota. No usa DISCOVERY_CACHE: siempre pagina la cuenta.
+    Devuelve lo mismo que run_target_backup.
+    
+    Al llegar al deadline se detiene el productor: lo que ya estaba en la cola
+    queda en 'remaining' y, si el descubrimiento no terminó (o falló), el plan
+    pendiente lleva 'resume_discovery' con los ARN ya vistos para que la
+    continuación complete el descubrimiento (ver resume_discovery).
+    """
+    run_started = datetime.now(timezone.utc)
+    backup_results = new_target_results(new_plan(), {})
+    
+    index = None
+    if MIN_BACKUP_INTERVAL_HOURS > 0:
+        with API_METRICS.phase('planning'):
+            index = build_recovery_point_index(target)
+    
+    plan_queue = queue.Queue(maxsize=max(1, DISCOVERY_QUEUE_SIZE))
+    done = object()
+    stop = threading.Event()
+    producer_state = {}
+    
+    def put(item):
+        # Si el envío se interrumpe, el productor no se queda bloqueado en la cola llena
+        while not stop.is_set():
+            try:
+                plan_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        # Las estadísticas de descubrimiento son por thread: se guardan para el informe
+        producer_state['stats'] = reset_discovery_stats()
+        try:
+            with API_METRICS.phase('discovery'):
+                for item in iter_backup_plan(target, index, backup_results['plan']):
+                    if not put(item):
+                        return
+            producer_state['complete'] = True
+        except Exception as e:
+            logger.error(f"❌ [{target.name}] Error en el descubrimiento: {str(e)}", exc_info=True)
+            producer_state['error'] = str(e)
+        finally:
+            put(done)
+    
+    backup_fns = target_backup_fns(target, run_timestamp)
+    seen = []
+    
+    def queued():
+        # Tras el deadline el productor se detiene y solo se vacía lo que ya
+        # estaba en la cola, sin seguir paginando la cuenta
+        while True:
+            if deadline is not None and time.monotonic() >= deadline and not stop.is_set():
+                logger.warning(f"⏱️  [{target.name}] Deadline alcanzado: se detiene el descubrimiento")
+                stop.set()
+                producer.join()
+            try:
+                item = plan_queue.get(timeout=0 if stop.is_set() else 1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is done:
+                return
+            yield item
+    
+    def consume():
+        for kind, resource in queued():
+            if kind == 'skipped':
+                seen.append(resource['resource_arn'])
+                record_outcome(backup_results, 'skipped', dict(resource, target=target.name))
+                continue
+            seen.append(resource['arn'])
+            yield backup_fns[kind], resource
+    
+    producer = threading.Thread(target=produce, name=f"discovery-{target.name}", daemon=True)
+    producer.start()
+    try:
+        submit_target_jobs(target, consume(), backup_results, deadline, track_until, run_started)
+    finally:
+        stop.set()
+        producer.join()
+    
+    stats = producer_state['stats']
+    backup_results['discovery'] = {
+        'strategy': stats['strategy'],
+        'source': 'pipeline',
+        'api_calls': dict(stats['api_calls']),
+        'total_api_calls': sum(stats['api_calls'].values())
+    }
+    if 'error' in producer_state:
+        backup_results['discovery']['error'] = producer_state['error']
+    if not producer_state.get('complete'):
+        # Lo no descubierto se completa en la continuación
+        backup_results['discovery']['complete'] = False
+        remaining = backup_results.setdefault('remaining', new_plan())
+        remaining['resume_discovery'] = {'seen': seen}
+    logger.info(f"[{target.name}] Llamadas API de descubrimiento ({stats['strategy']}, pipeline): {stats['api_calls']}")
+    return backup_results
+
+def new_target_results(plan, discovery, skipped=None):
+    results = dict(
+        new_result_counts(),
+        timestamp=datetime.now().isoformat(),
+        discovery=discovery,
+        plan=dict(
+            {kind.lower(): len(plan.get(kind, [])) for kind in RESOURCE_DRIVERS},
+            collapsed=plan.get('collapsed', 0),
+            collapsed_sample=plan.get('collapsed_sample', [])
+        )
+    )
+    for record in skipped or []:
+        record_outcome(results, 'skipped', record)
+    return results
+
+def discover_target_plan(target, force_scan=False):
+    """
+    Descubre los recursos etiquetados de un destino, construye el plan y
+    aplica el control de frescura. Devuelve (resultados iniciales, plan).
+    """
+    # Obtener instancias RDS y clusters Aurora con el tag especificado
+    stats = reset_discovery_stats()
+    with API_METRICS.phase('discovery'):
+        rds_instances, aurora_clusters, source = discover_tagged_resources(target, force_scan)
+    logger.info(f"[{target.name}] Llamadas API de descubrimiento ({stats['strategy']}, {source}): {stats['api_calls']}")
+    
+    with API_METRICS.phase('planning'):
+        plan = build_backup_plan(rds_instances, aurora_clusters, target)
+        
+        # Omitir recursos que ya tienen un backup reciente en el vault
+        skipped = []
+        if MIN_BACKUP_INTERVAL_HOURS > 0:
+            index = build_recovery_point_index(target)
+            if index is not None:
+                for kind in RESOURCE_DRIVERS:
+                    plan[kind] = split_fresh_resources(plan[kind], index, kind, skipped)
+                logger.info(f"[{target.name}] Recursos omitidos por backup reciente: {len(skipped)}")
+                for record in skipped:
+                    record['target'] = target.name
+        
+        stagger_plan(plan, SCHEDULE_WINDOW_MINUTES * 60)
+        
+        # Makespan y jobs simultáneos previstos según el historial del vault
+        estimate = None
+        if DURATION_MODEL_MODE != 'off':
+            estimate = estimate_target_plan(target, plan)
+    
+    discovery = {
+        'strategy': stats['strategy'],
+        'source': source,
+        'cache': dict(stats['cache']),
+        'api_calls': dict(stats['api_calls']),
+        'total_api_calls': sum(stats['api_calls'].values())
+    }
+    results = new_target_results(plan, discovery, skipped)
+    if estimate is not None:
+        results['estimate'] = estimate
+    RUN_LEASE.publish_plan(target, plan)
+    return results, plan
+
+def discover_tagged_resources(target, force_scan=False):
+    """
+    Devuelve (instancias, clusters, origen). Con INVENTORY_MODE=incremental
+    lee el inventario mientras la última reconciliación sea reciente; si no,
+    o con force_scan, escanea la cuenta y reconcilia el inventario con el
+    resultado. El origen es 'scan', 'inventory' o 'reconcile'.
+    """
+    store = get_inventory_store()
+    if store is not None and not force_scan:
+        inventory = store.query(target.name)
+        _count_api_call('inventory_query')
+        if _inventory_is_fresh(inventory.pop(INVENTORY_META_KEY, None)):
+            instances = [entry for arn, entry in inventory.items() if ':db:' in arn]
+            clusters = [entry for arn, entry in inventory.items() if ':cluster:' in arn]
+            logger.info(f"[{target.name}] Inventario: {len(instances)} instancias y {len(clusters)} clusters")
+            return instances, clusters, 'inventory'
+    
+    rds_instances = get_tagged_rds_instances(target)
+    aurora_clusters = get_tagged_aurora_clusters(target)
+    if store is None:
+        return rds_instances, aurora_clusters, 'scan'
+    
+    # Un escaneo con errores puede estar incompleto: no se usa para borrar
+    if get_discovery_stats()['errors']:
+        logger.warning(f"[{target.name}] Escaneo con errores, el inventario no se reconcilia")
+        return rds_instances, aurora_clusters, 'scan'
+    reconcile_inventory(store, target, rds_instances + aurora_clusters)
+    return rds_instances, aurora_clusters, 'reconcile'
 
-def get_tagged_rds_instances():
+def get_tagged_rds_instances(target=None):
     """
     Obtiene todas las instancias RDS con el tag específico
     """
-    tagged_instances = []
+    target = target or DEFAULT_TARGET
+    stats = get_discovery_stats()
     
     try:
-        paginator = rds_client.get_paginator('describe_db_instances')
-        
-        for page in paginator.paginate():
-            for instance in page['DBInstances']:
-                instance_arn = instance['DBInstanceArn']
-                instance_id = instance['DBInstanceIdentifier']
-                
-                # Obtener tags de la instancia
-                try:
-                    tags_response = rds_client.list_tags_for_resource(
-                        ResourceName=instance_arn
-                    )
-                    
-                    # Verificar si tiene el tag correcto
-                    for tag in tags_response.get('TagList', []):
-                        if (tag['Key'] == BACKUP_TAG_KEY and 
-                            tag['Value'] == BACKUP_TAG_VALUE):
-                            tagged_instances.append({
-                                'arn': instance_arn,
-                                'identifier': instance_id,
-                                'engine': instance['Engine']
-                            })
-                            logger.info(f"✓ RDS encontrada: {instance_id} ({instance['Engine']})")
-                            break
-                            
-                except ClientError as e:
-                    logger.warning(f"No se pudieron obtener tags para {instance_id}: {str(e)}")
-                    continue
+        # La primera página sirve para validar la caché y, si no vale, como inicio del escaneo
+        pages = _paginate(target.client('rds'), 'describe_db_instances')
+        first_page = next(pages, {'DBInstances': []})
+        cache_key = (target.name, 'rds:db')
+        fingerprint = DiscoveryCache.fingerprint(first_page, 'DBInstances', 'DBInstanceArn')
+        cached = DISCOVERY_CACHE.get(cache_key, fingerprint)
+        if cached is not None:
+            logger.info(f"Instancias RDS etiquetadas (caché): {len(cached)}")
+            return cached
         
+        errors = stats['errors']
+        tagged_instances = list(iter_tagged_rds_instances(target, chain([first_page], pages)))
+        if stats['errors'] == errors:
+            DISCOVERY_CACHE.put(cache_key, fingerprint, tagged_instances)
         logger.info(f"Total de instancias RDS etiquetadas: {len(tagged_instances)}")
         return tagged_instances
         
     except ClientError as e:
         logger.error(f"Error obteniendo instancias RDS: {str(e)}")
+        stats['errors'] += 1
         return []
 
-def get_tagged_aurora_clusters():
+def get_tagged_aurora_clusters(target=None):
     """
     Obtiene todos los clusters Aurora con el tag específico
     """
-    tagged_clusters = []
+    target = target or DEFAULT_TARGET
+    stats = get_discovery_stats()
     
     try:
-        paginator = rds_client.get_paginator('describe_db_clusters')
-        
-        for page in paginator.paginate():
-            for cluster in page['DBClusters']:
-                cluster_arn = cluster['DBClusterArn']
-                cluster_id = cluster['DBClusterIdentifier']
-                
-                # Obtener tags del cluster
-                try:
-                    tags_response = rds_client.list_tags_for_resource(
-                        ResourceName=cluster_arn
-                    )
-                    
-                    # Verificar si tiene el tag correcto
-                    for tag in tags_response.get('TagList', []):
-                        if (tag['Key'] == BACKUP_TAG_KEY and 
-                            tag['Value'] == BACKUP_TAG_VALUE):
-                            tagged_clusters.append({
-                                'arn': cluster_arn,
-                                'identifier': cluster_id,
-                                'engine': cluster['Engine']
-                            })
-                            logger.info(f"✓ Aurora Cluster encontrado: {cluster_id} ({cluster['Engine']})")
-                            break
-                            
-                except ClientError as e:
-                    logger.warning(f"No se pudieron obtener tags para {cluster_id}: {str(e)}")
-                    continue
+        pages = _paginate(target.client('rds'), 'describe_db_clusters')
+        first_page = next(pages, {'DBClusters': []})
+        cache_key = (target.name, 'rds:cluster')
+        fingerprint = DiscoveryCache.fingerprint(first_page, 'DBClusters', 'DBClusterArn')
+        cached = DISCOVERY_CACHE.get(cache_key, fingerprint)
+        if cached is not None:
+            logger.info(f"Clusters Aurora etiquetados (caché): {len(cached)}")
+            return cached
         
+        errors = stats['errors']
+        tagged_clusters = list(iter_tagged_aurora_clusters(target, chain([first_page], pages)))
+        if stats['errors'] == errors:
+            DISCOVERY_CACHE.put(cache_key, fingerprint, tagged_clusters)
         logger.info(f"Total de clusters Aurora etiquetados: {len(tagged_clusters)}")
         return tagged_clusters
         
     except ClientError as e:
         logger.error(f"Error obteniendo clusters Aurora: {str(e)}")
+        stats['errors'] += 1
         return []
 
-def create_rds_backup(instance):
+def iter_tagged_rds_instances(target, pages=None):
     """
-    Crea un backup on-demand de una instancia RDS usando AWS Backup
+    Genera las instancias RDS etiquetadas página a página; los recursos
+    cuyos tags no se pudieron leer cuentan como error del descubrimiento
     """
-    backup_job_id = None
+    if pages is None:
+        pages = _paginate(target.client('rds'), 'describe_db_instances')
+    is_tagged = _get_discovery_strategy()('rds:db', target)
+    
+    for page in pages:
+        for instance in page['DBInstances']:
+            instance_id = instance['DBInstanceIdentifier']
+            
+            # Verificar si tiene el tag correcto
+            try:
+                if not is_tagged(instance['DBInstanceArn'], instance.get('TagList')):
+                    continue
+            except ClientError as e:
+                logger.warning(f"No se pudieron obtener tags para {instance_id}: {str(e)}")
+                get_discovery_stats()['errors'] += 1
+                continue
+            
+            logger.info(f"✓ RDS encontrada: {instance_id} ({instance['Engine']})")
+            yield _instance_entry(instance)
+
+def iter_tagged_aurora_clusters(target, pages=None):
+    """
+    Genera los clusters Aurora etiquetados página a página
+    """
+    if pages is None:
+        pages = _paginate(target.client('rds'), 'describe_db_clusters')
+    is_tagged = _get_discovery_strategy()('rds:cluster', target)
     
+    for page in pages:
+        for cluster in page['DBClusters']:
+            cluster_id = cluster['DBClusterIdentifier']
+            
+            # Verificar si tiene el tag correcto
+            try:
+                if not is_tagged(cluster['DBClusterArn'], cluster.get('TagList')):
+                    continue
+            except ClientError as e:
+                logger.warning(f"No se pudieron obtener tags para {cluster_id}: {str(e)}")
+                get_discovery_stats()['errors'] += 1
+                continue
+            
+            logger.info(f"✓ Aurora Cluster encontrado: {cluster_id} ({cluster['Engine']})")
+            yield _cluster_entry(cluster)
+
+def _instance_entry(instance):
+    """
+    Datos de una instancia de describe_db_instances que usan el plan y el envío
+    """
+    return {
+        'arn': instance['DBInstanceArn'],
+        'identifier': instance['DBInstanceIdentifier'],
+        'engine': instance['Engine'],
+        'cluster_identifier': instance.get('DBClusterIdentifier'),
+        'allocated_storage': instance.get('AllocatedStorage', 0),
+        'priority': _backup_priority(instance.get('TagList'))
+    }
+
+def _cluster_entry(cluster):
+    """
+    Datos de un cluster de describe_db_clusters que usan el plan y el envío
+    """
+    return {
+        'arn': cluster['DBClusterArn'],
+        'identifier': cluster['DBClusterIdentifier'],
+        'engine': cluster['Engine'],
+        'allocated_storage': cluster.get('AllocatedStorage', 0),
+        'priority': _backup_priority(cluster.get('TagList'))
+    }
+
+# ============================================================
+# Motor de descubrimiento
+# ============================================================
+#
+# Cada estrategia recibe el tipo de recurso de la Tagging API
+# ('rds:db' o 'rds:cluster') y el destino, y devuelve una función
+# is_tagged(arn, tag_list) que decide si el recurso se respalda.
+# Solo se llama a list_tags_for_resource cuando no hay tags en bloque.
+
+def reset_discovery_stats():
+    """
+    Reinicia el contador de llamadas API de la pasada de descubrimiento
+    del thread actual y lo devuelve
+    """
+    _discovery_state.stats = {
+        'strategy': DISCOVERY_STRATEGY,
+        'api_calls': {},
+        'errors': 0,
+        'cache': {'hits': 0, 'misses': 0}
+    }
+    return _discovery_state.stats
+
+def get_discovery_stats():
+    stats = getattr(_discovery_state, 'stats', None)
+    return stats if stats is not None else reset_discovery_stats()
+
+def _count_api_call(operation):
+    calls = get_discovery_stats()['api_calls']
+    calls[operation] = calls.get(operation, 0) + 1
+
+def _paginate(client, operation, **kwargs):
+    """
+    Itera las páginas de una operación contando cada llamada
+    """
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(**kwargs):
+        _count_api_call(operation)
+        yield page
+
+def _backup_priority(tag_list):
+    """
+    Valor entero del tag de prioridad (0 si no existe o no es un número)
+    """
+    for tag in tag_list or []:
+        if tag['Key'] == BACKUP_PRIORITY_TAG_KEY:
+            try:
+                return int(tag['Value'])
+            except ValueError:
+                logger.warning(f"Tag {BACKUP_PRIORITY_TAG_KEY}={tag['Value']} no es un entero, se ignora")
+    return 0
+
+def _has_backup_tag(tag_list):
+    return any(
+        tag['Key'] == BACKUP_TAG_KEY and tag['Value'] == BACKUP_TAG_VALUE
+        for tag in tag_list
+    )
+
+def _fetch_tags_is_tagged(arn, target):
+    """
+    Consulta los tags de un único recurso (fallback N+1)
+    """
+    _count_api_call('list_tags_for_resource')
+    tags_response = target.client('rds').list_tags_for_resource(ResourceName=arn)
+    return _has_backup_tag(tags_response.get('TagList', []))
+
+def _per_resource_strategy(resource_type, target):
+    """
+    Comportamiento original: una llamada list_tags_for_resource por recurso
+    """
+    return lambda arn, tag_list: _fetch_tags_is_tagged(arn, target)
+
+def _inline_strategy(resource_type, target):
+    """
+    Usa el TagList que describe_db_instances/describe_db_clusters ya devuelven
+    """
+    def is_tagged(arn, tag_list):
+        if tag_list is None:
+            return _fetch_tags_is_tagged(arn, target)
+        return _has_backup_tag(tag_list)
+    return is_tagged
+
+def _tagging_api_strategy(resource_type, target):
+    """
+    Obtiene en pocas páginas todos los ARNs etiquetados via Resource Groups
+    Tagging API; si no está disponible recurre a la estrategia inline
+    """
+    tagged_arns = set()
     try:
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        backup_name = f"rds-{instance['identifier']}-{timestamp}"
-        
-        logger.info(f"Iniciando backup para RDS: {instance['identifier']}")
+        for page in _paginate(
+            target.client('resourcegroupstaggingapi'), 'get_resources',
+            TagFilters=[{'Key': BACKUP_TAG_KEY, 'Values': [BACKUP_TAG_VALUE]}],
+            ResourceTypeFilters=[resource_type]
+        ):
+            for mapping in page['ResourceTagMappingList']:
+                tagged_arns.add(mapping['ResourceARN'])
+    except ClientError as e:
+        logger.warning(f"Tagging API no disponible para {resource_type}, usando TagList inline: {str(e)}")
+        return _inline_strategy(resource_type, target)
+    
+    return lambda arn, tag_list: arn in tagged_arns
+
+class DiscoveryCache:
+    """
+    Caché a nivel de módulo de los recursos etiquetados por destino y tipo,
+    que sobrevive entre invocaciones del mismo contenedor caliente. Cada
+    entrada caduca a los ttl segundos y se invalida si cambia la huella de la
+    primera página de describe (número de recursos, marker y ARNs/tags), que
+    hay que pedir de todos modos. Se guardan copias porque el plan modifica
+    los diccionarios de recursos.
+    """
+    
+    def __init__(self, ttl=DISCOVERY_CACHE_TTL_SECONDS, max_entries=DISCOVERY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def fingerprint(page, result_key, arn_key):
+        items = page.get(result_key, [])
+        digest = hashlib.sha256(json.dumps(
+            [[item[arn_key], item.get('TagList')] for item in items], sort_keys=True
+        ).encode('utf-8')).hexdigest()
+        return len(items), page.get('Marker'), digest
+    
+    def get(self, key, fingerprint):
+        """
+        Copia de los recursos cacheados, o None (fallo) si no hay entrada
+        válida; cuenta el acierto o fallo en las estadísticas del descubrimiento
+        """
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.bypass or entry[0] != fingerprint or entry[1] < time.monotonic()):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        get_discovery_stats()['cache']['hits' if entry is not None else 'misses'] += 1
+        return [dict(resource) for resource in entry[2]] if entry is not None else None
+    
+    def put(self, key, fingerprint, resources):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (fingerprint, time.monotonic() + self.ttl, [dict(r) for r in resources])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+DISCOVERY_CACHE = DiscoveryCache()
+
+DISCOVERY_STRATEGIES = {
+    'inline': _inline_strategy,
+    'tagging_api': _tagging_api_strategy,
+    'per_resource': _per_resource_strategy
+}
+
+def _get_discovery_strategy():
+    if DISCOVERY_STRATEGY not in DISCOVERY_STRATEGIES:
+        logger.warning(f"Estrategia de descubrimiento desconocida '{DISCOVERY_STRATEGY}', usando 'inline'")
+        return _inline_strategy
+    return DISCOVERY_STRATEGIES[DISCOVERY_STRATEGY]
+
+# ============================================================
+# Tipos de recurso
+# ============================================================
+#
+# Cada driver declara de qué listado sale su tipo de recurso ('instance' para
+# describe_db_instances, 'cluster' para describe_db_clusters), qué motores
+# (prefijos de Engine) le corresponden y cómo se nombran y etiquetan sus
+# backups. describe_db_clusters ya devuelve los clusters de DocumentDB y
+# Neptune, así que todos los tipos se clasifican con las mismas dos pasadas.
+
+class ResourceDriver:
+    """
+    Tipo de recurso respaldable con AWS Backup
+    """
+    
+    def __init__(self, kind, source, name_prefix, engines=None):
+        self.kind = kind                # clave del plan y ResourceType de AWS Backup
+        self.source = source            # 'instance' o 'cluster'
+        self.name_prefix = name_prefix  # prefijo del nombre del backup y del IdempotencyToken
+        self.engines = engines          # prefijos de Engine; None = el resto de su listado
+    
+    def matches(self, source, engine):
+        if source != self.source:
+            return False
+        return self.engines is None or (engine or '').startswith(self.engines)
+
+# Orden de clasificación: los drivers sin motores concretos van después
+RESOURCE_DRIVERS = {
+    'RDS': ResourceDriver('RDS', 'instance', 'rds'),
+    'Aurora': ResourceDriver('Aurora', 'cluster', 'aurora'),
+    'DocumentDB': ResourceDriver('DocumentDB', 'cluster', 'docdb', engines=('docdb',)),
+    'Neptune': ResourceDriver('Neptune', 'cluster', 'neptune', engines=('neptune',))
+}
+
+ENABLED_RESOURCE_TYPES = {kind.strip() for kind in BACKUP_RESOURCE_TYPES.split(',') if kind.strip()}
+
+def driver_for(source, engine):
+    """
+    Driver de un recurso de describe_db_instances ('instance') o
+    describe_db_clusters ('cluster') según su Engine
+    """
+    fallback = None
+    for driver in RESOURCE_DRIVERS.values():
+        if driver.matches(source, engine):
+            if driver.engines is not None:
+                return driver
+            fallback = fallback or driver
+    return fallback
+
+def new_plan():
+    return dict({kind: [] for kind in RESOURCE_DRIVERS}, collapsed=0, collapsed_sample=[])
+
+def note_collapsed(counts, instance, cluster_id, target=None):
+    """
+    Cuenta una instancia colapsada en su cluster. El plan y el informe solo
+    llevan el total y una muestra acotada (crecerían con la flota); la lista
+    completa va al registro de resultados
+    """
+    counts['collapsed'] += 1
+    if len(counts['collapsed_sample']) < FAILURE_SAMPLE_SIZE:
+        counts['collapsed_sample'].append({'instance': instance['identifier'], 'cluster': cluster_id})
+    RESULT_RECORDS.write({
+        'target': target.name if target else None,
+        'resource': instance['identifier'],
+        'resource_arn': instance['arn'],
+        'cluster': cluster_id,
+        'outcome': 'collapsed'
+    })
+
+def plan_resources(plan):
+    """
+    Lista de (tipo, recurso) de un plan; los tipos ausentes (checkpoints de
+    versiones anteriores) cuentan como vacíos
+    """
+    return [(kind, resource) for kind in RESOURCE_DRIVERS for resource in plan.get(kind, [])]
+
+def plan_identifiers(plan):
+    return {kind.lower(): [r['identifier'] for r in plan.get(kind, [])] for kind in RESOURCE_DRIVERS}
+
+# ============================================================
+# Planificación
+# ============================================================
+
+def build_backup_plan(rds_instances, aurora_clusters, target=None):
+    """
+    Construye el grafo cluster → miembros (via DBClusterIdentifier) y
+    colapsa las instancias miembro en su cluster, ya que AWS Backup
+    respalda el cluster completo. Cada recurso va a la lista de su driver
+    según el Engine. Devuelve un plan sin duplicados:
+    {'RDS': [...], 'Aurora': [...], 'DocumentDB': [...], 'Neptune': [...],
+     'collapsed': N, 'collapsed_sample': [...]}
+    """
+    clusters = {cluster['identifier']: cluster for cluster in aurora_clusters}
+    standalone = []
+    plan = new_plan()
+    
+    for instance in rds_instances:
+        cluster_id = instance.get('cluster_identifier')
+        if not cluster_id:
+            standalone.append(instance)
+            continue
         
-        # Iniciar backup job
-        response = backup_client.start_backup_job(
-            BackupVaultName=BACKUP_VAULT_NAME,
-            ResourceArn=instance['arn'],
-            IamRoleArn=IAM_ROLE_ARN,
-            IdempotencyToken=backup_name,
-            Lifecycle={
-                'DeleteAfterDays': RETENTION_DAYS
-            },
-            RecoveryPointTags={
-                'Name': backup_name,
-                'ResourceType': 'RDS',
-                'ResourceIdentifier': instance['identifier'],
-                'Engine': instance['engine'],
-                'AutomatedBackup': 'True',
-                'CreatedBy': 'Lambda',
-                'RetentionDays': str(RETENTION_DAYS)
+        # Miembro de un cluster no etiquetado: se respalda el cluster
+        if cluster_id not in clusters:
+            clusters[cluster_id] = {
+                'arn': instance['arn'].rsplit(':db:', 1)[0] + f":cluster:{cluster_id}",
+                'identifier': cluster_id,
+                'engine': instance['engine'],
+                'allocated_storage': instance.get('allocated_storage', 0),
+                'priority': instance.get('priority', 0)
             }
-        )
-        
-        backup_job_id = response['BackupJobId']
-        
-        logger.info(f"✅ Backup iniciado - Job ID: {backup_job_id}")
-        
-        return {
-            'success': True,
-            'resource': instance['identifier'],
-            'type': 'RDS',
-            'engine': instance['engine'],
-            'backup_job_id': backup_job_id,
-            'backup_name': backup_name,
-            'vault': BACKUP_VAULT_NAME,
-            'retention_days': RETENTION_DAYS
-        }
-        
+        # El cluster hereda la prioridad más alta de sus miembros
+        cluster = clusters[cluster_id]
+        cluster['priority'] = max(cluster.get('priority', 0), instance.get('priority', 0))
+        note_collapsed(plan, instance, cluster_id, target)
+        logger.info(f"🔗 {instance['identifier']} es miembro de {cluster_id}, se respalda el cluster")
+    
+    for resource in standalone:
+        _add_to_plan(plan, driver_for('instance', resource['engine']), resource)
+    for cluster in clusters.values():
+        _add_to_plan(plan, driver_for('cluster', cluster['engine']), cluster)
+    return plan
+
+def _add_to_plan(plan, driver, resource):
+    if driver.kind not in ENABLED_RESOURCE_TYPES:
+        logger.info(f"⏭️  {driver.kind} {resource['identifier']} excluido por BACKUP_RESOURCE_TYPES")
+        return False
+    plan[driver.kind].append(resource)
+    return True
+
+def iter_backup_plan(target, index=None, counts=None):
+    """
+    Versión en flujo de build_backup_plan para el pipeline: genera
+    (tipo, recurso) según se descubren, primero los clusters etiquetados y
+    después las instancias, colapsando cada miembro en su cluster (el cluster
+    no etiquetado se genera con su primer miembro). Solo recuerda los
+    identificadores de cluster. Con el índice de frescura genera
+    ('skipped', registro) para los recursos con backup reciente. counts (el
+    'plan' del informe) acumula recursos por tipo y miembros colapsados.
+    """
+    if counts is None:
+        counts = dict({kind.lower(): 0 for kind in RESOURCE_DRIVERS}, collapsed=0, collapsed_sample=[])
+    stats = get_discovery_stats()
+    clusters = set()
+    
+    def emit(source, resource):
+        driver = driver_for(source, resource['engine'])
+        if driver.kind not in ENABLED_RESOURCE_TYPES:
+            return
+        skipped = []
+        if index is not None and not split_fresh_resources([resource], index, driver.kind, skipped):
+            yield 'skipped', skipped[0]
+            return
+        counts[driver.kind.lower()] += 1
+        yield driver.kind, resource
+    
+    try:
+        for cluster in iter_tagged_aurora_clusters(target):
+            clusters.add(cluster['identifier'])
+            yield from emit('cluster', cluster)
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_msg = e.response['Error']['Message']
-        logger.error(f"❌ Error creando backup para RDS {instance['identifier']}: [{error_code}] {error_msg}")
-        
-        return {
-            'success': False,
-            'resource': instance['identifier'],
-            'type': 'RDS',
-            'error_code': error_code,
-            'error': error_msg
-        }
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"❌ Error inesperado para RDS {instance['identifier']}: {error_msg}")
-        
-        return {
-            'success': False,
-            'resource': instance['identifier'],
-            'type': 'RDS',
-            'error': error_msg
-        }
+        logger.error(f"Error obteniendo clusters Aurora: {str(e)}")
+        stats['errors'] += 1
+    
+    try:
+        for instance in iter_tagged_rds_instances(target):
+            cluster_id = instance.get('cluster_identifier')
+            if not cluster_id:
+                yield from emit('instance', instance)
+                continue
+            
+            note_collapsed(counts, instance, cluster_id, target)
+            logger.info(f"🔗 {instance['identifier']} es miembro de {cluster_id}, se respalda el cluster")
+            if cluster_id in clusters:
+                continue
+            # Miembro de un cluster no etiquetado: se respalda el cluster
+            clusters.add(cluster_id)
+            yield from emit('cluster', {
+                'arn': instance['arn'].rsplit(':db:', 1)[0] + f":cluster:{cluster_id}",
+                'identifier': cluster_id,
+                'engine': instance['engine'],
+                'allocated_storage': instance.get('allocated_storage', 0),
+                'priority': instance.get('priority', 0)
+            })
+    except ClientError as e:
+        logger.error(f"Error obteniendo instancias RDS: {str(e)}")
+        stats['errors'] += 1
 
-def create_aurora_backup(cluster):
+def log_backup_plan(plan, target):
     """
-    Crea un backup on-demand de un cluster Aurora usando AWS Backup
+    Imprime el plan de backup (modo dry-run)
     """
-    backup_job_id = None
+    logger.info(f"📋 PLAN DE BACKUP [{target.name}] (orden: {plan.get('order', SCHEDULE_ORDER)})")
+    for kind, resource in order_plan(plan):
+        details = f"{resource['engine']}, {resource.get('allocated_storage', 0)} GB, prioridad {resource.get('priority', 0)}"
+        if 'estimated_seconds' in resource:
+            details += f", ~{resource['estimated_seconds']:.0f} s"
+        if resource.get('not_before'):
+            details += f", desde {datetime.fromtimestamp(resource['not_before'], timezone.utc).strftime('%H:%M:%S')} UTC"
+        logger.info(f"  • {kind} {resource['identifier']} ({details})")
+    for member in plan.get('collapsed_sample', []):
+        logger.info(f"  ↳ {member['instance']} incluido en el cluster {member['cluster']}")
+    if plan.get('collapsed', 0) > len(plan.get('collapsed_sample', [])):
+        logger.info(f"  ↳ ... y {plan['collapsed'] - len(plan['collapsed_sample'])} instancias más incluidas en su cluster")
+
+SCHEDULE_ORDERS = ('discovery', 'largest_first', 'smallest_first', 'longest_first')
+
+def order_plan(plan):
+    """
+    Lista de (tipo, recurso) en orden de envío: primero por el tag de
+    prioridad (mayor primero) y después por tamaño según SCHEDULE_ORDER
+    (o el 'order' que la estimación haya fijado en el plan).
+    largest_first acorta el makespan (los backups largos empiezan antes);
+    smallest_first maximiza los recursos respaldados si el tiempo se acaba;
+    longest_first usa la duración estimada por el modelo histórico.
+    Los clusters (Aurora, DocumentDB, Neptune) informan AllocatedStorage = 1,
+    así que por tamaño quedan como los más pequeños: para ordenarlos hay que
+    usar el tag de prioridad o longest_first, que aprende su duración real.
+    """
+    order = plan.get('order', SCHEDULE_ORDER)
+    ordered = plan_resources(plan)
+    if order == 'largest_first':
+        ordered.sort(key=lambda item: -(item[1].get('allocated_storage') or 0))
+    elif order == 'smallest_first':
+        ordered.sort(key=lambda item: item[1].get('allocated_storage') or 0)
+    elif order == 'longest_first':
+        ordered.sort(key=lambda item: -item[1].get('estimated_seconds', item[1].get('allocated_storage') or 0))
+    elif order not in SCHEDULE_ORDERS:
+        logger.warning(f"Orden de envío desconocido '{order}', se usa el de descubrimiento")
+    # sort es estable: la prioridad manda y el tamaño desempata
+    ordered.sort(key=lambda item: -(item[1].get('priority') or 0))
+    return ordered
+
+def stagger_plan(plan, window_seconds, start=None):
+    """
+    Reparte los recursos del plan a lo largo de la ventana en su orden de
+    envío, anotando en cada uno el instante 'not_before' (epoch). Se guarda
+    con el plan, así que las continuaciones y los workers lo respetan.
+    """
+    ordered = order_plan(plan)
+    if window_seconds <= 0 or not ordered:
+        return
+    start = time.time() if start is None else start
+    step = window_seconds / len(ordered)
+    for rank, (kind, resource) in enumerate(ordered):
+        resource['not_before'] = round(start + rank * step, 3)
+
+# ============================================================
+# Control de frescura
+# ============================================================
+
+def build_recovery_point_index(target, since=None):
+    """
+    Indexa por ARN de recurso la fecha del backup más reciente del vault
+    (recovery points y jobs todavía en curso) usando listados paginados en
+    bloque, sin una consulta por recurso. Devuelve None si no se pudo leer
+    el vault, en cuyo caso no se omite ningún recurso.
+    """
+    if since is None:
+        since = datetime.now(timezone.utc) - timedelta(hours=MIN_BACKUP_INTERVAL_HOURS)
+    
+    index = {}
     
+    def record(resource_arn, created):
+        if resource_arn and (resource_arn not in index or created > index[resource_arn]):
+            index[resource_arn] = created
+    
+    backup = target.client('backup')
     try:
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        backup_name = f"aurora-{cluster['identifier']}-{timestamp}"
+        for page in _paginate(
+            backup, 'list_recovery_points_by_backup_vault',
+            BackupVaultName=BACKUP_VAULT_NAME, ByCreatedAfter=since
+        ):
+            for point in page['RecoveryPoints']:
+                if point.get('Status') not in ('EXPIRED', 'DELETING'):
+                    record(point.get('ResourceArn'), point['CreationDate'])
         
-        logger.info(f"Iniciando backup para Aurora: {cluster['identifier']}")
+        for page in _paginate(
+            backup, 'list_backup_jobs',
+            ByBackupVaultName=BACKUP_VAULT_NAME, ByCreatedAfter=since
+        ):
+            for job in page['BackupJobs']:
+                if job.get('State') in ('CREATED', 'PENDING', 'RUNNING', 'COMPLETED'):
+                    record(job.get('ResourceArn'), job['CreationDate'])
+    except ClientError as e:
+        logger.warning(f"[{target.name}] No se pudo indexar el vault {BACKUP_VAULT_NAME}, no se omitirá ningún recurso: {str(e)}")
+        return None
+    
+    return index
+
+def split_fresh_resources(resources, index, resource_type, skipped):
+    """
+    Devuelve los recursos sin backup reciente y añade el resto a `skipped`
+    """
+    pending = []
+    for resource in resources:
+        last_backup = index.get(resource['arn'])
+        if last_backup is None:
+            pending.append(resource)
+            continue
+        logger.info(f"⏭️  Omitido {resource_type} {resource['identifier']}: backup reciente ({last_backup.isoformat()})")
+        skipped.append({
+            'resource': resource['identifier'],
+            'resource_arn': resource['arn'],
+            'type': resource_type,
+            'engine': resource['engine'],
+            'reason': 'recent_backup',
+            'last_backup': last_backup.isoformat()
+        })
+    return pending
+
+# ============================================================
+# Modelo de duración de jobs
+# ============================================================
+#
+# El modelo se aprende de los jobs COMPLETED del vault (list_backup_jobs en
+# páginas de hasta 1000, sin consultas por recurso) y se guarda compacto en
+# el almacén de estado: por ARN [jobs, media s, máximo s, media bytes], más
+# los segundos por GB y la duración típica para recursos sin historial. Se
+# reconstruye cada DURATION_MODEL_REFRESH_HOURS.
+
+DURATION_MODEL_MODES = ('off', 'warn', 'reorder')
+
+class JobDurationModel:
+    """
+    Duración y tamaño de los backups de cada recurso según su historial
+    """
+    
+    def __init__(self, resources=None, seconds_per_gb=0.0, default_seconds=0.0, built_at=0.0):
+        self.resources = resources or {}
+        self.seconds_per_gb = seconds_per_gb
+        self.default_seconds = default_seconds
+        self.built_at = built_at
+    
+    @classmethod
+    def learn(cls, target, lookback_days=None):
+        lookback_days = DURATION_MODEL_LOOKBACK_DAYS if lookback_days is None else lookback_days
+        since = datetime.now(timezone.utc) - timedelta(days=lookback_days)
+        totals = {}  # ARN -> [jobs, segundos, máximo, bytes]
+        rates = []
+        for page in _paginate(
+            target.client('backup'), 'list_backup_jobs',
+            ByBackupVaultName=BACKUP_VAULT_NAME, ByState='COMPLETED', ByCompleteAfter=since
+        ):
+            for job in page['BackupJobs']:
+                if not job.get('CompletionDate') or not job.get('ResourceArn'):
+                    continue
+                seconds = max(0.0, (job['CompletionDate'] - job['CreationDate']).total_seconds())
+                size = job.get('BackupSizeInBytes') or 0
+                entry = totals.setdefault(job['ResourceArn'], [0, 0.0, 0.0, 0])
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+                entry[3] += size
+                if size:
+                    rates.append(seconds / (size / 1024 ** 3))
+        
+        resources = {
+            arn: [jobs, round(total / jobs, 1), round(longest, 1), round(size / jobs)]
+            for arn, (jobs, total, longest, size) in totals.items()
+        }
+        means = [entry[1] for entry in resources.values()]
+        return cls(
+            resources,
+            seconds_per_gb=round(statistics.median(rates), 3) if rates else 0.0,
+            default_seconds=round(statistics.median(means), 1) if means else 0.0,
+            built_at=time.time()
+        )
+    
+    def estimate(self, resource):
+        """
+        (segundos estimados, si el recurso tiene historial propio). Sin
+        historial se usa el tamaño por los segundos por GB del vault; los
+        clusters informan AllocatedStorage = 1 y usan la duración típica
+        """
+        entry = self.resources.get(resource['arn'])
+        if entry:
+            return entry[1], True
+        size = resource.get('allocated_storage') or 0
+        if self.seconds_per_gb and size > 1:
+            return size * self.seconds_per_gb, False
+        return self.default_seconds, False
+    
+    def to_json(self):
+        return json.dumps({
+            'built_at': self.built_at,
+            'seconds_per_gb': self.seconds_per_gb,
+            'default_seconds': self.default_seconds,
+            'resources': self.resources
+        }, separators=(',', ':'))
+    
+    @classmethod
+    def from_json(cls, body):
+        data = json.loads(body)
+        return cls(data['resources'], data['seconds_per_gb'], data['default_seconds'], data['built_at'])
+
+def load_duration_model(target):
+    """
+    Modelo del destino desde el almacén de estado, reconstruido si tiene más
+    de DURATION_MODEL_REFRESH_HOURS. Devuelve None si no hay modelo posible.
+    """
+    store = get_state_store()
+    key = f"duration-model/{target.name}.json"
+    model = None
+    try:
+        body = store.get(key)
+        if body:
+            model = JobDurationModel.from_json(body)
+            if time.time() - model.built_at < DURATION_MODEL_REFRESH_HOURS * 3600:
+                return model
+    except (ClientError, ValueError, KeyError) as e:
+        logger.warning(f"[{target.name}] Modelo de duración ilegible, se reconstruye: {str(e)}")
+    
+    try:
+        model = JobDurationModel.learn(target)
+    except ClientError as e:
+        logger.warning(f"[{target.name}] No se pudo leer el historial de jobs del vault {BACKUP_VAULT_NAME}: {str(e)}")
+        return model
+    logger.info(f"[{target.name}] Modelo de duración reconstruido: {len(model.resources)} recursos con historial")
+    try:
+        store.put(key, model.to_json())
+    except ClientError as e:
+        logger.warning(f"[{target.name}] No se pudo guardar el modelo de duración: {str(e)}")
+    return model
+
+def run_finish_by(now=None):
+    """
+    Próxima hora RUN_FINISH_BY_UTC (HH:MM) posterior a now, o None
+    """
+    if not RUN_FINISH_BY_UTC:
+        return None
+    now = now or datetime.now(timezone.utc)
+    hour, minute = (int(part) for part in RUN_FINISH_BY_UTC.split(':'))
+    finish_by = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if finish_by <= now:
+        finish_by += timedelta(days=1)
+    return finish_by
+
+def simulate_run(ordered, model, start, submit_rate=None, max_in_flight=None):
+    """
+    Simula el envío de la lista ordenada de (tipo, recurso): cada job empieza
+    al llegar su turno según la tasa de envío, su 'not_before' y el techo de
+    jobs activos, y dura lo que estima el modelo. Devuelve el makespan (desde
+    start, epoch) y el pico de jobs simultáneos.
+    """
+    submit_rate = submit_rate or BACKUP_SUBMIT_RATE
+    max_in_flight = MAX_IN_FLIGHT_JOBS if max_in_flight is None else max_in_flight
+    running = []  # heap con el fin de cada job activo
+    clock = 0.0
+    makespan = 0.0
+    peak = 0
+    known = 0
+    for position, (kind, resource) in enumerate(ordered):
+        clock = max(clock, position / submit_rate, resource.get('not_before', start) - start)
+        while running and running[0] <= clock:
+            heapq.heappop(running)
+        while max_in_flight and len(running) >= max_in_flight:
+            clock = max(clock, heapq.heappop(running))
+        seconds, has_history = model.estimate(resource)
+        known += has_history
+        heapq.heappush(running, clock + seconds)
+        peak = max(peak, len(running))
+        makespan = max(makespan, clock + seconds)
+    return {
+        'resources': len(ordered),
+        'with_history': known,
+        'makespan_seconds': round(makespan, 1),
+        'peak_concurrent_jobs': peak,
+        'estimated_finish': datetime.fromtimestamp(start + makespan, timezone.utc).isoformat()
+    }
+
+def estimate_target_plan(target, plan):
+    """
+    Estima el makespan y el pico de jobs del plan. Si el fin previsto pasa de
+    RUN_FINISH_BY_UTC avisa y, con DURATION_MODEL_MODE=reorder, reordena el
+    plan de mayor a menor duración estimada (y lo vuelve a escalonar) cuando
+    eso acorta la estimación. El orden elegido se guarda en plan['order'].
+    """
+    if DURATION_MODEL_MODE not in DURATION_MODEL_MODES:
+        logger.warning(f"DURATION_MODEL_MODE desconocido '{DURATION_MODEL_MODE}', se usa warn")
+    model = load_duration_model(target)
+    if model is None:
+        return {'available': False}
+    
+    for _, resource in plan_resources(plan):
+        resource['estimated_seconds'] = round(model.estimate(resource)[0], 1)
+    
+    start = time.time()
+    finish_by = run_finish_by(datetime.fromtimestamp(start, timezone.utc))
+    estimate = simulate_run(order_plan(plan), model, start)
+    estimate.update(model_resources=len(model.resources), reordered=False)
+    
+    def late(result):
+        return finish_by is not None and start + result['makespan_seconds'] > finish_by.timestamp()
+    
+    if late(estimate) and DURATION_MODEL_MODE == 'reorder' and plan.get('order', SCHEDULE_ORDER) != 'longest_first':
+        previous_order = plan.get('order')
+        plan['order'] = 'longest_first'
+        stagger_plan(plan, SCHEDULE_WINDOW_MINUTES * 60, start)
+        reordered = simulate_run(order_plan(plan), model, start)
+        if reordered['makespan_seconds'] < estimate['makespan_seconds']:
+            logger.info(
+                f"[{target.name}] Plan reordenado por duración estimada: makespan "
+                f"{estimate['makespan_seconds']:.0f} s -> {reordered['makespan_seconds']:.0f} s"
+            )
+            reordered.update(model_resources=len(model.resources), reordered=True,
+                             makespan_before_seconds=estimate['makespan_seconds'])
+            estimate = reordered
+        else:
+            if previous_order is None:
+                del plan['order']
+            else:
+                plan['order'] = previous_order
+            stagger_plan(plan, SCHEDULE_WINDOW_MINUTES * 60, start)
+    
+    estimate['finish_by'] = finish_by.isoformat() if finish_by else None
+    estimate['exceeds_deadline'] = late(estimate)
+    logger.info(
+        f"[{target.name}] Estimación: {estimate['resources']} recursos, makespan {estimate['makespan_seconds']:.0f} s, "
+        f"pico de {estimate['peak_concurrent_jobs']} jobs, fin previsto {estimate['estimated_finish']}"
+    )
+    if estimate['exceeds_deadline']:
+        slowest = sorted(plan_resources(plan), key=lambda item: -item[1]['estimated_seconds'])[:3]
+        logger.warning(
+            f"⚠️  [{target.name}] El fin previsto ({estimate['estimated_finish']}) pasa de "
+            f"{estimate['finish_by']}; recursos más lentos: "
+            f"{[(r['identifier'], r['estimated_seconds']) for _, r in slowest]}"
+        )
+    return estimate
+
+# ============================================================
+# Seguimiento de jobs
+# ============================================================
+
+class BackupJobTracker:
+    """
+    Reconcilia el estado de los jobs de una ejecución con unas pocas
+    llamadas paginadas a list_backup_jobs (filtradas por vault y fecha de
+    creación) en lugar de un describe_backup_job por job. El estado se
+    conserva entre sondeos y, tras el primero, solo se piden los jobs
+    completados desde el sondeo anterior.
+    """
+    
+    TERMINAL_STATES = ('COMPLETED', 'FAILED', 'ABORTED', 'EXPIRED', 'PARTIAL')
+    
+    def __init__(self, target, since, job_ids=None):
+        self.target = target
+        # Margen para desfases de reloj entre la Lambda y AWS Backup
+        self.since = since - timedelta(minutes=5)
+        self.track_all = job_ids is None
+        self.jobs = {job_id: {'state': 'UNKNOWN'} for job_id in job_ids or []}
+        self.pending = set(self.jobs)
+        self.polls = 0
+        self.api_calls = 0
+        self.error = None
+        self._last_poll = None
+    
+    def poll(self):
+        """
+        Actualiza el estado de los jobs; devuelve True si ya no queda ninguno
+        pendiente o si list_backup_jobs falla (el seguimiento se abandona con
+        el último estado conocido y el error queda en el resumen)
+        """
+        filters = {'ByBackupVaultName': BACKUP_VAULT_NAME, 'ByCreatedAfter': self.since}
+        poll_started = datetime.now(timezone.utc)
+        if self._last_poll is not None:
+            filters['ByCompleteAfter'] = self._last_poll - timedelta(minutes=1)
+        
+        paginator = self.target.client('backup').get_paginator('list_backup_jobs')
+        try:
+            for page in paginator.paginate(**filters):
+                self.api_calls += 1
+                for job in page['BackupJobs']:
+                    self._record(job)
+        except ClientError as e:
+            self.error = f"[{e.response['Error']['Code']}] {e.response['Error']['Message']}"
+            logger.warning(f"⚠️  [{self.target.name}] Seguimiento interrumpido con {len(self.pending)} jobs pendientes: {self.error}")
+            return True
+        
+        self.polls += 1
+        self._last_poll = poll_started
+        return not self.pending
+    
+    def _record(self, job):
+        job_id = job['BackupJobId']
+        if job_id not in self.jobs:
+            if not self.track_all:
+                return
+            self.pending.add(job_id)
+        
+        state = job['State']
+        entry = {'state': state, 'resource_arn': job.get('ResourceArn')}
+        if job.get('CompletionDate'):
+            entry['duration_seconds'] = round((job['CompletionDate'] - job['CreationDate']).total_seconds())
+        if job.get('StatusMessage') and state != 'COMPLETED':
+            entry['status_message'] = job['StatusMessage']
+        self.jobs[job_id] = entry
+        
+        if state in self.TERMINAL_STATES:
+            self.pending.discard(job_id)
+    
+    def wait(self, deadline, interval=None):
+        """
+        Sondea hasta que todos los jobs terminen o se alcance el deadline
+        (valor de time.monotonic())
+        """
+        interval = interval or TRACK_POLL_INTERVAL_SECONDS
+        while not self.poll():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+    
+    def summary(self):
+        counts = {}
+        failure_sample = []
+        for job_id, entry in self.jobs.items():
+            counts[entry['state']] = counts.get(entry['state'], 0) + 1
+            if entry['state'] in ('FAILED', 'ABORTED', 'EXPIRED', 'PARTIAL') and len(failure_sample) < FAILURE_SAMPLE_SIZE:
+                failure_sample.append(dict(entry, backup_job_id=job_id))
+        
+        summary = {
+            'counts': counts,
+            'pending': len(self.pending),
+            'polls': self.polls,
+            'api_calls': self.api_calls,
+            'failure_sample': failure_sample
+        }
+        if self.error:
+            summary['error'] = self.error
+        return summary
+    
+    def write_records(self):
+        """
+        Envía el último estado conocido de cada job al sink de registros
+        """
+        for job_id, entry in self.jobs.items():
+            record = dict(entry, backup_job_id=job_id, target=self.target.name)
+            RESULT_RECORDS.write(dict(record, outcome='tracked'))
+            RUN_HISTORY.add(record, 'tracked')
+
+def tracking_deadline(seconds, context=None):
+    """
+    Deadline de seguimiento acotado por el tiempo que le queda a la Lambda
+    """
+    if context is not None:
+        seconds = min(seconds, context.get_remaining_time_in_millis() / 1000 - 30)
+    return time.monotonic() + max(0, seconds)
+
+def run_tracking(event, context):
+    """
+    Modo de seguimiento como ejecución programada aparte:
+    {'mode': 'track', 'since': ISO-8601, 'job_ids': [...], 'wait_seconds': N}.
+    Sin job_ids se siguen todos los jobs del vault creados desde `since`.
+    """
+    since = event.get('since')
+    if since:
+        since = datetime.fromisoformat(since)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+    else:
+        since = datetime.now(timezone.utc) - timedelta(hours=TRACK_LOOKBACK_HOURS)
+    
+    deadline = tracking_deadline(int(event.get('wait_seconds', 0)), context)
+    
+    results = {'timestamp': datetime.now().isoformat(), 'since': since.isoformat(), 'targets': {}}
+    tracking_timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    RESULT_RECORDS.open('results/tracking', tracking_timestamp)
+    RUN_HISTORY.open(f"tracking-{tracking_timestamp}", tracking_timestamp, 'tracking')
+    for target in resolve_targets(event) or [DEFAULT_TARGET]:
+        tracker = BackupJobTracker(target, since=since, job_ids=event.get('job_ids'))
+        tracker.wait(deadline)
+        tracker.write_records()
+        summary = tracker.summary()
+        results['targets'][target.name] = summary
+        logger.info(f"📊 [{target.name}] Estado de jobs: {summary['counts']} (pendientes: {summary['pending']})")
+    
+    failed = any(
+        summary['counts'].get(state) or summary.get('error')
+        for summary in results['targets'].values()
+        for state in ('FAILED', 'ABORTED', 'EXPIRED')
+    )
+    results['records'] = RESULT_RECORDS.close()
+    results['history'] = RUN_HISTORY.close()
+    return {
+        'statusCode': 207 if failed else 200,
+        'body': json.dumps(results, default=str, indent=2)
+    }
+
+# ============================================================
+# Aplicación de retención
+# ============================================================
+#
+# La retención solo se fija al crear el backup (Lifecycle de start_backup_job),
+# así que cambiar RETENTION_DAYS no afecta a los recovery points existentes.
+# El modo retention lista el vault una vez, se queda con los recovery points
+# creados por la Lambda (tags AutomatedBackup=True y CreatedBy=Lambda) y
+# actualiza su ciclo de vida, o los borra si ya superan la retención.
+
+# Tags que start_backup_job escribe en los recovery points de la Lambda
+AUTOMATED_RECOVERY_POINT_TAGS = {'AutomatedBackup': 'True', 'CreatedBy': 'Lambda'}
+
+# Estados en los que un recovery point admite cambios de ciclo de vida o borrado
+RETENTION_ACTIONABLE_STATES = ('COMPLETED', 'AVAILABLE', 'PARTIAL', 'EXPIRED')
+
+def automated_recovery_point_filter(target):
+    """
+    Devuelve is_automated(point) para los recovery points del vault. Los de
+    RDS/Aurora son snapshots, así que sus tags se obtienen en bloque con la
+    Tagging API; si no está disponible se consulta backup:ListTags por punto.
+    """
+    tag_filters = [{'Key': key, 'Values': [value]} for key, value in AUTOMATED_RECOVERY_POINT_TAGS.items()]
+    tagged_arns = set()
+    try:
+        for page in _paginate(
+            target.client('resourcegroupstaggingapi'), 'get_resources',
+            TagFilters=tag_filters, ResourceTypeFilters=['rds:snapshot', 'rds:cluster-snapshot']
+        ):
+            for mapping in page['ResourceTagMappingList']:
+                tagged_arns.add(mapping['ResourceARN'])
+        return lambda point: point['RecoveryPointArn'] in tagged_arns
+    except ClientError as e:
+        logger.warning(f"[{target.name}] Tagging API no disponible, se consultan los tags por recovery point: {str(e)}")
+    
+    def is_automated(point):
+        _count_api_call('list_tags')
+        tags = target.client('backup').list_tags(ResourceArn=point['RecoveryPointArn']).get('Tags', {})
+        return all(tags.get(key) == value for key, value in AUTOMATED_RECOVERY_POINT_TAGS.items())
+    return is_automated
+
+def retention_action(point, now=None):
+    """
+    Acción que lleva el recovery point a la política actual: ('delete', None)
+    si ya supera RETENTION_DAYS, ('update', lifecycle) si su DeleteAfterDays
+    es otro, o (None, None) si cumple o no admite cambios. Borrar es opt-in
+    (RETENTION_DELETE_EXPIRED); sin él un punto que ya supera la retención
+    se conserva con ('keep', None), porque acortar su ciclo de vida haría
+    que AWS Backup lo borrase igualmente.
+    """
+    if point.get('Status') not in RETENTION_ACTIONABLE_STATES:
+        return None, None
+    now = now or datetime.now(timezone.utc)
+    if point['CreationDate'] + timedelta(days=RETENTION_DAYS) <= now:
+        return ('delete' if RETENTION_DELETE_EXPIRED else 'keep'), None
+    lifecycle = point.get('Lifecycle') or {}
+    if lifecycle.get('DeleteAfterDays') == RETENTION_DAYS:
+        return None, None
+    return 'update', dict(lifecycle, DeleteAfterDays=RETENTION_DAYS)
+
+def apply_retention_action(target, action, point, lifecycle=None, dry_run=False):
+    """
+    Aplica una acción de retención; devuelve un resultado con el mismo
+    formato que los de envío ('success', 'error_code') para usar stream_backups
+    """
+    result = {
+        'success': True,
+        'resource': point['RecoveryPointArn'],
+        'source_resource': point.get('ResourceArn'),
+        'type': point.get('ResourceType'),
+        'action': action,
+        'created': point['CreationDate'].isoformat(),
+        'lifecycle_before': point.get('Lifecycle'),
+        'lifecycle_after': lifecycle
+    }
+    if dry_run:
+        return result
+    backup = target.client('backup')
+    try:
+        if action == 'delete':
+            backup.delete_recovery_point(
+                BackupVaultName=BACKUP_VAULT_NAME, RecoveryPointArn=point['RecoveryPointArn']
+            )
+        else:
+            backup.update_recovery_point_lifecycle(
+                BackupVaultName=BACKUP_VAULT_NAME, RecoveryPointArn=point['RecoveryPointArn'],
+                Lifecycle=lifecycle
+            )
+    except ClientError as e:
+        result.update(
+            success=False,
+            error_code=e.response['Error']['Code'],
+            error=e.response['Error']['Message']
+        )
+    return result
+
+def enforce_target_retention(target, dry_run=False, deadline=None):
+    """
+    Recorre el vault del destino en una sola pasada paginada y después
+    aplica en paralelo, con rate limiter y reintentos, las acciones de
+    retención de los recovery points de la Lambda. Las acciones se calculan
+    antes de aplicar ninguna para no borrar puntos mientras se pagina el
+    listado. Las no aplicadas antes del deadline se cuentan en
+    'not_processed' y las recoge la siguiente ejecución.
+    """
+    stats = reset_discovery_stats()
+    results = dict(new_result_counts(), dry_run=dry_run)
+    retention = {'scanned': 0, 'automated': 0, 'compliant': 0, 'update': 0, 'delete': 0, 'expired_kept': 0, 'not_processed': 0}
+    is_automated = automated_recovery_point_filter(target)
+    now = datetime.now(timezone.utc)
+    
+    actions = []
+    with API_METRICS.phase('retention_scan'):
+        for page in _paginate(
+            target.client('backup'), 'list_recovery_points_by_backup_vault', BackupVaultName=BACKUP_VAULT_NAME
+        ):
+            for point in page['RecoveryPoints']:
+                retention['scanned'] += 1
+                if not is_automated(point):
+                    continue
+                retention['automated'] += 1
+                action, lifecycle = retention_action(point, now)
+                if action is None:
+                    retention['compliant'] += 1
+                    continue
+                if action == 'keep':
+                    retention['expired_kept'] += 1
+                    continue
+                retention[action] += 1
+                actions.append((partial(apply_retention_action, target, action, lifecycle=lifecycle), point))
+    logger.info(f"[{target.name}] Recovery points: {retention}")
+    
+    results['retention'] = retention
+    results['api_calls'] = dict(stats['api_calls'])
+    if dry_run:
+        for apply_fn, point in actions:
+            record_outcome(results, 'skipped', dict(apply_fn(point, dry_run=True), target=target.name))
+        return results
+    
+    limiter = AdaptiveRateLimiter(RETENTION_ACTION_RATE)
+    with API_METRICS.phase('retention'):
+        for _, _, result in stream_backups(actions, limiter, deadline=deadline, retry_queue=RetryQueue()):
+            if result is None:
+                retention['not_processed'] += 1
+                continue
+            result['target'] = target.name
+            record_outcome(results, 'successful' if result['success'] else 'failed', result)
+    
+    results['submission'] = limiter.stats()
+    return results
+
+def run_retention(event, context):
+    """
+    Modo de aplicación de retención: {'mode': 'retention', 'dry_run': bool,
+    'targets': [...]}. Con dry_run solo informa de las acciones.
+    """
+    dry_run = bool(event.get('dry_run', DRY_RUN))
+    deadline = execution_deadline(context)
+    logger.info(f"Aplicando retención de {RETENTION_DAYS} días en el vault {BACKUP_VAULT_NAME}{' (dry-run)' if dry_run else ''}")
+    
+    results = dict(new_result_counts(), timestamp=datetime.now().isoformat(), targets={})
+    RESULT_RECORDS.open('results/retention', datetime.now().strftime('%Y%m%d-%H%M%S'))
+    for target in resolve_targets(event) or [DEFAULT_TARGET]:
+        try:
+            section = enforce_target_retention(target, dry_run, deadline)
+        except ClientError as e:
+            logger.error(f"❌ [{target.name}] Error aplicando retención: {str(e)}")
+            section = dict(new_result_counts(), error=str(e))
+        merge_result_counts(results, section)
+        results['targets'][target.name] = section
+        logger.info(f"🗂️  [{target.name}] Retención: {section.get('retention')} (fallidos: {section['failed']})")
+    
+    results['records'] = RESULT_RECORDS.close()
+    failed = results['failed'] or any('error' in section for section in results['targets'].values())
+    return {
+        'statusCode': 207 if failed else 200,
+        'body': json.dumps(results, default=str, indent=2)
+    }
+
+# ============================================================
+# Fan-out multi-región / multi-cuenta
+# ============================================================
+
+class BackupTarget:
+    """
+    Región/cuenta destino con su propio pool de clientes. Sin role_arn usa
+    las credenciales de la Lambda; con role_arn asume el rol via STS la
+    primera vez que necesita un cliente.
+    """
+    
+    def __init__(self, region=None, role_arn=None, backup_role_arn=None, clients=None):
+        self.region = region
+        self.role_arn = role_arn
+        self.account = role_arn.split(':')[4] if role_arn else None
+        if backup_role_arn:
+            self.backup_role_arn = backup_role_arn
+        elif role_arn:
+            partition = role_arn.split(':')[1]
+            self.backup_role_arn = f"arn:{partition}:iam::{self.account}:role/{TARGET_BACKUP_ROLE_NAME}"
+        else:
+            self.backup_role_arn = IAM_ROLE_ARN
+        self._clients = dict(clients or {})
+        self._session = None
+        self._lock = threading.Lock()
+    
+    def spec(self):
+        """
+        Descripción serializable del destino (None para el destino por defecto)
+        """
+        if self is DEFAULT_TARGET:
+            return None
+        return {'region': self.region, 'role_arn': self.role_arn, 'backup_role_arn': self.backup_role_arn}
+    
+    @property
+    def name(self):
+        return f"{self.region or os.environ.get('AWS_REGION', 'default')}/{self.account or 'local'}"
+    
+    def _get_session(self):
+        if self._session is None:
+            if self.role_arn:
+                credentials = DEFAULT_TARGET.client('sts').assume_role(
+                    RoleArn=self.role_arn,
+                    RoleSessionName='rds-backup-automation'
+                )['Credentials']
+                self._session = boto3.Session(
+                    aws_access_key_id=credentials['AccessKeyId'],
+                    aws_secret_access_key=credentials['SecretAccessKey'],
+                    aws_session_token=credentials['SessionToken'],
+                    region_name=self.region
+                )
+            else:
+                self._session = boto3.Session(region_name=self.region)
+        return self._session
+    
+    def client(self, service, config=None):
+        """
+        Devuelve el cliente memoizado del servicio, creándolo (y la sesión)
+        solo la primera vez que se necesita
+        """
+        key = service if config is None else (service, id(config))
+        with self._lock:
+            if key not in self._clients:
+                client_config = CLIENT_CONFIG if config is None else CLIENT_CONFIG.merge(config)
+                client = self._get_session().client(service, config=client_config)
+                for hook in _client_hooks:
+                    hook(service, client)
+                self._clients[key] = client
+            return self._clients[key]
+
+# Destino por defecto: la región y cuenta de la propia Lambda
+DEFAULT_TARGET = BackupTarget()
+
+def get_client(service, config=None):
+    """
+    Cliente memoizado de la región/cuenta de la Lambda
+    """
+    return DEFAULT_TARGET.client(service, config)
+
+def register_client_hook(hook):
+    """
+    Registra hook(service, client), llamado al crear cada cliente nuevo
+    (p.ej. para instrumentar o simular los eventos de botocore)
+    """
+    _client_hooks.append(hook)
+
+# ============================================================
+# Métricas de llamadas API (CloudWatch Embedded Metric Format)
+# ============================================================
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Valores como máximo por métrica en un registro EMF
+EMF_MAX_VALUES = 100
+
+class ApiMetrics:
+    """
+    Métricas por operación (llamadas, errores, reintentos, throttling y
+    latencia de cada llamada) recogidas con los eventos de botocore de los
+    clientes de RDS, AWS Backup y Tagging API, más la duración acumulada de
+    cada fase del pipeline. Se emiten en EMF al final de la invocación; el
+    resumen de la respuesta lleva además un histograma de latencia.
+    """
+    
+    SERVICES = ('rds', 'backup', 'resourcegroupstaggingapi')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+            self.phases = {}
+    
+    def attach(self, service, client):
+        """
+        Hook para register_client_hook
+        """
+        if service not in self.SERVICES:
+            return
+        events = client.meta.events
+        events.register('before-parameter-build', self._on_start)
+        events.register('needs-retry', self._on_attempt)
+        events.register('after-call', self._on_call)
+        events.register('after-call-error', self._on_call_error)
+    
+    def _on_start(self, model, context, **kwargs):
+        context['metrics_operation'] = f"{model.service_model.service_name}.{model.name}"
+        context['metrics_started'] = time.monotonic()
+        context['metrics_throttled'] = 0
+    
+    def _on_attempt(self, response, request_dict, **kwargs):
+        # Se emite tras cada intento, también los que botocore reintenta
+        if response is not None and response[1].get('Error', {}).get('Code') in THROTTLE_ERROR_CODES:
+            context = request_dict['context']
+            context['metrics_throttled'] = context.get('metrics_throttled', 0) + 1
+    
+    def _on_call(self, http_response, parsed, context, **kwargs):
+        error_code = parsed.get('Error', {}).get('Code') if http_response.status_code >= 300 else None
+        throttled = context.get('metrics_throttled', 0)
+        if error_code in THROTTLE_ERROR_CODES:
+            throttled = max(throttled, 1)
+        retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        self._record(context, error_code is not None, retries, throttled)
+    
+    def _on_call_error(self, context, **kwargs):
+        self._record(context, True, 0, context.get('metrics_throttled', 0))
+    
+    def _record(self, context, error, retries, throttled):
+        operation = context.get('metrics_operation')
+        if operation is None:
+            return
+        latency_ms = (time.monotonic() - context['metrics_started']) * 1000
+        with self._lock:
+            stats = self.operations.setdefault(operation, {
+                'calls': 0,
+                'errors': 0,
+                'retries': 0,
+                'throttles': 0,
+                'latency_ms_total': 0.0,
+                'latency_ms_max': 0.0,
+                'latencies_ms': [],
+                'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            })
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['retries'] += retries
+            stats['throttles'] += throttled
+            stats['latency_ms_total'] += latency_ms
+            stats['latency_ms_max'] = max(stats['latency_ms_max'], latency_ms)
+            stats['latencies_ms'].append(round(latency_ms, 2))
+            stats['histogram'][bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+    
+    @contextmanager
+    def phase(self, name):
+        """
+        Acumula la duración de una fase; en el fan-out suma la de todos los destinos
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+    
+    def summary(self):
+        with self._lock:
+            return {
+                'operations': {
+                    operation: {
+                        'calls': stats['calls'],
+                        'errors': stats['errors'],
+                        'retries': stats['retries'],
+                        'throttles': stats['throttles'],
+                        'latency_ms_avg': round(stats['latency_ms_total'] / stats['calls'], 2),
+                        'latency_ms_max': round(stats['latency_ms_max'], 2),
+                        'histogram': list(stats['histogram'])
+                    }
+                    for operation, stats in self.operations.items()
+                },
+                'phases_ms': {name: round(ms, 2) for name, ms in self.phases.items()}
+            }
+    
+    def emit(self, properties=None):
+        """
+        Escribe un registro EMF por operación y otro por fase. Se usa print y
+        no logger porque el formato de logs de Lambda antepone texto a cada
+        línea y CloudWatch solo reconoce EMF en líneas JSON puras.
+        """
+        if not METRICS_ENABLED:
+            return
+        summary = self.summary()
+        with self._lock:
+            latencies = {operation: list(stats['latencies_ms']) for operation, stats in self.operations.items()}
+        timestamp = int(time.time() * 1000)
+        
+        def record(dimension, value, metrics):
+            entry = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [[dimension]],
+                        'Metrics': [{'Name': name, 'Unit': unit} for name, unit, _ in metrics]
+                    }]
+                },
+                dimension: value
+            }
+            entry.update(properties or {})
+            entry.update({name: metric_value for name, _, metric_value in metrics})
+            print(json.dumps(entry))
+        
+        for operation, stats in summary['operations'].items():
+            # Latencias en bruto para que CloudWatch calcule percentiles exactos;
+            # EMF admite EMF_MAX_VALUES valores por métrica, el resto va en más
+            # registros que solo llevan ApiLatency
+            values = latencies[operation]
+            record('Operation', operation, [
+                ('ApiCalls', 'Count', stats['calls']),
+                ('ApiErrors', 'Count', stats['errors']),
+                ('ApiRetries', 'Count', stats['retries']),
+                ('ApiThrottles', 'Count', stats['throttles']),
+                ('ApiLatency', 'Milliseconds', values[:EMF_MAX_VALUES])
+            ])
+            for start in range(EMF_MAX_VALUES, len(values), EMF_MAX_VALUES):
+                record('Operation', operation, [('ApiLatency', 'Milliseconds', values[start:start + EMF_MAX_VALUES])])
+        
+        for name, elapsed_ms in summary['phases_ms'].items():
+            record('Phase', name, [('PhaseDuration', 'Milliseconds', elapsed_ms)])
+
+API_METRICS = ApiMetrics()
+if METRICS_ENABLED:
+    register_client_hook(API_METRICS.attach)
+
+def target_from_spec(spec):
+    if spec is None:
+        return DEFAULT_TARGET
+    return BackupTarget(**spec)
+
+def _split_env(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def resolve_targets(event):
+    """
+    Devuelve los destinos del fan-out, o una lista vacía para el modo de
+    una sola región. El payload {'targets': [{'region', 'role_arn',
+    'backup_role_arn'}]} tiene prioridad sobre TARGET_REGIONS/TARGET_ROLE_ARNS;
+    en TARGET_ROLE_ARNS la palabra 'local' representa la cuenta de la Lambda.
+    """
+    specs = (event or {}).get('targets')
+    if specs is None:
+        regions = _split_env(TARGET_REGIONS)
+        role_arns = _split_env(TARGET_ROLE_ARNS)
+        if not regions and not role_arns:
+            return []
+        specs = [
+            {'region': region, 'role_arn': None if role_arn == 'local' else role_arn}
+            for role_arn in (role_arns or ['local'])
+            for region in (regions or [None])
+        ]
+    
+    return [
+        BackupTarget(
+            region=spec.get('region'),
+            role_arn=spec.get('role_arn'),
+            backup_role_arn=spec.get('backup_role_arn')
+        )
+        for spec in specs
+    ]
+
+def _run_target_section(target, **options):
+    """
+    Ejecuta un destino aislando sus errores (p.ej. AssumeRole denegado)
+    """
+    started = time.monotonic()
+    try:
+        results = run_target_backup(target, **options)
+    except Exception as e:
+        logger.error(f"❌ Error en destino {target.name}: {str(e)}", exc_info=True)
+        results = dict(new_result_counts(), error=str(e))
+    results['duration_seconds'] = round(time.monotonic() - started, 2)
+    return results
+
+def run_fanout(targets, plans=None, **options):
+    """
+    Descubre y envía backups en todos los destinos en paralelo; el tiempo
+    total lo marca el destino más lento
+    """
+    logger.info(f"Fan-out sobre {len(targets)} destinos: {[t.name for t in targets]}")
+    
+    plans = plans or [None] * len(targets)
+    workers = max(1, min(FANOUT_MAX_TARGETS, len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sections = list(executor.map(
+            lambda target, plan: _run_target_section(target, plan=plan, **options),
+            targets, plans
+        ))
+    
+    return combine_target_sections(targets, sections)
+
+def combine_target_sections(targets, sections):
+    """
+    Fusiona los resultados de cada destino en el informe del fan-out
+    """
+    backup_results = dict(new_result_counts(), timestamp=datetime.now().isoformat(), targets={})
+    
+    for target, section in zip(targets, sections):
+        if 'remaining' in section:
+            backup_results.setdefault('remaining', []).append(
+                {'target': target.spec(), 'plan': section.pop('remaining')}
+            )
+        # El desglose y la muestra de fallos solo se conservan en el total
+        merge_result_counts(backup_results, section)
+        for key in ('by_type', 'by_engine', 'by_error_code', 'by_attempts', 'failure_sample', 'timestamp'):
+            section.pop(key, None)
+        section.update({'region': target.region, 'account': target.account})
+        backup_results['targets'][target.name] = section
+    
+    return backup_results
+
+# ============================================================
+# Coordinador / workers
+# ============================================================
+
+def build_shards(target_plans, shard_size):
+    """
+    Divide el plan de cada destino (región/cuenta) en shards de como
+    máximo shard_size recursos; un shard nunca mezcla destinos
+    """
+    shards = []
+    for target, plan in target_plans:
+        resources = plan_resources(plan)
+        for start in range(0, len(resources), max(1, shard_size)):
+            shard_plan = new_plan()
+            if 'order' in plan:
+                shard_plan['order'] = plan['order']
+            for kind, resource in resources[start:start + shard_size]:
+                shard_plan[kind].append(resource)
+            shards.append((target, shard_plan))
+    return shards
+
+def run_worker_shard(payload, deadline=None, in_process=False):
+    """
+    Envía los backups de un shard; se ejecuta en una invocación worker, en
+    un proceso local o (in_process) en un thread del propio coordinador, que
+    comparte sus registros de resultados, historial y lease
+    """
+    if payload.get('budget_seconds') is not None:
+        budget_deadline = time.monotonic() + payload['budget_seconds']
+        deadline = budget_deadline if deadline is None else min(deadline, budget_deadline)
+    
+    if in_process:
+        results = run_target_backup(
+            target_from_spec(payload['target']),
+            deadline=deadline,
+            run_timestamp=payload['run_timestamp'],
+            plan=payload['plan']
+        )
+        results['shard_id'] = payload['shard_id']
+        return results
+    
+    RESULT_RECORDS.open(
+        f"results/{payload.get('run_id', 'adhoc')}",
+        f"shard-{payload['shard_id']}-{uuid.uuid4().hex[:8]}"
+    )
+    RUN_HISTORY.open(
+        payload.get('run_id', 'adhoc'), payload['run_timestamp'],
+        f"shard-{payload['shard_id']}-{uuid.uuid4().hex[:8]}"
+    )
+    if RUN_LEASE_ENABLED and payload.get('run_id'):
+        RUN_LEASE.join({'run_id': payload['run_id'], 'run_timestamp': payload['run_timestamp'], 'hop': 0})
+    try:
+        results = run_target_backup(
+            target_from_spec(payload['target']),
+            deadline=deadline,
+            run_timestamp=payload['run_timestamp'],
+            plan=payload['plan']
+        )
+    finally:
+        RUN_LEASE.close()
+    results['shard_id'] = payload['shard_id']
+    results['records'] = RESULT_RECORDS.close()
+    RUN_HISTORY.close()
+    return results
+
+def run_worker(event, context):
+    """
+    Modo worker: {'mode': 'worker', 'shard_id', 'target', 'plan', 'run_timestamp', 'budget_seconds'}
+    """
+    logger.info(f"Worker del shard {event['shard_id']} (run {event.get('run_id')})")
+    results = run_worker_shard(event, deadline=execution_deadline(context))
+    return {
+        'statusCode': 200,
+        'body': json.dumps(results, default=str)
+    }
+
+def _shard_error(error):
+    return {'error': str(error)}
+
+# Los workers pueden tardar hasta el timeout de la Lambda y no deben
+# reintentarse automáticamente
+LAMBDA_WORKER_CONFIG = Config(
+    read_timeout=900,
+    max_pool_connections=max(10, COORDINATOR_MAX_WORKERS),
+    retries={'total_max_attempts': 1}
+)
+
+class LambdaShardDispatcher:
+    """
+    Envía cada shard a una invocación síncrona de esta misma función
+    """
+    
+    def __init__(self, function_name, max_workers):
+        self.function_name = function_name
+        self.max_workers = max_workers
+        self._client = get_client('lambda', LAMBDA_WORKER_CONFIG)
+    
+    def _invoke(self, payload):
+        try:
+            response = self._client.invoke(
+                FunctionName=self.function_name,
+                InvocationType='RequestResponse',
+                Payload=json.dumps(payload, default=str).encode('utf-8')
+            )
+            body = json.loads(response['Payload'].read())
+            if response.get('FunctionError') or body.get('statusCode') != 200:
+                return _shard_error(f"Worker {payload['shard_id']}: {body}")
+            return json.loads(body['body'])
+        except Exception as e:
+            return _shard_error(e)
+    
+    def dispatch(self, payloads):
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(payloads)))) as executor:
+            return list(executor.map(self._invoke, payloads))
+
+class ThreadShardDispatcher:
+    """
+    Sustituto local del dispatcher que procesa los shards en threads de la
+    propia invocación: usa los mismos clientes, así que respeta los hooks de
+    register_client_hook (backend simulado, instrumentación)
+    """
+    
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+    
+    def _run(self, payload):
+        try:
+            return run_worker_shard(payload, in_process=True)
+        except Exception as e:
+            return _shard_error(e)
+    
+    def dispatch(self, payloads):
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(payloads)))) as executor:
+            return list(executor.map(self._run, payloads))
+
+class ProcessPoolShardDispatcher:
+    """
+    Sustituto local del dispatcher: procesa cada shard en un pool de procesos.
+    Los procesos hijos crean sus propios clientes contra AWS real: los hooks
+    registrados en el padre no se heredan
+    """
+    
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+    
+    def dispatch(self, payloads):
+        results = []
+        # spawn: los clientes boto3 del proceso padre no son seguros tras un fork
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(payloads), os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            futures = [executor.submit(run_worker_shard, payload) for payload in payloads]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(_shard_error(e))
+        return results
+
+def get_shard_dispatcher(context):
+    """
+    Fuera de Lambda, con hooks de cliente registrados (p.ej. el backend
+    simulado) los shards se procesan en threads para no salir a AWS real
+    """
+    if SHARD_DISPATCHER == 'thread' or (context is None and SHARD_DISPATCHER != 'process' and _client_hooks):
+        return ThreadShardDispatcher(COORDINATOR_MAX_WORKERS)
+    if SHARD_DISPATCHER == 'process' or context is None:
+        if _client_hooks:
+            logger.warning("⚠️  SHARD_DISPATCHER=process: los procesos hijos no heredan los hooks de cliente")
+        return ProcessPoolShardDispatcher(COORDINATOR_MAX_WORKERS)
+    return LambdaShardDispatcher(context.invoked_function_arn, COORDINATOR_MAX_WORKERS)
+
+def _extend_plan(section, plan):
+    remaining = section.setdefault('remaining', new_plan())
+    if 'order' in plan:
+        remaining['order'] = plan['order']
+    if plan.get('ceiling_blocked'):
+        remaining['ceiling_blocked'] = True
+    for kind, resource in plan_resources(plan):
+        remaining[kind].append(resource)
+
+def run_coordinator(targets, fanout, run_id, context=None, dry_run=False, track_until=None,
+                    deadline=None, run_timestamp=None, force_scan=False):
+    """
+    Modo coordinador: descubre una sola vez, divide el plan en shards por
+    destino y tamaño, los reparte entre workers y fusiona sus resultados en
+    el formato habitual successful/failed. Los shards cuyo worker falla o se
+    queda sin tiempo vuelven a 'remaining' para la continuación (el
+    IdempotencyToken es el mismo, así que reenviarlos no duplica jobs).
+    """
+    workers = max(1, min(FANOUT_MAX_TARGETS, len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        discovered = list(executor.map(partial(discover_target_plan, force_scan=force_scan), targets))
+    
+    sections = [results for results, plan in discovered]
+    shards = build_shards([(target, plan) for target, (results, plan) in zip(targets, discovered)], SHARD_SIZE)
+    sharding = {'shards': len(shards), 'shard_size': SHARD_SIZE, 'worker_errors': []}
+    logger.info(f"Coordinador: {len(shards)} shards de hasta {SHARD_SIZE} recursos")
+    
+    if dry_run:
+        for target, (results, plan) in zip(targets, discovered):
+            log_backup_plan(plan, target)
+            results['dry_run'] = True
+            results['plan'].update(plan_identifiers(plan))
+    elif shards:
+        budget = None if deadline is None else max(0, deadline - time.monotonic())
+        payloads = [
+            {
+                'mode': 'worker',
+                'run_id': run_id,
+                'run_timestamp': run_timestamp,
+                'shard_id': shard_id,
+                'target': target.spec(),
+                'plan': plan,
+                'budget_seconds': budget
+            }
+            for shard_id, (target, plan) in enumerate(shards)
+        ]
+        dispatcher = get_shard_dispatcher(context)
+        sharding['dispatcher'] = type(dispatcher).__name__
+        
+        for (target, plan), result in zip(shards, dispatcher.dispatch(payloads)):
+            section = sections[targets.index(target)]
+            submission = section.setdefault('submission', {'shards': 0, 'throttled': 0, 'retried': 0})
+            submission['shards'] += 1
+            
+            if 'error' in result:
+                logger.error(f"❌ Shard de {target.name} falló: {result['error']}")
+                sharding['worker_errors'].append({'target': target.name, 'error': result['error']})
+                _extend_plan(section, plan)
+                continue
+            
+            merge_result_counts(section, result)
+            submission['throttled'] += result.get('submission', {}).get('throttled', 0)
+            submission['retried'] += result.get('submission', {}).get('retries', {}).get('retried', 0)
+            if 'remaining' in result:
+                _extend_plan(section, result['remaining'])
+    
+    if fanout:
+        backup_results = combine_target_sections(targets, sections)
+    else:
+        backup_results = sections[0]
+        if 'remaining' in backup_results:
+            backup_results['remaining'] = [{'target': targets[0].spec(), 'plan': backup_results['remaining']}]
+    
+    backup_results['sharding'] = sharding
+    return backup_results
+
+# ============================================================
+# Almacén de estado
+# ============================================================
+
+class S3ObjectStore:
+    """
+    Almacén de objetos sobre un bucket S3
+    """
+    
+    def __init__(self, bucket):
+        self.bucket = bucket
+    
+    def put(self, key, body, if_absent=False):
+        """
+        Escribe un objeto; con if_absent no sobrescribe y devuelve False si ya
+        existía. La condición la evalúa S3 (If-None-Match), así que dos
+        invocaciones concurrentes no pueden reclamar la misma clave
+        """
+        if not if_absent:
+            get_client('s3').put_object(Bucket=self.bucket, Key=key, Body=body)
+            return True
+        try:
+            get_client('s3').put_object(Bucket=self.bucket, Key=key, Body=body, IfNoneMatch='*')
+            return True
+        except ClientError as e:
+            # ConditionalRequestConflict: otra escritura condicional en curso sobre la misma clave
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', '412'):
+                return False
+            raise
+    
+    def get(self, key):
+        """
+        Contenido de la clave o None si no existe. Sin s3:ListBucket, S3
+        responde 403 en lugar de 404 a las claves inexistentes
+        """
+        try:
+            return get_client('s3').get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404', 'AccessDenied', '403'):
+                return None
+            raise
+    
+    def delete(self, key):
+        get_client('s3').delete_object(Bucket=self.bucket, Key=key)
+    
+    def list(self, prefix):
+        """
+        Claves bajo un prefijo (para las consultas del historial)
+        """
+        paginator = get_client('s3').get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+class LocalObjectStore:
+    """
+    Sustituto local del almacén de objetos sobre un directorio
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+    
+    def _path(self, key):
+        return os.path.join(self.directory, *key.split('/'))
+    
+    def put(self, key, body, if_absent=False):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | (os.O_EXCL if if_absent else os.O_TRUNC))
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        return True
+    
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+    
+    def list(self, prefix):
+        directory, _, name_prefix = prefix.rpartition('/')
+        base = self._path(directory) if directory else self.directory
+        for root, _, files in os.walk(base):
+            for name in sorted(files):
+                key = os.path.relpath(os.path.join(root, name), self.directory).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    yield key
+
+def get_state_store():
+    """
+    S3 si STATE_BUCKET está definido; si no, el directorio local STATE_DIR
+    """
+    if STATE_BUCKET:
+        return S3ObjectStore(STATE_BUCKET)
+    return LocalObjectStore(STATE_DIR)
+
+# ============================================================
+# Inventario incremental
+# ============================================================
+#
+# El inventario guarda por destino (pk = target.name) los recursos
+# etiquetados (sk = ARN) tal y como los devuelve el descubrimiento, más un
+# elemento de metadatos con la fecha de la última reconciliación. Los eventos
+# de RDS (creación/borrado) y de cambios de tags lo mantienen al día.
+
+INVENTORY_META_KEY = '#meta'
+
+# Orígenes de eventos de EventBridge que actualizan el inventario
+INVENTORY_EVENT_SOURCES = ('aws.rds', 'aws.tag')
+
+# Errores de describe_* cuando el recurso ya no existe
+NOT_FOUND_ERROR_CODES = ('DBInstanceNotFound', 'DBInstanceNotFoundFault', 'DBClusterNotFoundFault')
+
+class DynamoDBInventoryStore:
+    """
+    Inventario sobre una tabla DynamoDB con clave (pk, sk)
+    """
+    
+    # Máximo de operaciones por llamada a batch_write_item
+    BATCH_SIZE = 25
+    
+    def __init__(self, table):
+        self.table = table
+    
+    def query(self, pk):
+        """
+        Devuelve {sk: datos} de todos los elementos de la partición
+        """
+        items = {}
+        paginator = get_client('dynamodb').get_paginator('query')
+        for page in paginator.paginate(
+            TableName=self.table,
+            KeyConditionExpression='pk = :pk',
+            ExpressionAttributeValues={':pk': {'S': pk}}
+        ):
+            for item in page['Items']:
+                items[item['sk']['S']] = json.loads(item['data']['S'])
+        return items
+    
+    def write(self, pk, puts=None, deletes=()):
+        """
+        Escribe los elementos de puts ({sk: datos}) y borra las claves de deletes
+        """
+        requests = [
+            {'PutRequest': {'Item': {'pk': {'S': pk}, 'sk': {'S': sk}, 'data': {'S': json.dumps(data)}}}}
+            for sk, data in (puts or {}).items()
+        ] + [
+            {'DeleteRequest': {'Key': {'pk': {'S': pk}, 'sk': {'S': sk}}}}
+            for sk in deletes
+        ]
+        dynamodb = get_client('dynamodb')
+        for start in range(0, len(requests), self.BATCH_SIZE):
+            pending = {self.table: requests[start:start + self.BATCH_SIZE]}
+            for attempt in range(5):
+                pending = dynamodb.batch_write_item(RequestItems=pending).get('UnprocessedItems')
+                if not pending:
+                    break
+                time.sleep(0.1 * 2 ** attempt)
+            else:
+                raise RuntimeError(f"DynamoDB no procesó {len(pending[self.table])} elementos del inventario")
+
+class SQLiteInventoryStore:
+    """
+    Sustituto local del inventario sobre un fichero SQLite
+    """
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS inventory (pk TEXT, sk TEXT, data TEXT, PRIMARY KEY (pk, sk))'
+        )
+        return connection
+    
+    def query(self, pk):
+        connection = self._connect()
+        try:
+            rows = connection.execute('SELECT sk, data FROM inventory WHERE pk = ?', (pk,)).fetchall()
+        finally:
+            connection.close()
+        return {sk: json.loads(data) for sk, data in rows}
+    
+    def write(self, pk, puts=None, deletes=()):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO inventory (pk, sk, data) VALUES (?, ?, ?)',
+                    [(pk, sk, json.dumps(data)) for sk, data in (puts or {}).items()]
+                )
+                connection.executemany(
+                    'DELETE FROM inventory WHERE pk = ? AND sk = ?',
+                    [(pk, sk) for sk in deletes]
+                )
+        finally:
+            connection.close()
+
+def get_inventory_store():
+    """
+    None si el inventario está desactivado; DynamoDB si INVENTORY_TABLE está
+    definido y, si no, un fichero SQLite en STATE_DIR
+    """
+    if INVENTORY_MODE != 'incremental':
+        return None
+    if INVENTORY_TABLE:
+        return DynamoDBInventoryStore(INVENTORY_TABLE)
+    return SQLiteInventoryStore(os.path.join(STATE_DIR, 'inventory.sqlite3'))
+
+def _inventory_is_fresh(meta):
+    if not meta:
+        return False
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(meta['reconciled_at'])
+    return age < timedelta(hours=INVENTORY_RECONCILE_HOURS)
+
+def reconcile_inventory(store, target, entries):
+    """
+    Sustituye el inventario del destino por el resultado de un escaneo
+    completo, escribiendo solo los elementos que cambian
+    """
+    current = store.query(target.name)
+    current.pop(INVENTORY_META_KEY, None)
+    scanned = {entry['arn']: entry for entry in entries}
+    puts = {arn: entry for arn, entry in scanned.items() if current.get(arn) != entry}
+    deletes = [arn for arn in current if arn not in scanned]
+    puts[INVENTORY_META_KEY] = {'reconciled_at': datetime.now(timezone.utc).isoformat()}
+    store.write(target.name, puts, deletes)
+    logger.info(
+        f"[{target.name}] Inventario reconciliado: {len(scanned)} recursos, "
+        f"{len(puts) - 1} escritos, {len(deletes)} eliminados"
+    )
+
+def target_for_arn(arn):
+    """
+    Destino configurado al que pertenece el ARN de un recurso (None si ninguno)
+    """
+    region, account = arn.split(':')[3:5]
+    for target in resolve_targets({}) or [DEFAULT_TARGET]:
+        if (target.region or os.environ.get('AWS_REGION')) == region and target.account in (None, account):
+            return target
+    return None
+
+def _describe_inventory_entry(target, arn):
+    """
+    Entrada de inventario del recurso, o None si ya no existe, se está
+    borrando o no tiene el tag de backup
+    """
+    rds = target.client('rds')
+    try:
+        if ':cluster:' in arn:
+            resource = rds.describe_db_clusters(DBClusterIdentifier=arn)['DBClusters'][0]
+            status, entry = resource['Status'], _cluster_entry(resource)
+        else:
+            resource = rds.describe_db_instances(DBInstanceIdentifier=arn)['DBInstances'][0]
+            status, entry = resource['DBInstanceStatus'], _instance_entry(resource)
+    except ClientError as e:
+        if e.response['Error']['Code'] in NOT_FOUND_ERROR_CODES:
+            return None
+        raise
+    if status == 'deleting' or not _has_backup_tag(resource.get('TagList') or []):
+        return None
+    return entry
+
+def run_inventory_event(event, context):
+    """
+    Aplica al inventario un evento de EventBridge de RDS (creación/borrado de
+    instancias y clusters) o de cambio de tags, volviendo a describir cada
+    recurso afectado
+    """
+    store = get_inventory_store()
+    if store is None:
+        logger.info(f"Evento {event.get('detail-type')} ignorado: INVENTORY_MODE={INVENTORY_MODE}")
+        return {'statusCode': 200, 'body': json.dumps({'message': 'Inventory disabled'})}
+    
+    arns = set(event.get('resources') or [])
+    source_arn = (event.get('detail') or {}).get('SourceArn')
+    if source_arn:
+        arns.add(source_arn)
+    
+    updated, removed, ignored = [], [], []
+    for arn in sorted(arns):
+        target = target_for_arn(arn)
+        if target is None or (':db:' not in arn and ':cluster:' not in arn):
+            ignored.append(arn)
+            continue
+        entry = _describe_inventory_entry(target, arn)
+        if entry is None:
+            store.write(target.name, deletes=[arn])
+            removed.append(arn)
+        else:
+            store.write(target.name, puts={arn: entry})
+            updated.append(arn)
+    
+    logger.info(
+        f"Evento {event.get('detail-type')}: inventario actualizado {updated}, "
+        f"eliminados {removed}, ignorados {ignored}"
+    )
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'updated': updated, 'removed': removed, 'ignored': ignored})
+    }
+
+# ============================================================
+# Agregación de resultados
+# ============================================================
+
+RESULT_OUTCOMES = ('successful', 'failed', 'skipped')
+
+def new_result_counts():
+    return {
+        'successful': 0,
+        'failed': 0,
+        'skipped': 0,
+        'total_processed': 0,
+        'by_type': {},
+        'by_engine': {},
+        'by_error_code': {},
+        'by_attempts': {},
+        'failure_sample': []
+    }
+
+def record_outcome(results, outcome, record):
+    """
+    Cuenta el resultado de un recurso en `results` y envía el registro
+    completo al sink; en memoria solo queda una muestra acotada de fallos
+    """
+    results[outcome] += 1
+    if outcome != 'skipped':
+        results['total_processed'] += 1
+    for key, value in (('by_type', record.get('type')), ('by_engine', record.get('engine'))):
+        if value:
+            counts = results[key].setdefault(value, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+    if 'attempts' in record:
+        attempts = str(record['attempts'])
+        results['by_attempts'][attempts] = results['by_attempts'].get(attempts, 0) + 1
+    if outcome == 'failed':
+        error_code = record.get('error_code', 'Unknown')
+        results['by_error_code'][error_code] = results['by_error_code'].get(error_code, 0) + 1
+        if len(results['failure_sample']) < FAILURE_SAMPLE_SIZE:
+            results['failure_sample'].append(record)
+    RESULT_RECORDS.write(dict(record, outcome=outcome))
+    RUN_HISTORY.add(record, outcome)
+
+def merge_result_counts(into, other):
+    """
+    Suma a `into` los contadores de otro resultado (destino, shard o salto anterior)
+    """
+    for key in RESULT_OUTCOMES + ('total_processed',):
+        into[key] = into.get(key, 0) + other.get(key, 0)
+    for key in ('by_type', 'by_engine'):
+        merged = into.setdefault(key, {})
+        for name, counts in other.get(key, {}).items():
+            merged_counts = merged.setdefault(name, {})
+            for outcome, count in counts.items():
+                merged_counts[outcome] = merged_counts.get(outcome, 0) + count
+    for key in ('by_error_code', 'by_attempts'):
+        merged = into.setdefault(key, {})
+        for name, count in other.get(key, {}).items():
+            merged[name] = merged.get(name, 0) + count
+    sample = into.setdefault('failure_sample', [])
+    sample.extend(other.get('failure_sample', [])[:max(0, FAILURE_SAMPLE_SIZE - len(sample))])
+    return into
+
+class ResultRecordSink:
+    """
+    Escribe el registro completo de cada recurso como JSON Lines sin
+    acumularlos en la respuesta: en el log ('log'), en el almacén de estado
+    por lotes de RESULT_SINK_BATCH líneas ('store': S3 o el directorio
+    local) o en ninguna parte ('none')
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self.open('results/adhoc', uuid.uuid4().hex[:8])
+
+    def open(self, directory, name):
+        """
+        Empieza una invocación: sus lotes se escriben como directory/name-part-NNNN.jsonl
+        """
+        with self._lock:
+            self._flush()
+            self.directory = directory
+            self.name = name
+            self.parts = 0
+            self.dropped = 0
+            self._buffer = []
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if RESULT_SINK == 'log':
+                # print y no logger: una línea JSON pura por registro
+                print(line)
+            elif RESULT_SINK == 'store':
+                self._buffer.append(line)
+                if len(self._buffer) >= RESULT_SINK_BATCH:
+                    self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        key = f"{self.directory}/{self.name}-part-{self.parts:04d}.jsonl"
+        self.parts += 1
+        lines, self._buffer = self._buffer, []
+        # Un fallo del almacén pierde el lote pero no la ejecución
+        try:
+            get_state_store().put(key, '\n'.join(lines) + '\n')
+        except ClientError as e:
+            logger.warning(f"No se pudo escribir el lote de resultados {key}: {str(e)}")
+            self.dropped += len(lines)
+
+    def close(self):
+        """
+        Escribe el último lote y devuelve dónde están los registros
+        """
+        with self._lock:
+            self._flush()
+            info = {'sink': RESULT_SINK}
+            if self.dropped:
+                info['dropped'] = self.dropped
+            if RESULT_SINK == 'store':
+                info['location'] = (
+                    f"s3://{STATE_BUCKET}/{self.directory}/" if STATE_BUCKET
+                    else os.path.join(STATE_DIR, *self.directory.split('/'))
+                )
+            return info
+
+RESULT_RECORDS = ResultRecordSink()
+
+# Columnas del historial: esquema plano y fijo (null si no aplica), legible
+# por Athena/Glue con el particionado dt= tal cual o convertible a Parquet
+HISTORY_PREFIX = 'history'
+HISTORY_COLUMNS = (
+    'run_id', 'ts', 'target', 'resource', 'resource_arn', 'type', 'engine', 'outcome',
+    'error_code', 'attempts', 'latency_ms', 'backup_job_id', 'state', 'duration_seconds'
+)
+
+def history_partition(day):
+    """
+    Prefijo de la partición de un día (date o 'YYYY-MM-DD')
+    """
+    return f"{HISTORY_PREFIX}/dt={day}/"
+
+class RunHistorySink:
+    """
+    Historial de resultados por recurso de cada invocación: una fila por
+    registro con HISTORY_COLUMNS, comprimida con gzip a medida que llega y
+    escrita al cerrar en history/dt=YYYY-MM-DD/<run_id>-<nombre>.jsonl.gz.
+    La fecha es la del inicio de la ejecución, así que los saltos y shards de
+    una misma ejecución caen en la misma partición.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.key = None
+    
+    def open(self, run_id, run_timestamp, name):
+        """
+        Empieza una invocación; run_timestamp tiene el formato YYYYmmdd-HHMMSS
+        """
+        with self._lock:
+            self._write()
+            if not RUN_HISTORY_ENABLED:
+                return
+            day = f"{run_timestamp[:4]}-{run_timestamp[4:6]}-{run_timestamp[6:8]}"
+            self.key = f"{history_partition(day)}{run_id}-{name}.jsonl.gz"
+            self.run_id = run_id
+            self.rows = 0
+            self._chunks = []
+            # wbits=31: formato gzip, descomprimible con gzip.decompress
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    
+    def add(self, record, outcome):
+        with self._lock:
+            if self.key is None:
+                return
+            row = {column: record.get(column) for column in HISTORY_COLUMNS}
+            row.update(run_id=self.run_id, ts=int(time.time()), outcome=outcome)
+            self._chunks.append(self._compressor.compress((json.dumps(row, default=str) + '\n').encode('utf-8')))
+            self.rows += 1
+    
+    def close(self):
+        """
+        Escribe el fichero de la invocación y devuelve dónde quedó
+        """
+        with self._lock:
+            return self._write()
+    
+    def _write(self):
+        if self.key is None:
+            return None
+        key, self.key = self.key, None
+        if not self.rows:
+            return None
+        body = b''.join(self._chunks) + self._compressor.flush()
+        self._chunks = []
+        try:
+            get_state_store().put(key, body)
+        except ClientError as e:
+            logger.warning(f"No se pudo escribir el historial {key}: {str(e)}")
+            return None
+        return {'key': key, 'rows': self.rows, 'bytes': len(body)}
+
+RUN_HISTORY = RunHistorySink()
+
+def iter_history_rows(store, days):
+    """
+    Filas del historial de los días indicados; solo se listan y leen las
+    particiones de esos días
+    """
+    for day in days:
+        for key in store.list(history_partition(day)):
+            if not key.endswith('.jsonl.gz'):
+                continue
+            for line in gzip.decompress(store.get(key)).splitlines():
+                if line:
+                    yield json.loads(line)
+
+# ============================================================
+# Presupuesto de tiempo, checkpoints y continuación
+# ============================================================
+
+def new_run():
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return {
+        'run_id': f"{timestamp}-{uuid.uuid4().hex[:8]}",
+        'run_timestamp': timestamp,
+        'hop': 0
+    }
+
+def execution_deadline(context):
+    """
+    Instante (time.monotonic()) en el que hay que dejar de enviar jobs para
+    que quede margen para escribir el checkpoint y auto-invocarse
+    """
+    if context is None:
+        return None
+    remaining = context.get_remaining_time_in_millis() / 1000
+    return time.monotonic() + remaining - TIME_BUDGET_MARGIN_SECONDS
+
+def merge_backup_results(previous, current):
+    """
+    Combina los resultados parciales del checkpoint con los del salto actual
+    """
+    merged = dict(current)
+    merged.update(merge_result_counts(merge_result_counts(new_result_counts(), previous), current))
+    for key in ('discovery', 'plan', 'sharding'):
+        if key in previous:
+            merged[key] = previous[key]
+    
+    if 'targets' in previous or 'targets' in current:
+        sections = {}
+        for name in set(previous.get('targets', {})) | set(current.get('targets', {})):
+            prev_section = previous.get('targets', {}).get(name, {})
+            section = {**prev_section, **current.get('targets', {}).get(name, {})}
+            for key in ('successful', 'failed', 'skipped', 'total_processed'):
+                section[key] = prev_section.get(key, 0) + current.get('targets', {}).get(name, {}).get(key, 0)
+            for key in ('discovery', 'plan'):
+                if key in prev_section:
+                    section[key] = prev_section[key]
+            sections[name] = section
+        merged['targets'] = sections
+    
+    return merged
+
+def schedule_continuation(run, backup_results, remaining, fanout, processed_this_hop, context):
+    """
+    Guarda el plan pendiente y los resultados parciales en un checkpoint y
+    se re-invoca de forma asíncrona para continuar
+    """
+    pending = sum(len(plan_resources(entry['plan'])) for entry in remaining)
+    # Un salto sin envíos solo es normal si lo pendiente está escalonado más
+    # adelante o si el vault estaba en el techo de jobs activos
+    staggered = any(
+        resource.get('not_before', 0) > time.time()
+        for entry in remaining for _, resource in plan_resources(entry['plan'])
+    )
+    ceiling_blocked = any(entry['plan'].get('ceiling_blocked') for entry in remaining)
+    if ceiling_blocked and time.time() - _run_started(run) >= RUN_LEASE_RESUME_HOURS * 3600:
+        logger.warning(f"⚠️  El run {run['run_id']} lleva más de {RUN_LEASE_RESUME_HOURS}h esperando al techo de jobs activos")
+        ceiling_blocked = False
+    waiting = staggered or ceiling_blocked
+    # Los saltos que terminan esperando (recursos aún escalonados en la
+    # ventana o vault en el techo) no cuentan para MAX_CONTINUATIONS: la
+    # ventana es finita y la espera al techo se acota a RUN_LEASE_RESUME_HOURS
+    # desde el inicio del run. El límite acota solo los saltos que se quedan
+    # sin tiempo con recursos ya vencidos y admitidos.
+    counted_hops = run.get('counted_hops', run['hop']) + (0 if waiting else 1)
+    
+    if counted_hops >= MAX_CONTINUATIONS or (processed_this_hop == 0 and not waiting):
+        logger.error(f"❌ No se continuará el run {run['run_id']}: {pending} recursos sin enviar "
+                     f"(salto {run['hop']}, procesados en este salto: {processed_this_hop})")
+        return {'scheduled': False, 'pending': pending}
+    
+    next_run = dict(run, hop=run['hop'] + 1, counted_hops=counted_hops)
+    checkpoint_key = f"checkpoints/{run['run_id']}/hop-{next_run['hop']}.json"
+    get_state_store().put(checkpoint_key, json.dumps({
+        'run': next_run,
+        'fanout': fanout,
+        'remaining': remaining,
+        'results': backup_results
+    }, default=str))
+    
+    payload = {
+        'mode': 'continue',
+        'run_id': run['run_id'],
+        'checkpoint_key': checkpoint_key
+    }
+    if context is not None:
+        get_client('lambda').invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps(payload).encode('utf-8')
+        )
+        logger.info(f"⏭️  Checkpoint {checkpoint_key} guardado, continuación invocada ({pending} pendientes)")
+    else:
+        logger.info(f"⏭️  Checkpoint {checkpoint_key} guardado, invocar con {payload} para continuar")
+    
+    return {'scheduled': True, 'pending': pending, 'checkpoint_key': checkpoint_key}
+
+def claim_checkpoint(event):
+    """
+    Reclama el checkpoint de una continuación. Devuelve None si otra
+    invocación ya lo reclamó (re-entrega del evento asíncrono), de modo que
+    ningún recurso se envía dos veces entre saltos.
+    """
+    checkpoint_key = event['checkpoint_key']
+    store = get_state_store()
+    if not store.put(f"{checkpoint_key}.claimed", b'', if_absent=True):
+        return None
+    
+    body = store.get(checkpoint_key)
+    if body is None:
+        return None
+    return json.loads(body)
+
+# ============================================================
+# Lease de ejecución y registro de envíos
+# ============================================================
+#
+# Con RUN_LEASE_ENABLED, una sola ejecución a la vez tiene el lease
+# (pk 'lease', sk RUN_LEASE_NAME). Su dueño es el run_id, así que los saltos
+# de continuación lo conservan, y un latido lo renueva cada TTL/3. Una
+# invocación que lo encuentra ocupado sale tras una sola escritura
+# condicional (RUN_LEASE_CONFLICT=exit). Con join, en cambio, lee el plan que
+# el titular publicó en el almacén de estado y envía lo pendiente con el
+# mismo run_timestamp, y por tanto los mismos IdempotencyToken. Cada envío
+# reclama antes su recurso en el registro de la ejecución (pk 'ledger#<run_id>',
+# sk ARN), de modo que el titular, los que se unen y los workers nunca envían
+# dos veces el mismo recurso. Un lease caducado de una ejecución de hace menos
+# de RUN_LEASE_RESUME_HOURS se retoma con su run_id en lugar de empezar otra.
+
+RUN_LEASE_CONFLICTS = ('exit', 'join')
+
+class DynamoDBLeaseStore:
+    """
+    Escrituras condicionales sobre una tabla DynamoDB con clave (pk, sk) y
+    TTL en el atributo 'ttl'
+    """
+    
+    NAMES = {'#o': 'owner', '#s': 'state', '#e': 'expires_at'}
+    
+    def __init__(self, table):
+        self.table = table
+    
+    @staticmethod
+    def _encode(pk, sk, item):
+        return {
+            'pk': {'S': pk},
+            'sk': {'S': sk},
+            'owner': {'S': item['owner']},
+            'state': {'S': item['state']},
+            'expires_at': {'N': str(item['expires_at'])},
+            'ttl': {'N': str(int(item['ttl']))},
+            'data': {'S': json.dumps(item.get('data') or {}, default=str)}
+        }
+    
+    @staticmethod
+    def _decode(attributes):
+        if not attributes:
+            return None
+        return {
+            'owner': attributes['owner']['S'],
+            'state': attributes['state']['S'],
+            'expires_at': float(attributes['expires_at']['N']),
+            'ttl': float(attributes['ttl']['N']),
+            'data': json.loads(attributes['data']['S'])
+        }
+    
+    @staticmethod
+    def _conditional_failed(error):
+        return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+    
+    def get(self, pk, sk):
+        response = get_client('dynamodb').get_item(
+            TableName=self.table, Key={'pk': {'S': pk}, 'sk': {'S': sk}}, ConsistentRead=True
+        )
+        return self._decode(response.get('Item'))
+    
+    def put_if_absent_or_owner(self, pk, sk, item):
+        """
+        Escribe si no existe o ya es de item['owner']; si no, (False, actual)
+        """
+        try:
+            get_client('dynamodb').put_item(
+                TableName=self.table,
+                Item=self._encode(pk, sk, item),
+                ConditionExpression='attribute_not_exists(pk) OR #o = :owner',
+                ExpressionAttributeNames={'#o': 'owner'},
+                ExpressionAttributeValues={':owner': {'S': item['owner']}},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return True, None
+        except ClientError as e:
+            if not self._conditional_failed(e):
+                raise
+            return False, self._decode(e.response.get('Item')) or self.get(pk, sk)
+    
+    def replace_if_expired(self, pk, sk, item, previous_owner, now, state=None):
+        condition = '#o = :previous AND #e < :now'
+        values = {':previous': {'S': previous_owner}, ':now': {'N': str(now)}}
+        names = {'#o': 'owner', '#e': 'expires_at'}
+        if state is not None:
+            condition += ' AND #s = :state'
+            values[':state'] = {'S': state}
+            names['#s'] = 'state'
+        try:
+            get_client('dynamodb').put_item(
+                TableName=self.table, Item=self._encode(pk, sk, item), ConditionExpression=condition,
+                ExpressionAttributeNames=names, ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as e:
+            if not self._conditional_failed(e):
+                raise
+            return False
+    
+    def update_if_owner(self, pk, sk, owner, changes):
+        """
+        Actualiza state, expires_at, ttl y/o data si el dueño sigue siendo owner
+        """
+        encoded = self._encode(pk, sk, dict({'owner': owner, 'state': '', 'expires_at': 0, 'ttl': 0}, **changes))
+        names = {'#o': 'owner'}
+        values = {':owner': {'S': owner}}
+        assignments = []
+        for field in changes:
+            names[f"#{field}"] = field
+            values[f":{field}"] = encoded[field]
+            assignments.append(f"#{field} = :{field}")
+        try:
+            get_client('dynamodb').update_item(
+                TableName=self.table, Key={'pk': {'S': pk}, 'sk': {'S': sk}},
+                UpdateExpression='SET ' + ', '.join(assignments), ConditionExpression='#o = :owner',
+                ExpressionAttributeNames=names, ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as e:
+            if not self._conditional_failed(e):
+                raise
+            return False
+    
+    def delete_if_owner(self, pk, sk, owner):
+        try:
+            get_client('dynamodb').delete_item(
+                TableName=self.table, Key={'pk': {'S': pk}, 'sk': {'S': sk}},
+                ConditionExpression='#o = :owner',
+                ExpressionAttributeNames={'#o': 'owner'}, ExpressionAttributeValues={':owner': {'S': owner}}
+            )
+            return True
+        except ClientError as e:
+            if not self._conditional_failed(e):
+                raise
+            return False
+
+class SQLiteLeaseStore:
+    """
+    Sustituto local de DynamoDBLeaseStore sobre un fichero SQLite; cada
+    operación condicional es una transacción BEGIN IMMEDIATE
+    """
+    
+    def __init__(self, path):
+        self.path = path
+    
+    @contextmanager
+    def _transaction(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS lease (pk TEXT, sk TEXT, owner TEXT, state TEXT, '
+                'expires_at REAL, ttl REAL, data TEXT, PRIMARY KEY (pk, sk))'
+            )
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def _read(connection, pk, sk):
+        row = connection.execute(
+            'SELECT owner, state, expires_at, ttl, data FROM lease WHERE pk = ? AND sk = ? AND ttl >= ?',
+            (pk, sk, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return {'owner': row[0], 'state': row[1], 'expires_at': row[2], 'ttl': row[3], 'data': json.loads(row[4])}
+    
+    @staticmethod
+    def _write(connection, pk, sk, item):
+        connection.execute(
+            'INSERT OR REPLACE INTO lease (pk, sk, owner, state, expires_at, ttl, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (pk, sk, item['owner'], item['state'], item['expires_at'], item['ttl'],
+             json.dumps(item.get('data') or {}, default=str))
+        )
+    
+    def get(self, pk, sk):
+        with self._transaction() as connection:
+            return self._read(connection, pk, sk)
+    
+    def put_if_absent_or_owner(self, pk, sk, item):
+        with self._transaction() as connection:
+            current = self._read(connection, pk, sk)
+            if current is not None and current['owner'] != item['owner']:
+                return False, current
+            self._write(connection, pk, sk, item)
+            return True, None
+    
+    def replace_if_expired(self, pk, sk, item, previous_owner, now, state=None):
+        with self._transaction() as connection:
+            current = self._read(connection, pk, sk)
+            if (current is None or current['owner'] != previous_owner or current['expires_at'] >= now
+                    or (state is not None and current['state'] != state)):
+                return False
+            self._write(connection, pk, sk, item)
+            return True
+    
+    def update_if_owner(self, pk, sk, owner, changes):
+        with self._transaction() as connection:
+            current = self._read(connection, pk, sk)
+            if current is None or current['owner'] != owner:
+                return False
+            self._write(connection, pk, sk, dict(current, **changes))
+            return True
+    
+    def delete_if_owner(self, pk, sk, owner):
+        with self._transaction() as connection:
+            current = self._read(connection, pk, sk)
+            if current is None or current['owner'] != owner:
+                return False
+            connection.execute('DELETE FROM lease WHERE pk = ? AND sk = ?', (pk, sk))
+            return True
+
+def get_lease_store():
+    """
+    DynamoDB si RUN_LEASE_TABLE está definido; si no, un fichero SQLite en STATE_DIR
+    """
+    if RUN_LEASE_TABLE:
+        return DynamoDBLeaseStore(RUN_LEASE_TABLE)
+    return SQLiteLeaseStore(os.path.join(STATE_DIR, 'lease.sqlite3'))
+
+def _run_started(run):
+    return datetime.strptime(run['run_timestamp'], '%Y%m%d-%H%M%S').replace(tzinfo=timezone.utc).timestamp()
+
+class RunLease:
+    """
+    Lease de la ejecución y registro de envíos de la invocación en curso.
+    Sin sesión abierta (lease desactivado, dry-run, otros modos) claim()
+    siempre permite enviar y el resto de métodos no hace nada.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.store = None
+        self.run = None
+        self.owner = False
+        self.lost = False
+        self.invocation_id = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._heartbeat = None
+    
+    def _lease_item(self, run, now):
+        return {
+            'owner': run['run_id'],
+            'state': 'running',
+            'expires_at': now + RUN_LEASE_TTL_SECONDS,
+            'ttl': now + RUN_LEDGER_RETENTION_HOURS * 3600,
+            'data': run
+        }
+    
+    def acquire(self, run):
+        """
+        Intenta tomar el lease para `run`. Devuelve (estado, run): 'acquired'
+        con el propio run, 'resumed' con la ejecución caducada que se retoma
+        o 'held' con la ejecución que lo tiene
+        """
+        store = get_lease_store()
+        # Si el lease se libera entre la escritura fallida y su lectura, se reintenta
+        for _ in range(3):
+            now = time.time()
+            acquired, current = store.put_if_absent_or_owner('lease', RUN_LEASE_NAME, self._lease_item(run, now))
+            if acquired or current is not None:
+                break
+        status = 'acquired'
+        if not acquired:
+            if current is None or current['expires_at'] >= now:
+                return 'held', current['data'] if current else None
+            previous = current['data']
+            if now - _run_started(previous) < RUN_LEASE_RESUME_HOURS * 3600:
+                run, status = dict(previous, hop=previous.get('hop', 0) + 1), 'resumed'
+            if not store.replace_if_expired('lease', RUN_LEASE_NAME, self._lease_item(run, now), current['owner'], now):
+                current = store.get('lease', RUN_LEASE_NAME)
+                return 'held', current['data'] if current else previous
+        
+        self._open(store, run, owner=True)
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+        return status, run
+    
+    def join(self, run):
+        """
+        Usa el registro de envíos de `run` sin tener el lease (workers e
+        invocaciones que se unen a una ejecución en curso)
+        """
+        self._open(get_lease_store(), run, owner=False)
+    
+    def _open(self, store, run, owner):
+        with self._lock:
+            self.store = store
+            self.run = run
+            self.owner = owner
+            self.lost = False
+            self.invocation_id = uuid.uuid4().hex
+    
+    def _beat(self):
+        while not self._stop.wait(RUN_LEASE_TTL_SECONDS / 3):
+            now = time.time()
+            try:
+                renewed = self.store.update_if_owner('lease', RUN_LEASE_NAME, self.run['run_id'], {
+                    'expires_at': now + RUN_LEASE_TTL_SECONDS
+                })
+            except (ClientError, sqlite3.Error) as e:
+                # Un fallo puntual se reintenta en el siguiente latido, antes de que caduque
+                logger.warning(f"⚠️  No se pudo renovar el lease de {self.run['run_id']}: {str(e)}")
+                continue
+            if not renewed:
+                # El registro sigue evitando duplicados aunque se pierda el lease
+                logger.error(f"❌ Lease de la ejecución {self.run['run_id']} perdido, otra invocación lo ha tomado")
+                self.lost = True
+                return
+    
+    def close(self, release=False):
+        """
+        Para el latido; con release libera el lease (ejecución terminada).
+        Sin release el lease caduca solo, y una continuación lo renueva antes
+        """
+        with self._lock:
+            if self._heartbeat is not None:
+                self._stop.set()
+                self._heartbeat.join()
+                self._heartbeat = None
+            if release and self.owner and not self.lost:
+                self.store.delete_if_owner('lease', RUN_LEASE_NAME, self.run['run_id'])
+            self.store = None
+            self.run = None
+            self.owner = False
+    
+    def _ledger_key(self):
+        return f"ledger#{self.run['run_id']}"
+    
+    def claim(self, resource):
+        """
+        Reclama el recurso antes de enviarlo. Devuelve None si esta invocación
+        puede enviarlo, o la entrada del registro si ya está enviado o
+        reclamado por otra invocación viva
+        """
+        if self.store is None:
+            return None
+        now = time.time()
+        item = {
+            'owner': self.invocation_id,
+            'state': 'claimed',
+            'expires_at': now + RUN_LEASE_TTL_SECONDS,
+            'ttl': now + RUN_LEDGER_RETENTION_HOURS * 3600,
+            'data': {'resource': resource['identifier']}
+        }
+        claimed, current = self.store.put_if_absent_or_owner(self._ledger_key(), resource['arn'], item)
+        if claimed:
+            return None
+        # Una reclamación caducada sin envío es de una invocación que murió
+        if current and current['state'] == 'claimed' and current['expires_at'] < now and self.store.replace_if_expired(
+            self._ledger_key(), resource['arn'], item, current['owner'], now, state='claimed'
+        ):
+            return None
+        return current or {'state': 'claimed', 'data': {}}
+    
+    def record_submission(self, resource, backup_job_id):
+        """
+        Marca el recurso como enviado. Si falla, la reclamación caduca y otra
+        invocación puede reenviarlo, pero con el mismo IdempotencyToken
+        """
+        if self.store is None:
+            return
+        now = time.time()
+        try:
+            self.store.update_if_owner(self._ledger_key(), resource['arn'], self.invocation_id, {
+                'state': 'submitted',
+                'expires_at': now + RUN_LEDGER_RETENTION_HOURS * 3600,
+                'data': {'resource': resource['identifier'], 'backup_job_id': backup_job_id}
+            })
+        except (ClientError, sqlite3.Error) as e:
+            logger.warning(f"⚠️  No se pudo registrar el envío de {resource['identifier']}: {str(e)}")
+    
+    def release_claim(self, resource):
+        """
+        Libera la reclamación de un envío fallido para que pueda reintentarse
+        (si falla, la reclamación caduca sola)
+        """
+        if self.store is None:
+            return
+        try:
+            self.store.delete_if_owner(self._ledger_key(), resource['arn'], self.invocation_id)
+        except (ClientError, sqlite3.Error) as e:
+            logger.warning(f"⚠️  No se pudo liberar la reclamación de {resource['identifier']}: {str(e)}")
+    
+    def publish_plan(self, target, plan):
+        """
+        Publica el plan de un destino para que otras invocaciones se unan
+        """
+        if self.store is None or not self.owner:
+            return
+        key = f"leases/{self.run['run_id']}/plans/{target.name.replace('/', '_')}.json"
+        get_state_store().put(key, json.dumps({'target': target.spec(), 'plan': plan}, default=str))
+    
+    @staticmethod
+    def published_plans(run_id):
+        store = get_state_store()
+        return [json.loads(store.get(key)) for key in store.list(f"leases/{run_id}/plans/")]
+
+RUN_LEASE = RunLease()
+
+# ============================================================
+# Envío concurrente de backups
+# ============================================================
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket compartido entre workers. Reduce la tasa a la mitad cuando
+    AWS Backup responde con throttling (como máximo una vez por cooldown, para
+    que una ráfaga de workers throttled no la desplome) y la recupera de forma
+    aditiva tras una racha de envíos exitosos.
+    """
+    
+    def __init__(self, rate, min_rate=0.5, max_rate=None, recovery_successes=10, cooldown=1.0):
+        self.initial_rate = float(rate)
+        self.rate = self.initial_rate
+        self.min_rate = min(min_rate, self.rate)
+        self.max_rate = float(max_rate) if max_rate else self.rate * 2
+        self.recovery_successes = recovery_successes
+        self.cooldown = cooldown
+        self.tokens = max(1.0, self.rate)
+        self.throttled = 0
+        self._successes = 0
+        self._updated = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self):
+        """
+        Bloquea hasta que haya un token disponible
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self._successes = 0
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+        logger.warning(f"Throttling en AWS Backup, tasa reducida a {self.rate:.2f} req/s")
+    
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.recovery_successes and self.rate < self.max_rate:
+                self._successes = 0
+                self.rate = min(self.max_rate, self.rate + self.initial_rate / 10)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'initial_rate': self.initial_rate,
+                'final_rate': round(self.rate, 2),
+                'throttled': self.throttled
+            }
+
+class SubmissionScheduler:
+    """
+    Admisión de envíos. Espera al instante 'not_before' de cada recurso
+    (escalonado en la ventana) y mantiene los jobs activos del vault por
+    debajo de max_in_flight (0 = sin techo). Los activos se cuentan con
+    list_backup_jobs por estado cada poll_interval segundos, más los admitidos
+    que aún no aparecen en el listado, así que el techo también cubre los jobs
+    de otros workers o ejecuciones sobre el mismo vault.
+    """
+    
+    ACTIVE_STATES = ('CREATED', 'PENDING', 'RUNNING')
+    # Sondeos tras los que un job enviado que no aparece como activo deja de
+    # contarse (terminó antes de que un sondeo llegara a verlo)
+    UNLISTED_GRACE_POLLS = 3
+    
+    def __init__(self, target, max_in_flight=0, poll_interval=None):
+        self.target = target
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval or SCHEDULE_POLL_SECONDS
+        self.active = 0
+        self.admitted = 0
+        self.unlisted = {}
+        self.polls = 0
+        self.poll_errors = 0
+        self.peak_in_flight = 0
+        self.waited_seconds = 0.0
+        self.ceiling_blocked = False
+        self._last_poll = None
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+    
+    def in_flight(self):
+        """
+        Activos según el último sondeo, más los admitidos cuyo envío no ha
+        terminado y los enviados que ningún sondeo ha listado todavía
+        """
+        return self.active + self.admitted + len(self.unlisted)
+    
+    def _poll(self):
+        """
+        Recuenta los jobs activos. Si list_backup_jobs falla se conserva el
+        último recuento (más los enviados desde entonces) hasta el siguiente
+        sondeo, en lugar de abortar el envío
+        """
+        self._last_poll = time.monotonic()
+        paginator = self.target.client('backup').get_paginator('list_backup_jobs')
+        active_ids = set()
+        try:
+            for state in self.ACTIVE_STATES:
+                for page in paginator.paginate(ByBackupVaultName=BACKUP_VAULT_NAME, ByState=state):
+                    active_ids.update(job['BackupJobId'] for job in page['BackupJobs'])
+        except ClientError as e:
+            self.poll_errors += 1
+            logger.warning(f"⚠️  [{self.target.name}] No se pudieron contar los jobs activos: {str(e)}")
+            return
+        self.active = len(active_ids)
+        # Un job enviado deja de contarse aparte cuando el listado lo muestra
+        # (ya está en active) o tras UNLISTED_GRACE_POLLS sondeos sin verlo
+        for job_id in list(self.unlisted):
+            self.unlisted[job_id] -= 1
+            if job_id in active_ids or self.unlisted[job_id] <= 0:
+                del self.unlisted[job_id]
+        self.polls += 1
+    
+    def admit(self, resource, deadline=None):
+        """
+        Bloquea hasta que el recurso pueda enviarse; devuelve False si antes
+        llega el deadline (time.monotonic())
+        """
+        started = time.monotonic()
+        delay = resource.get('not_before', 0) - time.time()
+        if delay > 0:
+            if deadline is not None and started + delay >= deadline:
+                return False
+            time.sleep(delay)
+        
+        if self.max_in_flight:
+            # Un solo thread sondea; la espera suelta el lock para que release()
+            # pueda cerrar plazas y despertar a los que esperan
+            with self._lock:
+                while True:
+                    if self._last_poll is None or time.monotonic() - self._last_poll >= self.poll_interval:
+                        self._poll()
+                    if self.in_flight() < self.max_in_flight:
+                        break
+                    wait_seconds = self.poll_interval - (time.monotonic() - self._last_poll)
+                    if deadline is not None and time.monotonic() + wait_seconds >= deadline:
+                        self.ceiling_blocked = True
+                        return False
+                    self._released.wait(max(0.0, wait_seconds))
+                self.admitted += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight())
+        
+        with self._lock:
+            self.waited_seconds += time.monotonic() - started
+        return True
+    
+    def release(self, result):
+        """
+        Cierra la plaza reservada en admit: si el job se creó sigue contando
+        hasta que un sondeo lo liste; si no (error o recurso ya enviado por
+        otra invocación) la plaza queda libre
+        """
+        if not self.max_in_flight:
+            return
+        with self._lock:
+            self.admitted = max(0, self.admitted - 1)
+            if result and result['success'] and not result.get('skipped'):
+                self.unlisted[result['backup_job_id']] = self.UNLISTED_GRACE_POLLS
+            self._released.notify_all()
+    
+    def stats(self):
+        return {
+            'order': SCHEDULE_ORDER,
+            'window_minutes': SCHEDULE_WINDOW_MINUTES,
+            'max_in_flight': self.max_in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'ceiling_blocked': self.ceiling_blocked,
+            'polls': self.polls,
+            'poll_errors': self.poll_errors,
+            'waited_seconds': round(self.waited_seconds, 2)
+        }
+
+def classify_error(error_code):
+    """
+    'retryable', 'deferred' o 'fatal' según el código de error
+    """
+    if error_code in DEFERRED_ERROR_CODES:
+        return 'deferred'
+    if error_code in RETRYABLE_ERROR_CODES:
+        return 'retryable'
+    return 'fatal'
+
+class RetryQueue:
+    """
+    Cola de reintentos ordenada por instante de reintento. El backoff es
+    exponencial con jitter (la mitad fija y la otra mitad aleatoria, para que
+    los workers throttled no vuelvan a la vez) y parte de una base distinta
+    para los errores aplazados. Limita los intentos por recurso y el total de
+    reintentos del envío.
+    """
+    
+    def __init__(self, max_attempts=None, budget=None, base_seconds=None,
+                 deferred_seconds=None, max_backoff=None):
+        self.max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+        self.budget = RETRY_BUDGET if budget is None else budget
+        self.base_seconds = RETRY_BASE_SECONDS if base_seconds is None else base_seconds
+        self.deferred_seconds = RETRY_DEFERRED_SECONDS if deferred_seconds is None else deferred_seconds
+        self.max_backoff = max_backoff or RETRY_MAX_BACKOFF_SECONDS
+        self.retried = 0
+        self.by_class = {}
+        self.max_attempts_reached = 0
+        self.budget_exhausted = 0
+        self.left_for_continuation = 0
+        self._heap = []
+    
+    def __len__(self):
+        return len(self._heap)
+    
+    def backoff(self, attempt, error_class):
+        base = self.deferred_seconds if error_class == 'deferred' else self.base_seconds
+        delay = min(self.max_backoff, base * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def schedule(self, key, attempt, error_class):
+        """
+        Programa el reintento número `attempt` + 1; devuelve False si el
+        error es definitivo o ya no quedan intentos o presupuesto
+        """
+        if error_class == 'fatal':
+            return False
+        if attempt >= self.max_attempts:
+            self.max_attempts_reached += 1
+            return False
+        if self.retried >= self.budget:
+            self.budget_exhausted += 1
+            return False
+        self.retried += 1
+        self.by_class[error_class] = self.by_class.get(error_class, 0) + 1
+        heapq.heappush(self._heap, (time.monotonic() + self.backoff(attempt, error_class), key))
+        return True
+    
+    def next_delay(self):
+        """
+        Segundos hasta el próximo reintento (None si la cola está vacía)
+        """
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+    
+    def pop_ready(self):
+        ready = []
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            ready.append(heapq.heappop(self._heap)[1])
+        return ready
+    
+    def drain(self):
+        """
+        Vacía la cola al llegar al deadline; esos recursos quedan para la continuación
+        """
+        keys = [key for _, key in self._heap]
+        self.left_for_continuation += len(keys)
+        self._heap = []
+        return keys
+    
+    def stats(self):
+        return {
+            'retried': self.retried,
+            'by_class': self.by_class,
+            'max_attempts_reached': self.max_attempts_reached,
+            'budget_exhausted': self.budget_exhausted,
+            'left_for_continuation': self.left_for_continuation
+        }
+
+def stream_backups(jobs, limiter, max_workers=None, deadline=None, retry_queue=None, scheduler=None):
+    """
+    Ejecuta en un pool acotado de threads los jobs (función de backup,
+    recurso) respetando el rate limiter y, si se indica, la admisión del
+    scheduler (escalonado y techo de jobs activos). Con retry_queue, los
+    fallos reintentables o aplazados vuelven al pool tras su backoff y cada
+    resultado lleva el número de intentos en 'attempts'.
+    
+    jobs puede ser cualquier iterable (p.ej. un descubrimiento todavía en
+    curso): se consume a medida que hay threads libres y se genera
+    (posición, job, resultado) en cuanto cada job termina, con resultado None
+    si no se envió antes del deadline (time.monotonic()). Solo se mantienen en
+    memoria los jobs en curso o pendientes de reintento.
+    """
+    def out_of_time():
+        return deadline is not None and time.monotonic() >= deadline
+    
+    def run(job):
+        backup_fn, resource = job
+        if out_of_time():
+            return None
+        if scheduler is not None and not scheduler.admit(resource, deadline):
+            return None
+        limiter.acquire()
+        if out_of_time():
+            if scheduler is not None:
+                scheduler.release(None)
+            return None
+        result = backup_fn(resource)
+        if scheduler is not None:
+            scheduler.release(result)
+        if result['success']:
+            limiter.on_success()
+        elif result.get('error_code') in THROTTLE_ERROR_CODES:
+            limiter.on_throttle()
+        return result
+    
+    source = enumerate(jobs)
+    exhausted = False
+    active = {}
+    attempts = {}
+    workers = max(1, max_workers or BACKUP_MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            for i in retry_queue.pop_ready() if retry_queue else []:
+                pending[executor.submit(run, active[i])] = i
+            
+            # Nuevos jobs solo cuando hay threads libres
+            while not exhausted and len(pending) < workers:
+                i, job = next(source, (None, None))
+                if job is None:
+                    exhausted = True
+                    break
+                if out_of_time():
+                    yield i, job, None
+                    continue
+                active[i] = job
+                attempts[i] = 0
+                pending[executor.submit(run, job)] = i
+            
+            # Sin jobs en curso la fuente está agotada: solo quedan reintentos
+            if not pending:
+                if not retry_queue:
+                    break
+                delay = retry_queue.next_delay()
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    # Los reintentos que no llegan a enviarse quedan para la continuación
+                    for i in retry_queue.drain():
+                        yield i, active.pop(i), None
+                    break
+                time.sleep(delay)
+                continue
+            
+            timeout = retry_queue.next_delay() if retry_queue else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                result = future.result()
+                if result is not None:
+                    attempts[i] += 1
+                    result['attempts'] = attempts[i]
+                    if not result['success'] and retry_queue is not None:
+                        result['error_class'] = classify_error(result.get('error_code'))
+                        if retry_queue.schedule(i, attempts[i], result['error_class']):
+                            continue
+                attempts.pop(i)
+                yield i, active.pop(i), result
+
+def create_backup(driver, resource, target=None, run_timestamp=None):
+    """
+    Crea un backup on-demand de un recurso usando AWS Backup; el driver
+    aporta el prefijo del nombre y el ResourceType de los tags
+    """
+    backup_job_id = None
+    started = time.monotonic()
+    
+    # Recurso ya enviado o reclamado por otra invocación de la misma ejecución.
+    # Si el registro no responde, el envío se reintenta como un throttling
+    try:
+        entry = RUN_LEASE.claim(resource)
+    except (ClientError, sqlite3.Error) as e:
+        logger.warning(f"⚠️  Registro de envíos no disponible para {driver.kind} {resource['identifier']}: {str(e)}")
+        return {
+            'success': False,
+            'resource': resource['identifier'],
+            'resource_arn': resource['arn'],
+            'type': driver.kind,
+            'engine': resource['engine'],
+            'latency_ms': round((time.monotonic() - started) * 1000),
+            'error_code': 'LedgerUnavailable',
+            'error': str(e)
+        }
+    if entry is not None:
+        logger.info(f"⏭️  {driver.kind} {resource['identifier']} ya {'enviado' if entry['state'] == 'submitted' else 'en curso'} en otra invocación")
+        return {
+            'success': True,
+            'skipped': True,
+            'resource': resource['identifier'],
+            'resource_arn': resource['arn'],
+            'type': driver.kind,
+            'engine': resource['engine'],
+            'reason': 'ledger',
+            'backup_job_id': entry.get('data', {}).get('backup_job_id')
+        }
+    
+    try:
+        # El timestamp de la ejecución mantiene el IdempotencyToken estable entre saltos
+        timestamp = run_timestamp or datetime.now().strftime('%Y%m%d-%H%M%S')
+        backup_name = f"{driver.name_prefix}-{resource['identifier']}-{timestamp}"
+        
+        logger.info(f"Iniciando backup para {driver.kind}: {resource['identifier']}")
         
         # Iniciar backup job
-        response = backup_client.start_backup_job(
+        target = target or DEFAULT_TARGET
+        response = target.client('backup', SUBMIT_CLIENT_CONFIG).start_backup_job(
             BackupVaultName=BACKUP_VAULT_NAME,
-            ResourceArn=cluster['arn'],
-            IamRoleArn=IAM_ROLE_ARN,
+            ResourceArn=resource['arn'],
+            IamRoleArn=target.backup_role_arn,
             IdempotencyToken=backup_name,
             Lifecycle={
                 'DeleteAfterDays': RETENTION_DAYS
             },
             RecoveryPointTags={
                 'Name': backup_name,
-                'ResourceType': 'Aurora',
-                'ResourceIdentifier': cluster['identifier'],
-                'Engine': cluster['engine'],
+                'ResourceType': driver.kind,
+                'ResourceIdentifier': resource['identifier'],
+                'Engine': resource['engine'],
                 'AutomatedBackup': 'True',
                 'CreatedBy': 'Lambda',
                 'RetentionDays': str(RETENTION_DAYS)
@@ -270,14 +3967,17 @@ def create_aurora_backup(cluster):
         )
         
         backup_job_id = response['BackupJobId']
+        RUN_LEASE.record_submission(resource, backup_job_id)
         
         logger.info(f"✅ Backup iniciado - Job ID: {backup_job_id}")
         
         return {
             'success': True,
-            'resource': cluster['identifier'],
-            'type': 'Aurora',
-            'engine': cluster['engine'],
+            'resource': resource['identifier'],
+            'resource_arn': resource['arn'],
+            'type': driver.kind,
+            'engine': resource['engine'],
+            'latency_ms': round((time.monotonic() - started) * 1000),
             'backup_job_id': backup_job_id,
             'backup_name': backup_name,
             'vault': BACKUP_VAULT_NAME,
@@ -287,22 +3987,31 @@ def create_aurora_backup(cluster):
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_msg = e.response['Error']['Message']
-        logger.error(f"❌ Error creando backup para Aurora {cluster['identifier']}: [{error_code}] {error_msg}")
+        logger.error(f"❌ Error creando backup para {driver.kind} {resource['identifier']}: [{error_code}] {error_msg}")
+        RUN_LEASE.release_claim(resource)
         
         return {
             'success': False,
-            'resource': cluster['identifier'],
-            'type': 'Aurora',
+            'resource': resource['identifier'],
+            'resource_arn': resource['arn'],
+            'type': driver.kind,
+            'engine': resource['engine'],
+            'latency_ms': round((time.monotonic() - started) * 1000),
             'error_code': error_code,
             'error': error_msg
         }
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"❌ Error inesperado para Aurora {cluster['identifier']}: {error_msg}")
+        logger.error(f"❌ Error inesperado para {driver.kind} {resource['identifier']}: {error_msg}")
+        RUN_LEASE.release_claim(resource)
         
         return {
             'success': False,
-            'resource': cluster['identifier'],
-            'type': 'Aurora',
+            'resource': resource['identifier'],
+            'resource_arn': resource['arn'],
+            'type': driver.kind,
+            'engine': resource['engine'],
+            'latency_ms': round((time.monotonic() - started) * 1000),
+            'error_code': type(e).__name__,
             'error': error_msg
-        }
\ No newline at end of file
+        }
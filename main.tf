@@ -49,6 +49,142 @@ resource "aws_backup_vault" "new" {
   })
 }
 
+data "aws_caller_identity" "current" {}
+
+# Bucket de estado (checkpoints de continuación y registros por recurso)
+resource "aws_s3_bucket" "state" {
+  bucket = "${var.lambda_function_name}-state-${data.aws_caller_identity.current.account_id}"
+
+  tags = merge(var.tags, {
+    Name = "${var.lambda_function_name}-state"
+  })
+}
+
+resource "aws_s3_bucket_public_access_block" "state" {
+  bucket                  = aws_s3_bucket.state.id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "state" {
+  bucket = aws_s3_bucket.state.id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_lifecycle_configuration" "state" {
+  bucket = aws_s3_bucket.state.id
+
+  rule {
+    id     = "expire-checkpoints"
+    status = "Enabled"
+
+    filter {
+      prefix = "checkpoints/"
+    }
+
+    expiration {
+      days = 7
+    }
+  }
+
+  rule {
+    id     = "expire-results"
+    status = "Enabled"
+
+    filter {
+      prefix = "results/"
+    }
+
+    expiration {
+      days = var.result_retention_days
+    }
+  }
+
+  rule {
+    id     = "expire-history"
+    status = "Enabled"
+
+    filter {
+      prefix = "history/"
+    }
+
+    expiration {
+      days = var.history_retention_days
+    }
+  }
+
+  rule {
+    id     = "expire-leases"
+    status = "Enabled"
+
+    filter {
+      prefix = "leases/"
+    }
+
+    expiration {
+      days = 7
+    }
+  }
+}
+
+# Tabla del inventario incremental (INVENTORY_MODE=incremental)
+resource "aws_dynamodb_table" "inventory" {
+  count        = var.inventory_mode == "incremental" ? 1 : 0
+  name         = "${var.lambda_function_name}-inventory"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+  range_key    = "sk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  attribute {
+    name = "sk"
+    type = "S"
+  }
+
+  tags = merge(var.tags, {
+    Name = "${var.lambda_function_name}-inventory"
+  })
+}
+
+# Tabla del lease de ejecución y el registro de envíos (RUN_LEASE_ENABLED)
+resource "aws_dynamodb_table" "lease" {
+  count        = var.run_lease_enabled ? 1 : 0
+  name         = "${var.lambda_function_name}-lease"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+  range_key    = "sk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  attribute {
+    name = "sk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = merge(var.tags, {
+    Name = "${var.lambda_function_name}-lease"
+  })
+}
+
 # Local value para determinar qué vault usar
 locals {
   backup_vault_name = var.use_existing_vault ? data.aws_backup_vault.existing[0].name : aws_backup_vault.new[0].name
@@ -109,7 +245,7 @@ resource "aws_iam_role_policy" "lambda_policy" {
 
   policy = jsonencode({
     Version = "2012-10-17"
-    Statement = [
+    Statement = concat([
       {
         Effect = "Allow"
         Action = [
@@ -124,7 +260,8 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "rds:DescribeDBInstances",
           "rds:DescribeDBClusters",
-          "rds:ListTagsForResource"
+          "rds:ListTagsForResource",
+          "tag:GetResources"
         ]
         Resource = "*"
       },
@@ -134,7 +271,18 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "backup:StartBackupJob",
           "backup:DescribeBackupVault",
           "backup:ListBackupJobs",
-          "backup:ListRecoveryPointsByBackupVault"
+          "backup:ListRecoveryPointsByBackupVault",
+          "backup:UpdateRecoveryPointLifecycle",
+          "backup:DeleteRecoveryPoint",
+          "backup:ListTags"
+        ]
+        Resource = "*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "rds:DeleteDBSnapshot",
+          "rds:DeleteDBClusterSnapshot"
         ]
         Resource = "*"
       },
@@ -144,8 +292,57 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "iam:PassRole"
         ]
         Resource = aws_iam_role.backup_role.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Resource = "${aws_s3_bucket.state.arn}/*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = aws_s3_bucket.state.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        Resource = "arn:aws:lambda:${var.aws_region}:${data.aws_caller_identity.current.account_id}:function:${var.lambda_function_name}"
+      }
+    ], length(var.target_role_arns) > 0 ? [
+      {
+        Effect   = "Allow"
+        Action   = ["sts:AssumeRole"]
+        Resource = var.target_role_arns
+      }
+    ] : [], var.inventory_mode == "incremental" ? [
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:Query",
+          "dynamodb:BatchWriteItem"
+        ]
+        Resource = aws_dynamodb_table.inventory[0].arn
       }
-    ]
+    ] : [], var.run_lease_enabled ? [
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ]
+        Resource = aws_dynamodb_table.lease[0].arn
+      }
+    ] : [])
   })
 }
 
@@ -168,8 +365,8 @@ resource "aws_lambda_function" "backup_lambda" {
   timeout       = 900
   memory_size   = 256
 
-  filename         = data.archive_file.lambda_inline.output_path
-  source_code_hash = data.archive_file.lambda_inline.output_base64sha256
+  filename         = data.archive_file.lambda_package.output_path
+  source_code_hash = data.archive_file.lambda_package.output_base64sha256
 
   environment {
     variables = {
@@ -178,6 +375,54 @@ resource "aws_lambda_function" "backup_lambda" {
       BACKUP_TAG_KEY     = var.backup_tag_key
       BACKUP_TAG_VALUE   = var.backup_tag_value
       BACKUP_ROLE_ARN    = aws_iam_role.backup_role.arn
+      DISCOVERY_STRATEGY = var.discovery_strategy
+      BACKUP_MAX_WORKERS = var.backup_max_workers
+      BACKUP_SUBMIT_RATE = var.backup_submit_rate
+      TARGET_REGIONS     = join(",", var.target_regions)
+      TARGET_ROLE_ARNS   = join(",", var.target_role_arns)
+
+      MIN_BACKUP_INTERVAL_HOURS = var.min_backup_interval_hours
+      DRY_RUN                   = var.dry_run
+      BACKUP_RESOURCE_TYPES     = join(",", var.backup_resource_types)
+      TRACK_JOBS_SECONDS        = var.track_jobs_seconds
+      STATE_BUCKET              = aws_s3_bucket.state.id
+      MAX_CONTINUATIONS         = var.max_continuations
+      COORDINATOR_MODE          = var.coordinator_mode
+      SHARD_SIZE                = var.shard_size
+      BOTO_RETRY_MODE           = var.boto_retry_mode
+      BOTO_MAX_ATTEMPTS         = var.boto_max_attempts
+      BOTO_SUBMIT_MAX_ATTEMPTS  = var.boto_submit_max_attempts
+      BOTO_CONNECT_TIMEOUT      = var.boto_connect_timeout
+      BOTO_READ_TIMEOUT         = var.boto_read_timeout
+      METRICS_ENABLED           = var.metrics_enabled
+      METRICS_NAMESPACE         = var.metrics_namespace
+      RESULT_SINK               = var.result_sink
+      RETRY_MAX_ATTEMPTS        = var.retry_max_attempts
+      RETRY_BUDGET              = var.retry_budget
+      SCHEDULE_ORDER            = var.schedule_order
+      SCHEDULE_WINDOW_MINUTES   = var.schedule_window_minutes
+      MAX_IN_FLIGHT_JOBS        = var.max_in_flight_jobs
+      BACKUP_PRIORITY_TAG_KEY   = var.backup_priority_tag_key
+      INVENTORY_MODE            = var.inventory_mode
+      INVENTORY_TABLE           = var.inventory_mode == "incremental" ? aws_dynamodb_table.inventory[0].name : ""
+      INVENTORY_RECONCILE_HOURS = var.inventory_reconcile_hours
+
+      DURATION_MODEL_MODE          = var.duration_model_mode
+      DURATION_MODEL_LOOKBACK_DAYS = var.duration_model_lookback_days
+      RUN_FINISH_BY_UTC            = var.run_finish_by_utc
+      RUN_HISTORY_ENABLED          = var.run_history_enabled
+
+      RUN_LEASE_ENABLED     = var.run_lease_enabled
+      RUN_LEASE_TABLE       = var.run_lease_enabled ? aws_dynamodb_table.lease[0].name : ""
+      RUN_LEASE_TTL_SECONDS = var.run_lease_ttl_seconds
+      RUN_LEASE_CONFLICT    = var.run_lease_conflict
+
+      DISCOVERY_CACHE_TTL_SECONDS = var.discovery_cache_ttl_seconds
+      DISCOVERY_CACHE_MAX_ENTRIES = var.discovery_cache_max_entries
+      DISCOVERY_PIPELINE          = var.discovery_pipeline
+      DISCOVERY_QUEUE_SIZE        = var.discovery_queue_size
+      RETENTION_ACTION_RATE       = var.retention_action_rate
+      RETENTION_DELETE_EXPIRED    = var.retention_delete_expired
     }
   }
 
@@ -191,288 +436,14 @@ resource "aws_lambda_function" "backup_lambda" {
   })
 }
 
-# Crear archivo temporal y empaquetarlo
-data "archive_file" "lambda_inline" {
+# Empaquetar lambda_source.py como index.py (handler index.lambda_handler).
+# Es la única copia del código: el script standalone solo lo re-exporta
+data "archive_file" "lambda_package" {
   type        = "zip"
   output_path = "${path.module}/lambda_payload.zip"
 
   source {
-    content  = <<-EOT
-import boto3
-import os
-import json
-from datetime import datetime, timedelta
-from botocore.exceptions import ClientError
-import logging
-
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-backup_client = boto3.client('backup')
-rds_client = boto3.client('rds')
-
-BACKUP_VAULT_NAME = os.environ.get('BACKUP_VAULT_NAME', 'Default')
-RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', '5'))
-BACKUP_TAG_KEY = os.environ.get('BACKUP_TAG_KEY', 'Backup')
-BACKUP_TAG_VALUE = os.environ.get('BACKUP_TAG_VALUE', 'True')
-IAM_ROLE_ARN = os.environ['BACKUP_ROLE_ARN']
-
-def lambda_handler(event, context):
-    try:
-        logger.info("=" * 60)
-        logger.info("🚀 INICIANDO BACKUP AUTOMATIZADO")
-        logger.info(f"📦 Vault: {BACKUP_VAULT_NAME}")
-        logger.info(f"⏰ Retención: {RETENTION_DAYS} días")
-        logger.info(f"🏷️  Tag: {BACKUP_TAG_KEY}={BACKUP_TAG_VALUE}")
-        logger.info("=" * 60)
-        
-        rds_instances = get_tagged_rds_instances()
-        aurora_clusters = get_tagged_aurora_clusters()
-        
-        total_resources = len(rds_instances) + len(aurora_clusters)
-        
-        if total_resources == 0:
-            logger.warning("⚠️  No se encontraron recursos con el tag especificado")
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'No resources found with specified tags',
-                    'tag_key': BACKUP_TAG_KEY,
-                    'tag_value': BACKUP_TAG_VALUE
-                })
-            }
-        
-        backup_results = {
-            'successful': [],
-            'failed': [],
-            'total_processed': 0,
-            'timestamp': datetime.now().isoformat(),
-            'vault': BACKUP_VAULT_NAME,
-            'retention_days': RETENTION_DAYS
-        }
-        
-        for instance in rds_instances:
-            result = create_rds_backup(instance)
-            backup_results['total_processed'] += 1
-            backup_results['successful' if result['success'] else 'failed'].append(result)
-        
-        for cluster in aurora_clusters:
-            result = create_aurora_backup(cluster)
-            backup_results['total_processed'] += 1
-            backup_results['successful' if result['success'] else 'failed'].append(result)
-        
-        logger.info("=" * 60)
-        logger.info(f"✅ Exitosos: {len(backup_results['successful'])}")
-        logger.info(f"❌ Fallidos: {len(backup_results['failed'])}")
-        logger.info(f"📊 Total procesados: {backup_results['total_processed']}")
-        logger.info("=" * 60)
-        
-        if backup_results['failed']:
-            logger.warning("⚠️  RECURSOS CON FALLOS:")
-            for fail in backup_results['failed']:
-                logger.warning(f"  • {fail['resource']} ({fail['type']}): {fail.get('error', 'Unknown')}")
-        
-        if backup_results['successful']:
-            logger.info("✅ BACKUPS EXITOSOS:")
-            for success in backup_results['successful']:
-                logger.info(f"  • {success['resource']} ({success['type']}): Job {success['backup_job_id']}")
-        
-        return {
-            'statusCode': 200 if not backup_results['failed'] else 207,
-            'body': json.dumps(backup_results, default=str, indent=2)
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ ERROR CRÍTICO: {str(e)}", exc_info=True)
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e), 'error_type': type(e).__name__})
-        }
-
-def get_tagged_rds_instances():
-    tagged_instances = []
-    try:
-        logger.info("🔍 Buscando instancias RDS...")
-        paginator = rds_client.get_paginator('describe_db_instances')
-        
-        for page in paginator.paginate():
-            for instance in page['DBInstances']:
-                try:
-                    tags = rds_client.list_tags_for_resource(ResourceName=instance['DBInstanceArn'])
-                    for tag in tags.get('TagList', []):
-                        if tag['Key'] == BACKUP_TAG_KEY and tag['Value'] == BACKUP_TAG_VALUE:
-                            tagged_instances.append({
-                                'arn': instance['DBInstanceArn'],
-                                'identifier': instance['DBInstanceIdentifier'],
-                                'engine': instance['Engine']
-                            })
-                            logger.info(f"  ✓ RDS: {instance['DBInstanceIdentifier']} ({instance['Engine']})")
-                            break
-                except ClientError as e:
-                    logger.debug(f"  ⚠️  No se pudieron leer tags de {instance.get('DBInstanceIdentifier', 'unknown')}: {str(e)}")
-                    continue
-                except Exception as e:
-                    logger.debug(f"  ⚠️  Error inesperado: {str(e)}")
-                    continue
-        
-        logger.info(f"📌 Total RDS encontradas: {len(tagged_instances)}")
-        return tagged_instances
-        
-    except Exception as e:
-        logger.error(f"❌ Error listando instancias RDS: {str(e)}")
-        return []
-
-def get_tagged_aurora_clusters():
-    tagged_clusters = []
-    try:
-        logger.info("🔍 Buscando clusters Aurora...")
-        paginator = rds_client.get_paginator('describe_db_clusters')
-        
-        for page in paginator.paginate():
-            for cluster in page['DBClusters']:
-                try:
-                    tags = rds_client.list_tags_for_resource(ResourceName=cluster['DBClusterArn'])
-                    for tag in tags.get('TagList', []):
-                        if tag['Key'] == BACKUP_TAG_KEY and tag['Value'] == BACKUP_TAG_VALUE:
-                            tagged_clusters.append({
-                                'arn': cluster['DBClusterArn'],
-                                'identifier': cluster['DBClusterIdentifier'],
-                                'engine': cluster['Engine']
-                            })
-                            logger.info(f"  ✓ Aurora: {cluster['DBClusterIdentifier']} ({cluster['Engine']})")
-                            break
-                except ClientError as e:
-                    logger.debug(f"  ⚠️  No se pudieron leer tags de {cluster.get('DBClusterIdentifier', 'unknown')}: {str(e)}")
-                    continue
-                except Exception as e:
-                    logger.debug(f"  ⚠️  Error inesperado: {str(e)}")
-                    continue
-        
-        logger.info(f"📌 Total Aurora encontrados: {len(tagged_clusters)}")
-        return tagged_clusters
-        
-    except Exception as e:
-        logger.error(f"❌ Error listando clusters Aurora: {str(e)}")
-        return []
-
-def create_rds_backup(instance):
-    try:
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        backup_name = f"rds-{instance['identifier']}-{timestamp}"
-        
-        logger.info(f"💾 Iniciando backup RDS: {instance['identifier']}")
-        
-        response = backup_client.start_backup_job(
-            BackupVaultName=BACKUP_VAULT_NAME,
-            ResourceArn=instance['arn'],
-            IamRoleArn=IAM_ROLE_ARN,
-            IdempotencyToken=backup_name,
-            Lifecycle={'DeleteAfterDays': RETENTION_DAYS},
-            RecoveryPointTags={
-                'Name': backup_name,
-                'ResourceType': 'RDS',
-                'ResourceIdentifier': instance['identifier'],
-                'Engine': instance['engine'],
-                'AutomatedBackup': 'True',
-                'CreatedBy': 'Lambda',
-                'RetentionDays': str(RETENTION_DAYS),
-                'BackupDate': datetime.now().isoformat()
-            }
-        )
-        
-        logger.info(f"  ✅ Job ID: {response['BackupJobId']}")
-        
-        return {
-            'success': True,
-            'resource': instance['identifier'],
-            'type': 'RDS',
-            'engine': instance['engine'],
-            'backup_job_id': response['BackupJobId'],
-            'backup_name': backup_name,
-            'vault': BACKUP_VAULT_NAME,
-            'retention_days': RETENTION_DAYS
-        }
-        
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_msg = e.response['Error']['Message']
-        logger.error(f"  ❌ Error [{error_code}]: {error_msg}")
-        
-        return {
-            'success': False,
-            'resource': instance['identifier'],
-            'type': 'RDS',
-            'error_code': error_code,
-            'error': error_msg
-        }
-    except Exception as e:
-        logger.error(f"  ❌ Error inesperado: {str(e)}")
-        return {
-            'success': False,
-            'resource': instance['identifier'],
-            'type': 'RDS',
-            'error': str(e)
-        }
-
-def create_aurora_backup(cluster):
-    try:
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        backup_name = f"aurora-{cluster['identifier']}-{timestamp}"
-        
-        logger.info(f"💾 Iniciando backup Aurora: {cluster['identifier']}")
-        
-        response = backup_client.start_backup_job(
-            BackupVaultName=BACKUP_VAULT_NAME,
-            ResourceArn=cluster['arn'],
-            IamRoleArn=IAM_ROLE_ARN,
-            IdempotencyToken=backup_name,
-            Lifecycle={'DeleteAfterDays': RETENTION_DAYS},
-            RecoveryPointTags={
-                'Name': backup_name,
-                'ResourceType': 'Aurora',
-                'ResourceIdentifier': cluster['identifier'],
-                'Engine': cluster['engine'],
-                'AutomatedBackup': 'True',
-                'CreatedBy': 'Lambda',
-                'RetentionDays': str(RETENTION_DAYS),
-                'BackupDate': datetime.now().isoformat()
-            }
-        )
-        
-        logger.info(f"  ✅ Job ID: {response['BackupJobId']}")
-        
-        return {
-            'success': True,
-            'resource': cluster['identifier'],
-            'type': 'Aurora',
-            'engine': cluster['engine'],
-            'backup_job_id': response['BackupJobId'],
-            'backup_name': backup_name,
-            'vault': BACKUP_VAULT_NAME,
-            'retention_days': RETENTION_DAYS
-        }
-        
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_msg = e.response['Error']['Message']
-        logger.error(f"  ❌ Error [{error_code}]: {error_msg}")
-        
-        return {
-            'success': False,
-            'resource': cluster['identifier'],
-            'type': 'Aurora',
-            'error_code': error_code,
-            'error': error_msg
-        }
-    except Exception as e:
-        logger.error(f"  ❌ Error inesperado: {str(e)}")
-        return {
-            'success': False,
-            'resource': cluster['identifier'],
-            'type': 'Aurora',
-            'error': str(e)
-        }
-EOT
+    content  = file("${path.module}/lambda_source.py")
     filename = "index.py"
   }
 }
@@ -502,6 +473,108 @@ resource "aws_lambda_permission" "allow_eventbridge" {
   source_arn    = aws_cloudwatch_event_rule.backup_schedule.arn
 }
 
+# EventBridge Rules del inventario incremental: creación/borrado de
+# instancias y clusters, y cambios de tags en RDS
+locals {
+  inventory_event_patterns = var.inventory_mode == "incremental" ? {
+    rds = {
+      source      = ["aws.rds"]
+      detail-type = ["RDS DB Instance Event", "RDS DB Cluster Event"]
+      detail      = { EventCategories = ["creation", "deletion"] }
+    }
+    tags = {
+      source      = ["aws.tag"]
+      detail-type = ["Tag Change on Resource"]
+      detail      = { service = ["rds"], resource-type = ["db", "cluster"] }
+    }
+  } : {}
+}
+
+resource "aws_cloudwatch_event_rule" "inventory_events" {
+  for_each      = local.inventory_event_patterns
+  name          = "${var.lambda_function_name}-inventory-${each.key}"
+  description   = "Keep the backup inventory up to date"
+  event_pattern = jsonencode(each.value)
+
+  tags = merge(var.tags, {
+    Name = "${var.lambda_function_name}-inventory-${each.key}"
+  })
+}
+
+resource "aws_cloudwatch_event_target" "inventory_target" {
+  for_each  = local.inventory_event_patterns
+  rule      = aws_cloudwatch_event_rule.inventory_events[each.key].name
+  target_id = "BackupLambdaInventory"
+  arn       = aws_lambda_function.backup_lambda.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_inventory" {
+  for_each      = local.inventory_event_patterns
+  statement_id  = "AllowInventoryFromEventBridge-${each.key}"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.backup_lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.inventory_events[each.key].arn
+}
+
+# EventBridge Rule de aplicación de retención (opcional)
+resource "aws_cloudwatch_event_rule" "retention_schedule" {
+  count               = var.retention_schedule == "" ? 0 : 1
+  name                = "${var.lambda_function_name}-retention"
+  description         = "Apply the current retention policy to existing recovery points"
+  schedule_expression = var.retention_schedule
+
+  tags = merge(var.tags, {
+    Name = "${var.lambda_function_name}-retention"
+  })
+}
+
+resource "aws_cloudwatch_event_target" "retention_target" {
+  count     = var.retention_schedule == "" ? 0 : 1
+  rule      = aws_cloudwatch_event_rule.retention_schedule[0].name
+  target_id = "BackupLambdaRetention"
+  arn       = aws_lambda_function.backup_lambda.arn
+  input     = jsonencode({ mode = "retention" })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_retention" {
+  count         = var.retention_schedule == "" ? 0 : 1
+  statement_id  = "AllowRetentionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.backup_lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.retention_schedule[0].arn
+}
+
+# EventBridge Rule de seguimiento de jobs (opcional)
+resource "aws_cloudwatch_event_rule" "tracking_schedule" {
+  count               = var.tracking_schedule == "" ? 0 : 1
+  name                = "${var.lambda_function_name}-tracking"
+  description         = "Reconcile backup job results after the backup run"
+  schedule_expression = var.tracking_schedule
+
+  tags = merge(var.tags, {
+    Name = "${var.lambda_function_name}-tracking"
+  })
+}
+
+resource "aws_cloudwatch_event_target" "tracking_target" {
+  count     = var.tracking_schedule == "" ? 0 : 1
+  rule      = aws_cloudwatch_event_rule.tracking_schedule[0].name
+  target_id = "BackupLambdaTracking"
+  arn       = aws_lambda_function.backup_lambda.arn
+  input     = jsonencode({ mode = "track" })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_tracking" {
+  count         = var.tracking_schedule == "" ? 0 : 1
+  statement_id  = "AllowTrackingFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.backup_lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.tracking_schedule[0].arn
+}
+
 # SNS Topic
 resource "aws_sns_topic" "backup_notifications" {
   name = "${var.lambda_function_name}-notifications"
@@ -28,6 +28,11 @@ output "vault_source" {
   value       = var.use_existing_vault ? "existing" : "newly_created"
 }
 
+output "state_bucket_name" {
+  description = "Bucket S3 de estado (checkpoints de continuación)"
+  value       = aws_s3_bucket.state.id
+}
+
 output "cloudwatch_log_group" {
   description = "CloudWatch Log Group de Lambda"
   value       = aws_cloudwatch_log_group.lambda_logs.name
@@ -0,0 +1,205 @@
+"""
+Consultas sobre el historial de ejecuciones (history/dt=YYYY-MM-DD/ en el
+bucket de estado o en un directorio local).
+
+Solo se leen las particiones de los días consultados:
+
+    python run_history.py streaks --bucket mi-bucket-estado --days 7 --min-streak 3
+    python run_history.py coverage --dir /tmp/rds-backup-state --days 7 --missing
+    python run_history.py latency --bucket mi-bucket-estado --days 14 --json
+
+- streaks:  recursos cuyas últimas N ejecuciones fallaron seguidas
+- coverage: por día, recursos vistos y recursos con backup (enviado o reciente)
+- latency:  por día, percentiles de la latencia de start_backup_job y de la
+            duración de los jobs seguidos (modo track)
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Estados de un job seguido que cuentan como fallo del backup
+FAILED_JOB_STATES = ('FAILED', 'ABORTED', 'EXPIRED', 'PARTIAL')
+
+def parse_args():
+    common = argparse.ArgumentParser(add_help=False)
+    location = common.add_mutually_exclusive_group()
+    location.add_argument('--bucket', help='Bucket de estado (STATE_BUCKET)')
+    location.add_argument('--dir', help='Directorio de estado local (STATE_DIR)')
+    common.add_argument('--days', type=int, default=7, help='Días hacia atrás, incluido el último')
+    common.add_argument('--until', type=date.fromisoformat, default=None,
+                        help='Último día consultado (YYYY-MM-DD, por defecto hoy en UTC)')
+    common.add_argument('--target', help='Filtrar por destino (región/cuenta)')
+    common.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    parser = argparse.ArgumentParser(description='Consultas sobre el historial de ejecuciones de la Lambda')
+    commands = parser.add_subparsers(dest='command', required=True)
+    streaks = commands.add_parser('streaks', parents=[common], help='Recursos con fallos consecutivos')
+    streaks.add_argument('--min-streak', type=int, default=3)
+    coverage = commands.add_parser('coverage', parents=[common], help='Cobertura de backups por día')
+    coverage.add_argument('--missing', action='store_true', help='Listar los recursos sin ningún backup en el periodo')
+    commands.add_parser('latency', parents=[common], help='Tendencia de latencia de envío y duración de jobs')
+    return parser.parse_args()
+
+def open_store(args):
+    """
+    La configuración de lambda_source se lee al importarlo, así que el
+    almacén se elige en el entorno antes del import
+    """
+    os.environ.setdefault('BACKUP_ROLE_ARN', '')
+    if args.bucket:
+        os.environ['STATE_BUCKET'] = args.bucket
+    elif args.dir:
+        os.environ['STATE_BUCKET'] = ''
+        os.environ['STATE_DIR'] = args.dir
+    sys.path.insert(0, REPO_DIR)
+    import lambda_source
+    return lambda_source, lambda_source.get_state_store()
+
+def query_days(args):
+    until = args.until or datetime.now(timezone.utc).date()
+    return [until - timedelta(days=offset) for offset in range(args.days - 1, -1, -1)]
+
+def resource_runs(rows):
+    """
+    Estado de cada recurso en cada ejecución: {clave: {run_id: fila}}, con
+    'status' successful/failed/skipped. Las filas 'tracked' corrigen el
+    estado de la ejecución que envió el job (por backup_job_id)
+    """
+    runs = {}
+    names = {}
+    job_runs = {}
+    tracked = []
+    for row in rows:
+        if row['outcome'] == 'tracked':
+            tracked.append(row)
+            continue
+        key = row.get('resource_arn') or f"{row['target']}/{row['resource']}"
+        names[key] = row.get('resource') or key
+        entry = runs.setdefault(key, {}).setdefault(row['run_id'], dict(row, status=row['outcome']))
+        # Entre saltos de una misma ejecución gana el envío correcto
+        if row['outcome'] == 'successful' or entry['status'] == 'skipped':
+            entry.update(row, status=row['outcome'])
+        if row.get('backup_job_id'):
+            job_runs[row['backup_job_id']] = (key, row['run_id'])
+
+    for row in tracked:
+        owner = job_runs.get(row.get('backup_job_id'))
+        if owner is None:
+            continue
+        entry = runs[owner[0]][owner[1]]
+        entry['state'] = row.get('state')
+        entry['duration_seconds'] = row.get('duration_seconds')
+        if row.get('state') in FAILED_JOB_STATES:
+            entry['status'] = 'failed'
+            entry['error_code'] = f"job {row['state']}"
+    return runs, names
+
+def failure_streaks(rows, min_streak):
+    runs, names = resource_runs(rows)
+    streaks = []
+    for key, by_run in runs.items():
+        history = sorted(by_run.values(), key=lambda entry: entry['ts'])
+        streak = 0
+        for entry in reversed(history):
+            if entry['status'] != 'failed':
+                break
+            streak += 1
+        if streak >= min_streak:
+            last = history[-1]
+            streaks.append({
+                'resource': names[key],
+                'resource_arn': key,
+                'target': last['target'],
+                'streak': streak,
+                'runs': len(history),
+                'last_run': last['run_id'],
+                'last_error': last.get('error_code')
+            })
+    return sorted(streaks, key=lambda item: (-item['streak'], item['resource']))
+
+def coverage_by_day(days, rows_by_day):
+    report = []
+    seen_total = {}
+    covered_total = set()
+    for day, rows in zip(days, rows_by_day):
+        runs, names = resource_runs(rows)
+        covered = {key for key, by_run in runs.items() if any(e['status'] != 'failed' for e in by_run.values())}
+        seen_total.update(names)
+        covered_total |= covered
+        report.append({
+            'day': day.isoformat(),
+            'resources': len(runs),
+            'covered': len(covered),
+            'coverage': round(len(covered) / len(runs), 4) if runs else None
+        })
+    missing = sorted(name for key, name in seen_total.items() if key not in covered_total)
+    return report, missing
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def latency_by_day(days, rows_by_day):
+    report = []
+    for day, rows in zip(days, rows_by_day):
+        latencies = [row['latency_ms'] for row in rows if row.get('latency_ms') is not None]
+        durations = [
+            row['duration_seconds'] for row in rows
+            if row['outcome'] == 'tracked' and row.get('state') == 'COMPLETED' and row.get('duration_seconds') is not None
+        ]
+        report.append({
+            'day': day.isoformat(),
+            'submissions': len(latencies),
+            'latency_ms_p50': percentile(latencies, 0.5),
+            'latency_ms_p95': percentile(latencies, 0.95),
+            'latency_ms_max': max(latencies) if latencies else None,
+            'jobs': len(durations),
+            'duration_s_p50': percentile(durations, 0.5),
+            'duration_s_p95': percentile(durations, 0.95),
+            'duration_s_max': max(durations) if durations else None
+        })
+    return report
+
+def print_table(rows):
+    if not rows:
+        print('(sin resultados)')
+        return
+    columns = list(rows[0])
+    widths = [max(len(str(column)), *(len(str(row[column])) for row in rows)) for column in columns]
+    print('  '.join(str(column).ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+def main():
+    args = parse_args()
+    lambda_source, store = open_store(args)
+    days = query_days(args)
+
+    def read(day_list):
+        rows = lambda_source.iter_history_rows(store, day_list)
+        return [row for row in rows if not args.target or row.get('target') == args.target]
+
+    if args.command == 'streaks':
+        result = failure_streaks(read(days), args.min_streak)
+        table = result
+    elif args.command == 'coverage':
+        table, missing = coverage_by_day(days, [read([day]) for day in days])
+        result = {'days': table, 'missing': missing} if args.missing else {'days': table}
+    else:
+        result = table = latency_by_day(days, [read([day]) for day in days])
+
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+        return
+    print_table(table)
+    if args.command == 'coverage' and args.missing:
+        print(f"\nSin backup en {len(days)} días ({len(result['missing'])}): {', '.join(result['missing'])}")
+
+if __name__ == '__main__':
+    main()
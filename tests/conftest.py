@@ -0,0 +1,33 @@
+"""
+La configuración de lambda_source se lee del entorno al importarlo: se fija
+aquí, antes de que los tests lo importen. Los tests usan los sustitutos
+locales (directorio de estado, SQLite) y nunca llaman a AWS.
+"""
+import os
+import sys
+import tempfile
+
+os.environ.update(
+    BACKUP_ROLE_ARN='arn:aws:iam::123456789012:role/backup',
+    AWS_DEFAULT_REGION='us-east-1',
+    AWS_ACCESS_KEY_ID='testing',
+    AWS_SECRET_ACCESS_KEY='testing',
+    STATE_BUCKET='',
+    STATE_DIR=tempfile.mkdtemp(prefix='rds-backup-tests-'),
+    RESULT_SINK='none',
+    RUN_HISTORY_ENABLED='false',
+    METRICS_ENABLED='false'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import lambda_source
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    """
+    Directorio de estado propio de cada test (almacén de objetos y SQLite)
+    """
+    monkeypatch.setattr(lambda_source, 'STATE_DIR', str(tmp_path))
+    return tmp_path
@@ -0,0 +1,110 @@
+import pytest
+
+import lambda_source as ls
+
+ARN = 'arn:aws:rds:us-east-1:123456789012'
+
+def instance(identifier, engine='mysql', cluster=None, storage=20):
+    return {
+        'identifier': identifier,
+        'arn': f"{ARN}:db:{identifier}",
+        'engine': engine,
+        'cluster_identifier': cluster,
+        'allocated_storage': storage,
+        'priority': 0
+    }
+
+def cluster(identifier, engine='aurora-mysql'):
+    return {'identifier': identifier, 'arn': f"{ARN}:cluster:{identifier}", 'engine': engine, 'allocated_storage': 1}
+
+FLEET_INSTANCES = [
+    instance('db-standalone'),
+    instance('db-pg', engine='postgres'),
+    # Miembros de un cluster etiquetado
+    instance('aurora-a-1', engine='aurora-mysql', cluster='aurora-a'),
+    instance('aurora-a-2', engine='aurora-mysql', cluster='aurora-a'),
+    # Miembros de un cluster sin etiquetar: se respalda el cluster una vez
+    instance('aurora-b-1', engine='aurora-postgresql', cluster='aurora-b'),
+    instance('aurora-b-2', engine='aurora-postgresql', cluster='aurora-b'),
+    instance('docdb-1', engine='docdb', cluster='docdb-a'),
+]
+FLEET_CLUSTERS = [cluster('aurora-a'), cluster('neptune-a', engine='neptune')]
+
+@pytest.fixture
+def fleet(monkeypatch):
+    monkeypatch.setattr(ls, 'iter_tagged_rds_instances', lambda target: iter(FLEET_INSTANCES))
+    monkeypatch.setattr(ls, 'iter_tagged_aurora_clusters', lambda target: iter(FLEET_CLUSTERS))
+
+def planned(pairs):
+    return sorted((kind, resource['identifier']) for kind, resource in pairs)
+
+def test_members_collapse_into_their_cluster():
+    plan = ls.build_backup_plan(FLEET_INSTANCES, FLEET_CLUSTERS)
+    
+    assert planned(ls.plan_resources(plan)) == [
+        ('Aurora', 'aurora-a'), ('Aurora', 'aurora-b'), ('DocumentDB', 'docdb-a'),
+        ('Neptune', 'neptune-a'), ('RDS', 'db-pg'), ('RDS', 'db-standalone')
+    ]
+    assert plan['collapsed'] == 5
+    assert {'instance': 'aurora-b-2', 'cluster': 'aurora-b'} in plan['collapsed_sample']
+
+def test_iter_backup_plan_matches_build_backup_plan(fleet):
+    counts = dict({kind.lower(): 0 for kind in ls.RESOURCE_DRIVERS}, collapsed=0, collapsed_sample=[])
+    streamed = list(ls.iter_backup_plan(ls.DEFAULT_TARGET, counts=counts))
+    
+    plan = ls.build_backup_plan(FLEET_INSTANCES, FLEET_CLUSTERS)
+    
+    assert planned(streamed) == planned(ls.plan_resources(plan))
+    assert counts['collapsed'] == plan['collapsed']
+    assert sorted(map(str, counts['collapsed_sample'])) == sorted(map(str, plan['collapsed_sample']))
+    for kind in ls.RESOURCE_DRIVERS:
+        assert counts[kind.lower()] == len(plan[kind])
+
+def test_collapsed_sample_is_bounded(monkeypatch):
+    monkeypatch.setattr(ls, 'FAILURE_SAMPLE_SIZE', 3)
+    members = [instance(f"aurora-a-{i}", engine='aurora-mysql', cluster='aurora-a') for i in range(50)]
+    
+    plan = ls.build_backup_plan(members, [cluster('aurora-a')])
+    
+    assert planned(ls.plan_resources(plan)) == [('Aurora', 'aurora-a')]
+    assert plan['collapsed'] == 50
+    assert len(plan['collapsed_sample']) == 3
+
+def test_disabled_resource_types_are_excluded_by_both_planners(fleet, monkeypatch):
+    monkeypatch.setattr(ls, 'ENABLED_RESOURCE_TYPES', ('RDS', 'Aurora'))
+    
+    plan = ls.build_backup_plan(FLEET_INSTANCES, FLEET_CLUSTERS)
+    streamed = list(ls.iter_backup_plan(ls.DEFAULT_TARGET))
+    
+    assert planned(streamed) == planned(ls.plan_resources(plan))
+    assert not plan['DocumentDB'] and not plan['Neptune']
+
+def test_untagged_cluster_is_built_from_its_members():
+    members = [
+        dict(instance('aurora-b-1', engine='aurora-postgresql', cluster='aurora-b'), priority=1),
+        dict(instance('aurora-b-2', engine='aurora-postgresql', cluster='aurora-b'), priority=5)
+    ]
+    
+    plan = ls.build_backup_plan(members, [])
+    
+    assert plan['Aurora'] == [{
+        'arn': f"{ARN}:cluster:aurora-b",
+        'identifier': 'aurora-b',
+        'engine': 'aurora-postgresql',
+        'allocated_storage': 20,
+        'priority': 5
+    }]
+    assert plan['RDS'] == []
+
+def test_tagged_cluster_inherits_the_highest_member_priority():
+    members = [dict(instance('aurora-a-1', engine='aurora-mysql', cluster='aurora-a'), priority=3)]
+    
+    plan = ls.build_backup_plan(members, [cluster('aurora-a')])
+    
+    assert [(c['identifier'], c['priority']) for c in plan['Aurora']] == [('aurora-a', 3)]
+
+def test_resources_are_classified_by_engine():
+    assert ls.driver_for('instance', 'mysql').kind == 'RDS'
+    assert ls.driver_for('cluster', 'aurora-postgresql').kind == 'Aurora'
+    assert ls.driver_for('cluster', 'docdb').kind == 'DocumentDB'
+    assert ls.driver_for('cluster', 'neptune').kind == 'Neptune'
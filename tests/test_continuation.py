@@ -0,0 +1,68 @@
+import json
+
+import lambda_source as ls
+
+def counts(**values):
+    return dict(ls.new_result_counts(), **values)
+
+def test_merge_backup_results_adds_counters_and_keeps_first_hop_plan():
+    previous = counts(successful=3, failed=1, total_processed=4, plan={'rds': 10}, discovery={'source': 'scan'})
+    previous['by_type'] = {'RDS': {'successful': 3, 'failed': 1}}
+    previous['failure_sample'] = [{'resource': 'db-1'}]
+    current = counts(successful=5, skipped=2, total_processed=5, plan={'rds': 6}, discovery={'resumed_from_plan': True})
+    current['by_type'] = {'RDS': {'successful': 5}}
+    
+    merged = ls.merge_backup_results(previous, current)
+    
+    assert (merged['successful'], merged['failed'], merged['skipped'], merged['total_processed']) == (8, 1, 2, 9)
+    assert merged['by_type'] == {'RDS': {'successful': 8, 'failed': 1}}
+    assert merged['failure_sample'] == [{'resource': 'db-1'}]
+    # El plan y el descubrimiento son los del primer salto
+    assert merged['plan'] == {'rds': 10}
+    assert merged['discovery'] == {'source': 'scan'}
+
+def test_merge_backup_results_merges_targets_present_in_either_hop():
+    previous = counts(successful=2, total_processed=2, targets={
+        'us-east-1/a': {'successful': 2, 'failed': 0, 'skipped': 0, 'total_processed': 2, 'plan': {'rds': 4}}
+    })
+    current = counts(successful=3, total_processed=3, targets={
+        'us-east-1/a': {'successful': 2, 'failed': 0, 'skipped': 1, 'total_processed': 2, 'plan': {'rds': 2}},
+        'eu-west-1/a': {'successful': 1, 'failed': 0, 'skipped': 0, 'total_processed': 1}
+    })
+    
+    merged = ls.merge_backup_results(previous, current)
+    
+    assert merged['targets']['us-east-1/a']['successful'] == 4
+    assert merged['targets']['us-east-1/a']['skipped'] == 1
+    assert merged['targets']['us-east-1/a']['plan'] == {'rds': 4}
+    assert merged['targets']['eu-west-1/a']['successful'] == 1
+    assert merged['successful'] == 5
+
+def test_checkpoint_is_claimed_only_once(state_dir):
+    run = ls.new_run()
+    plan = dict(ls.new_plan(), RDS=[{'identifier': 'db-1', 'arn': 'arn:db-1', 'engine': 'mysql'}])
+    
+    continuation = ls.schedule_continuation(run, counts(), [{'target': None, 'plan': plan}], False, 1, None)
+    event = {'mode': 'continue', 'run_id': run['run_id'], 'checkpoint_key': continuation['checkpoint_key']}
+    
+    checkpoint = ls.claim_checkpoint(event)
+    assert checkpoint['run']['hop'] == run['hop'] + 1
+    assert checkpoint['remaining'][0]['plan']['RDS'][0]['identifier'] == 'db-1'
+    # Re-entrega del evento asíncrono
+    assert ls.claim_checkpoint(event) is None
+
+def test_stagger_wait_hops_do_not_use_the_continuation_budget(state_dir, monkeypatch):
+    monkeypatch.setattr(ls, 'MAX_CONTINUATIONS', 2)
+    later = dict(ls.new_plan(), RDS=[{'identifier': 'db-1', 'arn': 'arn:db-1', 'engine': 'mysql', 'not_before': 4e9}])
+    due = dict(ls.new_plan(), RDS=[{'identifier': 'db-1', 'arn': 'arn:db-1', 'engine': 'mysql'}])
+    run = ls.new_run()
+    
+    for _ in range(5):
+        continuation = ls.schedule_continuation(run, counts(), [{'target': None, 'plan': later}], False, 1, None)
+        assert continuation['scheduled']
+        run = json.loads(ls.get_state_store().get(continuation['checkpoint_key']))['run']
+    assert (run['hop'], run['counted_hops']) == (5, 0)
+    
+    assert ls.schedule_continuation(run, counts(), [{'target': None, 'plan': due}], False, 1, None)['scheduled']
+    run = dict(run, hop=run['hop'] + 1, counted_hops=1)
+    assert not ls.schedule_continuation(run, counts(), [{'target': None, 'plan': due}], False, 1, None)['scheduled']
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import lambda_source as ls
+
+START = 1_700_000_000.0
+
+def resource(identifier, storage=1):
+    return {'identifier': identifier, 'arn': f'arn:{identifier}', 'engine': 'mysql', 'allocated_storage': storage}
+
+def model(**seconds):
+    return ls.JobDurationModel({f'arn:{name}': [3, value, value, 0] for name, value in seconds.items()}, default_seconds=60)
+
+def ordered(*identifiers):
+    return [('RDS', resource(identifier)) for identifier in identifiers]
+
+def test_estimate_falls_back_to_size_then_typical_duration():
+    m = ls.JobDurationModel({'arn:db-1': [2, 300.0, 400.0, 0]}, seconds_per_gb=2.0, default_seconds=90.0)
+    
+    assert m.estimate(resource('db-1')) == (300.0, True)
+    assert m.estimate(resource('db-2', storage=100)) == (200.0, False)
+    # Los clusters informan AllocatedStorage = 1
+    assert m.estimate(resource('cluster-1', storage=1)) == (90.0, False)
+    assert ls.JobDurationModel.from_json(m.to_json()).resources == m.resources
+
+def test_makespan_with_submit_rate_and_parallel_jobs():
+    result = ls.simulate_run(ordered('a', 'b', 'c'), model(a=100, b=10, c=10), START, submit_rate=1)
+    
+    # Los jobs salen en t = 0, 1 y 2 y corren en paralelo
+    assert result['makespan_seconds'] == 100
+    assert result['peak_concurrent_jobs'] == 3
+    assert result['with_history'] == 3
+    assert result['estimated_finish'] == datetime.fromtimestamp(START + 100, timezone.utc).isoformat()
+
+def test_ceiling_serialises_jobs_and_longest_first_shortens_the_makespan():
+    durations = model(a=10, b=10, c=100)
+    
+    discovery_order = ls.simulate_run(ordered('a', 'b', 'c'), durations, START, submit_rate=1000, max_in_flight=1)
+    longest_first = ls.simulate_run(ordered('c', 'a', 'b'), durations, START, submit_rate=1000, max_in_flight=2)
+    
+    assert discovery_order['makespan_seconds'] == 120
+    assert discovery_order['peak_concurrent_jobs'] == 1
+    assert longest_first['makespan_seconds'] == 100
+
+def test_not_before_delays_the_start():
+    staggered = [('RDS', dict(resource('a'), not_before=START + 50))]
+    
+    assert ls.simulate_run(staggered, model(a=10), START, submit_rate=1000)['makespan_seconds'] == 60
+
+def test_run_finish_by_is_the_next_occurrence(monkeypatch):
+    monkeypatch.setattr(ls, 'RUN_FINISH_BY_UTC', '06:00')
+    
+    assert ls.run_finish_by(datetime(2026, 1, 1, 5, 0, tzinfo=timezone.utc)) == datetime(2026, 1, 1, 6, 0, tzinfo=timezone.utc)
+    assert ls.run_finish_by(datetime(2026, 1, 1, 7, 0, tzinfo=timezone.utc)) == datetime(2026, 1, 2, 6, 0, tzinfo=timezone.utc)
+
+def test_late_plan_is_reordered_longest_first(monkeypatch):
+    monkeypatch.setattr(ls, 'DURATION_MODEL_MODE', 'reorder')
+    monkeypatch.setattr(ls, 'SCHEDULE_ORDER', 'discovery')
+    monkeypatch.setattr(ls, 'MAX_IN_FLIGHT_JOBS', 2)
+    monkeypatch.setattr(ls, 'BACKUP_SUBMIT_RATE', 1000)
+    # Fin exigido en el pasado: cualquier plan llega tarde
+    monkeypatch.setattr(ls, 'run_finish_by', lambda now=None: datetime(2000, 1, 1, tzinfo=timezone.utc))
+    monkeypatch.setattr(ls, 'load_duration_model', lambda target: model(a=10, b=10, c=100))
+    plan = dict(ls.new_plan(), RDS=[resource('a'), resource('b'), resource('c')])
+    
+    estimate = ls.estimate_target_plan(ls.DEFAULT_TARGET, plan)
+    
+    assert estimate['reordered']
+    assert (estimate['makespan_before_seconds'], estimate['makespan_seconds']) == (110, 100)
+    assert plan['order'] == 'longest_first'
+    assert [r['identifier'] for _, r in ls.order_plan(plan)] == ['c', 'a', 'b']
+    assert estimate['exceeds_deadline']
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.stub import Stubber
+
+import lambda_source as ls
+
+NOW = datetime.now(timezone.utc)
+
+def stubbed_target():
+    client = boto3.client('backup', region_name='us-east-1')
+    return ls.BackupTarget(region='us-east-1', clients={'backup': client}), Stubber(client)
+
+def recovery_point(arn, hours_ago, status='COMPLETED'):
+    return {
+        'RecoveryPointArn': f"arn:aws:backup:us-east-1:123456789012:recovery-point:{arn}-{hours_ago}",
+        'ResourceArn': arn,
+        'CreationDate': NOW - timedelta(hours=hours_ago),
+        'Status': status
+    }
+
+def backup_job(arn, hours_ago, state):
+    return {'BackupJobId': f"job-{arn}-{hours_ago}", 'ResourceArn': arn, 'CreationDate': NOW - timedelta(hours=hours_ago), 'State': state}
+
+def test_index_keeps_the_newest_valid_backup_per_resource():
+    target, stubber = stubbed_target()
+    stubber.add_response('list_recovery_points_by_backup_vault', {'RecoveryPoints': [
+        recovery_point('arn:db-1', 10),
+        recovery_point('arn:db-1', 3),
+        recovery_point('arn:db-2', 1, status='EXPIRED'),
+        recovery_point('arn:db-3', 2, status='DELETING')
+    ]})
+    stubber.add_response('list_backup_jobs', {'BackupJobs': [
+        backup_job('arn:db-2', 2, 'FAILED'),
+        backup_job('arn:db-4', 1, 'RUNNING'),
+        backup_job('arn:db-1', 5, 'COMPLETED')
+    ]})
+    
+    with stubber:
+        index = ls.build_recovery_point_index(target, since=NOW - timedelta(hours=24))
+    
+    assert index == {'arn:db-1': NOW - timedelta(hours=3), 'arn:db-4': NOW - timedelta(hours=1)}
+
+def test_unreadable_vault_skips_nothing():
+    target, stubber = stubbed_target()
+    stubber.add_client_error('list_recovery_points_by_backup_vault', 'AccessDeniedException')
+    
+    with stubber:
+        assert ls.build_recovery_point_index(target, since=NOW) is None
+
+def test_split_fresh_resources():
+    resources = [{'identifier': f'db-{i}', 'arn': f'arn:db-{i}', 'engine': 'mysql'} for i in range(3)]
+    skipped = []
+    
+    pending = ls.split_fresh_resources(resources, {'arn:db-1': NOW}, 'RDS', skipped)
+    
+    assert [r['identifier'] for r in pending] == ['db-0', 'db-2']
+    assert skipped == [{
+        'resource': 'db-1', 'resource_arn': 'arn:db-1', 'type': 'RDS', 'engine': 'mysql',
+        'reason': 'recent_backup', 'last_backup': NOW.isoformat()
+    }]
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import lambda_source as ls
+
+ARN = 'arn:aws:rds:us-east-1:123456789012'
+
+def entry(identifier, kind='db', engine='mysql'):
+    return {'identifier': identifier, 'arn': f"{ARN}:{kind}:{identifier}", 'engine': engine}
+
+@pytest.fixture
+def inventory(state_dir, monkeypatch):
+    monkeypatch.setattr(ls, 'INVENTORY_MODE', 'incremental')
+    monkeypatch.setattr(ls, 'INVENTORY_TABLE', '')
+    ls.reset_discovery_stats()
+    return ls.get_inventory_store()
+
+def seed(store, entries, reconciled_hours_ago):
+    reconciled_at = datetime.now(timezone.utc) - timedelta(hours=reconciled_hours_ago)
+    puts = {e['arn']: e for e in entries}
+    puts[ls.INVENTORY_META_KEY] = {'reconciled_at': reconciled_at.isoformat()}
+    store.write(ls.DEFAULT_TARGET.name, puts)
+
+def scan(monkeypatch, instances, clusters=(), failed=False):
+    def tagged_instances(target):
+        if failed:
+            ls.get_discovery_stats()['errors'] += 1
+        return list(instances)
+    monkeypatch.setattr(ls, 'get_tagged_rds_instances', tagged_instances)
+    monkeypatch.setattr(ls, 'get_tagged_aurora_clusters', lambda target: list(clusters))
+
+def stored(store):
+    items = store.query(ls.DEFAULT_TARGET.name)
+    items.pop(ls.INVENTORY_META_KEY)
+    return sorted(items)
+
+def test_fresh_inventory_is_used_without_scanning(inventory, monkeypatch):
+    seed(inventory, [entry('db-1'), entry('aurora-a', kind='cluster', engine='aurora-mysql')], reconciled_hours_ago=1)
+    monkeypatch.setattr(ls, 'get_tagged_rds_instances', lambda target: pytest.fail('no debería escanear'))
+    
+    instances, clusters, source = ls.discover_tagged_resources(ls.DEFAULT_TARGET)
+    
+    assert source == 'inventory'
+    assert [i['identifier'] for i in instances] == ['db-1']
+    assert [c['identifier'] for c in clusters] == ['aurora-a']
+
+def test_stale_inventory_is_reconciled_with_a_full_scan(inventory, monkeypatch):
+    seed(inventory, [entry('db-1'), entry('db-gone')], reconciled_hours_ago=48)
+    scan(monkeypatch, [entry('db-1'), entry('db-new')])
+    
+    _, _, source = ls.discover_tagged_resources(ls.DEFAULT_TARGET)
+    
+    assert source == 'reconcile'
+    assert stored(inventory) == [entry('db-1')['arn'], entry('db-new')['arn']]
+    meta = inventory.query(ls.DEFAULT_TARGET.name)[ls.INVENTORY_META_KEY]
+    assert ls._inventory_is_fresh(meta)
+
+def test_failed_scan_does_not_delete_from_the_inventory(inventory, monkeypatch):
+    seed(inventory, [entry('db-1'), entry('db-2')], reconciled_hours_ago=48)
+    # Escaneo incompleto: falta db-2 porque una página falló
+    scan(monkeypatch, [entry('db-1')], failed=True)
+    
+    instances, _, source = ls.discover_tagged_resources(ls.DEFAULT_TARGET)
+    
+    assert source == 'scan'
+    assert [i['identifier'] for i in instances] == ['db-1']
+    assert stored(inventory) == [entry('db-1')['arn'], entry('db-2')['arn']]
+    # Sigue caducado: la siguiente ejecución vuelve a escanear
+    assert not ls._inventory_is_fresh(inventory.query(ls.DEFAULT_TARGET.name)[ls.INVENTORY_META_KEY])
+
+def test_force_scan_ignores_a_fresh_inventory(inventory, monkeypatch):
+    seed(inventory, [entry('db-1')], reconciled_hours_ago=1)
+    scan(monkeypatch, [entry('db-2')])
+    
+    _, _, source = ls.discover_tagged_resources(ls.DEFAULT_TARGET, force_scan=True)
+    
+    assert source == 'reconcile'
+    assert stored(inventory) == [entry('db-2')['arn']]
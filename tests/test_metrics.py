@@ -0,0 +1,42 @@
+import json
+import time
+
+import lambda_source as ls
+
+def emitted(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+def assert_valid_emf(entry):
+    directive = entry['_aws']['CloudWatchMetrics'][0]
+    for dimension_set in directive['Dimensions']:
+        for dimension in dimension_set:
+            assert isinstance(entry[dimension], str)
+    for metric in directive['Metrics']:
+        value = entry[metric['Name']]
+        # EMF solo admite un número o una lista de como mucho 100 números
+        if isinstance(value, list):
+            assert 0 < len(value) <= 100
+            assert all(isinstance(v, (int, float)) for v in value)
+        else:
+            assert isinstance(value, (int, float))
+
+def test_emit_writes_raw_latencies_split_in_valid_records(monkeypatch, capsys):
+    monkeypatch.setattr(ls, 'METRICS_ENABLED', True)
+    metrics = ls.ApiMetrics()
+    for _ in range(250):
+        metrics._record({'metrics_operation': 'backup.StartBackupJob', 'metrics_started': time.monotonic()}, False, 0, 0)
+    with metrics.phase('submission'):
+        pass
+    
+    metrics.emit({'run_id': 'run-1'})
+    
+    entries = emitted(capsys)
+    for entry in entries:
+        assert_valid_emf(entry)
+    operations = [entry for entry in entries if entry.get('Operation') == 'backup.StartBackupJob']
+    assert [len(entry['ApiLatency']) for entry in operations] == [100, 100, 50]
+    # Los contadores solo van en el primer registro para no sumarlos dos veces
+    assert operations[0]['ApiCalls'] == 250
+    assert all('ApiCalls' not in entry for entry in operations[1:])
+    assert all(entry['run_id'] == 'run-1' for entry in entries)
+    assert [entry['Phase'] for entry in entries if 'Phase' in entry] == ['submission']
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import lambda_source as ls
+
+def resource(i):
+    return {'identifier': f'db-{i}', 'arn': f'arn:db-{i}', 'engine': 'mysql'}
+
+def submitted(driver, resource, target=None, run_timestamp=None):
+    return {
+        'success': True, 'resource': resource['identifier'], 'type': driver.kind,
+        'engine': resource['engine'], 'backup_job_id': f"job-{resource['identifier']}"
+    }
+
+@pytest.fixture
+def fleet(monkeypatch):
+    """
+    Descubrimiento simulado: genera `size` instancias con `delay` segundos
+    por recurso y falla tras `fail_after` si se indica
+    """
+    produced = []
+    config = {'size': 10, 'delay': 0.0, 'fail_after': None}
+    
+    def iter_backup_plan(target, index=None, counts=None):
+        for i in range(config['size']):
+            if config['fail_after'] is not None and i == config['fail_after']:
+                raise RuntimeError('discovery failed')
+            time.sleep(config['delay'])
+            produced.append(i)
+            yield 'RDS', resource(i)
+    
+    monkeypatch.setattr(ls, 'iter_backup_plan', iter_backup_plan)
+    monkeypatch.setattr(ls, 'create_backup', submitted)
+    monkeypatch.setattr(ls, 'BACKUP_SUBMIT_RATE', 1000)
+    monkeypatch.setattr(ls, 'DISCOVERY_QUEUE_SIZE', 10)
+    config['produced'] = produced
+    return config
+
+def test_deadline_stops_the_producer(fleet):
+    fleet.update(size=100000, delay=0.001)
+    started = time.monotonic()
+    
+    results = ls.run_pipelined_backup(ls.DEFAULT_TARGET, deadline=started + 0.3)
+    
+    # El productor no sigue paginando la cuenta tras el deadline
+    assert time.monotonic() - started < 3
+    assert len(fleet['produced']) < 5000
+    assert results['discovery']['complete'] is False
+    remaining = results['remaining']
+    seen = remaining['resume_discovery']['seen']
+    assert results['successful'] + len(remaining['RDS']) == len(seen) <= len(fleet['produced'])
+
+def test_complete_discovery_leaves_no_resume_marker(fleet):
+    results = ls.run_pipelined_backup(ls.DEFAULT_TARGET, deadline=time.monotonic() + 10)
+    
+    assert results['successful'] == 10
+    assert 'remaining' not in results
+    assert 'complete' not in results['discovery']
+    # El pipeline no consulta la caché de descubrimiento
+    assert 'cache' not in results['discovery']
+
+def test_producer_error_resumes_discovery_in_the_continuation(fleet):
+    fleet.update(fail_after=4)
+    
+    results = ls.run_pipelined_backup(ls.DEFAULT_TARGET, deadline=time.monotonic() + 10)
+    
+    assert results['successful'] == 4
+    assert results['discovery']['error'] == 'discovery failed'
+    assert results['remaining']['resume_discovery']['seen'] == [f'arn:db-{i}' for i in range(4)]
+    
+    # La continuación solo añade lo que el salto anterior no vio
+    fleet.update(fail_after=None)
+    plan = dict(ls.new_plan(), RDS=[resource(4)], resume_discovery={'seen': ['arn:db-0', 'arn:db-1']})
+    resumed = ls.new_target_results(plan, {'resumed_from_plan': True})
+    ls.resume_discovery(ls.DEFAULT_TARGET, plan, resumed)
+    
+    assert [r['identifier'] for r in plan['RDS']] == ['db-4'] + [f'db-{i}' for i in (2, 3, 5, 6, 7, 8, 9)]
+    assert resumed['discovery']['added'] == 7
+    assert 'resume_discovery' not in plan
@@ -0,0 +1,51 @@
+import time
+
+import lambda_source as ls
+
+def test_throttle_halves_the_rate_once_per_cooldown():
+    limiter = ls.AdaptiveRateLimiter(8, cooldown=60)
+    
+    limiter.on_throttle()
+    # Una ráfaga de workers throttled no desploma la tasa
+    limiter.on_throttle()
+    limiter.on_throttle()
+    
+    assert limiter.rate == 4
+    assert limiter.stats() == {'initial_rate': 8.0, 'final_rate': 4.0, 'throttled': 3}
+
+def test_throttle_never_goes_below_min_rate():
+    limiter = ls.AdaptiveRateLimiter(2, min_rate=0.5, cooldown=0)
+    
+    for _ in range(5):
+        limiter.on_throttle()
+    
+    assert limiter.rate == 0.5
+
+def test_successes_recover_the_rate_additively_up_to_max():
+    limiter = ls.AdaptiveRateLimiter(10, recovery_successes=3, cooldown=0)
+    limiter.on_throttle()
+    
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.rate == 6
+    
+    # Un throttling reinicia la racha de éxitos
+    limiter.on_success()
+    limiter.on_success()
+    limiter.on_throttle()
+    limiter.on_success()
+    assert limiter.rate == 3
+    
+    for _ in range(3 * 100):
+        limiter.on_success()
+    assert limiter.rate == limiter.max_rate == 20
+
+def test_acquire_waits_for_tokens():
+    limiter = ls.AdaptiveRateLimiter(20)
+    started = time.monotonic()
+    
+    for _ in range(30):
+        limiter.acquire()
+    
+    # 20 tokens iniciales y 10 más a 20 por segundo
+    assert 0.4 <= time.monotonic() - started < 1.5
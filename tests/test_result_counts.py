@@ -0,0 +1,70 @@
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+import lambda_source as ls
+
+def failure(i, error_code='ThrottlingException'):
+    return {'resource': f'db-{i}', 'type': 'RDS', 'engine': 'mysql', 'error_code': error_code, 'attempts': 4}
+
+def test_counters_grow_but_the_failure_sample_is_bounded(monkeypatch):
+    monkeypatch.setattr(ls, 'FAILURE_SAMPLE_SIZE', 2)
+    results = ls.new_result_counts()
+    
+    for i in range(5):
+        ls.record_outcome(results, 'failed', failure(i))
+    ls.record_outcome(results, 'successful', {'resource': 'db-9', 'type': 'RDS', 'engine': 'mysql', 'attempts': 1})
+    ls.record_outcome(results, 'skipped', {'resource': 'db-10', 'type': 'RDS', 'engine': 'mysql'})
+    
+    assert (results['failed'], results['successful'], results['skipped'], results['total_processed']) == (5, 1, 1, 6)
+    assert results['by_type'] == {'RDS': {'failed': 5, 'successful': 1, 'skipped': 1}}
+    assert results['by_error_code'] == {'ThrottlingException': 5}
+    assert results['by_attempts'] == {'4': 5, '1': 1}
+    assert [r['resource'] for r in results['failure_sample']] == ['db-0', 'db-1']
+
+def test_merge_keeps_the_failure_sample_bounded(monkeypatch):
+    monkeypatch.setattr(ls, 'FAILURE_SAMPLE_SIZE', 3)
+    first, second = ls.new_result_counts(), ls.new_result_counts()
+    for i in range(2):
+        ls.record_outcome(first, 'failed', failure(i))
+    for i in range(2, 5):
+        ls.record_outcome(second, 'failed', failure(i, 'AccessDeniedException'))
+    
+    merged = ls.merge_result_counts(first, second)
+    
+    assert merged['failed'] == 5
+    assert merged['by_error_code'] == {'ThrottlingException': 2, 'AccessDeniedException': 3}
+    assert [r['resource'] for r in merged['failure_sample']] == ['db-0', 'db-1', 'db-2']
+
+def test_store_sink_writes_batches_of_jsonl(state_dir, monkeypatch):
+    monkeypatch.setattr(ls, 'RESULT_SINK', 'store')
+    monkeypatch.setattr(ls, 'RESULT_SINK_BATCH', 2)
+    sink = ls.ResultRecordSink()
+    sink.open('results/test', 'run-1')
+    
+    for i in range(5):
+        sink.write({'resource': f'db-{i}', 'outcome': 'successful'})
+    info = sink.close()
+    
+    directory = state_dir / 'results' / 'test'
+    assert info == {'sink': 'store', 'location': os.path.join(str(state_dir), 'results', 'test')}
+    assert sorted(os.listdir(directory)) == [f'run-1-part-{i:04d}.jsonl' for i in range(3)]
+    lines = [json.loads(line) for part in sorted(directory.iterdir()) for line in part.read_text().splitlines()]
+    assert [line['resource'] for line in lines] == [f'db-{i}' for i in range(5)]
+
+class FailingStore:
+    def put(self, key, body, if_absent=False):
+        raise ClientError({'Error': {'Code': 'SlowDown', 'Message': 'slow down'}}, 'PutObject')
+
+def test_store_errors_drop_the_batch_but_not_the_run(monkeypatch):
+    monkeypatch.setattr(ls, 'RESULT_SINK', 'store')
+    monkeypatch.setattr(ls, 'RESULT_SINK_BATCH', 2)
+    monkeypatch.setattr(ls, 'get_state_store', lambda: FailingStore())
+    sink = ls.ResultRecordSink()
+    sink.open('results/test', 'run-1')
+    
+    for i in range(3):
+        sink.write({'resource': f'db-{i}'})
+    
+    assert sink.close()['dropped'] == 3
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import lambda_source as ls
+
+NOW = datetime(2026, 1, 31, tzinfo=timezone.utc)
+
+def point(age_days, lifecycle=None, status='COMPLETED'):
+    return {
+        'RecoveryPointArn': 'arn:aws:backup:us-east-1:123456789012:recovery-point:rp-1',
+        'CreationDate': NOW - timedelta(days=age_days),
+        'Lifecycle': lifecycle or {},
+        'Status': status
+    }
+
+def test_expired_points_are_kept_unless_deletion_is_enabled(monkeypatch):
+    monkeypatch.setattr(ls, 'RETENTION_DAYS', 5)
+    
+    assert ls.RETENTION_DELETE_EXPIRED is False
+    assert ls.retention_action(point(6, {'DeleteAfterDays': 30}), NOW) == ('keep', None)
+    
+    monkeypatch.setattr(ls, 'RETENTION_DELETE_EXPIRED', True)
+    assert ls.retention_action(point(6, {'DeleteAfterDays': 30}), NOW) == ('delete', None)
+
+def test_update_keeps_move_to_cold_storage(monkeypatch):
+    monkeypatch.setattr(ls, 'RETENTION_DAYS', 120)
+    lifecycle = {'MoveToColdStorageAfterDays': 10, 'DeleteAfterDays': 365}
+    
+    action, updated = ls.retention_action(point(2, lifecycle), NOW)
+    
+    assert action == 'update'
+    assert updated == {'MoveToColdStorageAfterDays': 10, 'DeleteAfterDays': 120}
+    assert lifecycle['DeleteAfterDays'] == 365
+
+def test_compliant_and_non_actionable_points_are_left_alone(monkeypatch):
+    monkeypatch.setattr(ls, 'RETENTION_DAYS', 5)
+    monkeypatch.setattr(ls, 'RETENTION_DELETE_EXPIRED', True)
+    
+    assert ls.retention_action(point(1, {'DeleteAfterDays': 5}), NOW) == (None, None)
+    assert ls.retention_action(point(30, status='DELETING'), NOW) == (None, None)
@@ -0,0 +1,121 @@
+import json
+import time
+
+from botocore.awsrequest import AWSResponse
+
+import lambda_source as ls
+
+def fast_queue(**kwargs):
+    kwargs.setdefault('base_seconds', 0.01)
+    kwargs.setdefault('deferred_seconds', 0.02)
+    return ls.RetryQueue(**kwargs)
+
+class FlakyBackup:
+    """
+    Función de backup que falla con `error_code` las primeras `failures` veces por recurso
+    """
+    
+    def __init__(self, failures, error_code='ThrottlingException'):
+        self.failures = failures
+        self.error_code = error_code
+        self.calls = {}
+    
+    def __call__(self, resource):
+        calls = self.calls[resource] = self.calls.get(resource, 0) + 1
+        if calls <= self.failures:
+            return {'success': False, 'resource': resource, 'error_code': self.error_code}
+        return {'success': True, 'resource': resource, 'backup_job_id': f"job-{resource}"}
+
+def run_stream(backup_fn, resources, retry_queue, deadline=None):
+    limiter = ls.AdaptiveRateLimiter(1000)
+    jobs = [(backup_fn, resource) for resource in resources]
+    return list(ls.stream_backups(jobs, limiter, max_workers=4, deadline=deadline, retry_queue=retry_queue))
+
+def test_classify_error():
+    assert ls.classify_error('ThrottlingException') == 'retryable'
+    assert ls.classify_error('LimitExceededException') == 'deferred'
+    assert ls.classify_error('AccessDeniedException') == 'fatal'
+
+def test_retryable_failures_are_retried_until_success():
+    backup_fn = FlakyBackup(failures=2)
+    retry_queue = fast_queue(max_attempts=4, budget=100)
+    
+    results = run_stream(backup_fn, ['a', 'b', 'c'], retry_queue)
+    
+    assert sorted(result['resource'] for _, _, result in results) == ['a', 'b', 'c']
+    assert all(result['success'] and result['attempts'] == 3 for _, _, result in results)
+    assert retry_queue.stats()['retried'] == 6
+    assert retry_queue.stats()['by_class'] == {'retryable': 6}
+
+def test_fatal_errors_are_not_retried():
+    backup_fn = FlakyBackup(failures=1, error_code='AccessDeniedException')
+    retry_queue = fast_queue()
+    
+    (_, _, result), = run_stream(backup_fn, ['a'], retry_queue)
+    
+    assert not result['success']
+    assert (result['attempts'], result['error_class']) == (1, 'fatal')
+    assert retry_queue.stats()['retried'] == 0
+
+def test_max_attempts_per_resource():
+    retry_queue = fast_queue(max_attempts=3, budget=100)
+    
+    (_, _, result), = run_stream(FlakyBackup(failures=10), ['a'], retry_queue)
+    
+    assert not result['success'] and result['attempts'] == 3
+    assert retry_queue.stats()['max_attempts_reached'] == 1
+
+def test_retry_budget_is_shared_by_all_resources():
+    retry_queue = fast_queue(max_attempts=10, budget=3)
+    
+    results = run_stream(FlakyBackup(failures=10), ['a', 'b', 'c', 'd'], retry_queue)
+    
+    assert len(results) == 4 and not any(result['success'] for _, _, result in results)
+    assert sum(result['attempts'] for _, _, result in results) == 4 + 3
+    assert retry_queue.stats()['retried'] == 3
+    assert retry_queue.stats()['budget_exhausted'] == 4
+
+def test_pending_retries_are_drained_at_the_deadline():
+    # Backoff aplazado muy largo: el reintento no cabe antes del deadline
+    retry_queue = fast_queue(deferred_seconds=60)
+    backup_fn = FlakyBackup(failures=1, error_code='LimitExceededException')
+    
+    results = run_stream(backup_fn, ['a', 'b'], retry_queue, deadline=time.monotonic() + 1)
+    
+    # Los recursos vuelven sin resultado, para la continuación
+    assert sorted(job[1] for _, job, result in results if result is None) == ['a', 'b']
+    assert retry_queue.stats()['left_for_continuation'] == 2
+    assert len(retry_queue) == 0
+
+def test_jobs_after_the_deadline_are_returned_unsent():
+    backup_fn = FlakyBackup(failures=0)
+    
+    results = run_stream(backup_fn, ['a', 'b'], fast_queue(), deadline=time.monotonic() - 1)
+    
+    assert [result for _, _, result in results] == [None, None]
+    assert backup_fn.calls == {}
+
+class ThrottledBody:
+    def stream(self, **kwargs):
+        yield json.dumps({'__type': 'ThrottlingException', 'message': 'Rate exceeded'}).encode('utf-8')
+
+def test_submit_client_makes_a_single_http_attempt():
+    sent = []
+    
+    def throttle(request, **kwargs):
+        sent.append(request.url)
+        return AWSResponse(request.url, 400, {'x-amzn-ErrorType': 'ThrottlingException'}, ThrottledBody())
+    
+    client = ls.DEFAULT_TARGET.client('backup', ls.SUBMIT_CLIENT_CONFIG)
+    client.meta.events.register('before-send.backup.StartBackupJob', throttle)
+    try:
+        result = ls.create_backup(
+            ls.RESOURCE_DRIVERS['RDS'],
+            {'identifier': 'db-1', 'arn': 'arn:aws:rds:us-east-1:123456789012:db:db-1', 'engine': 'mysql'}
+        )
+    finally:
+        client.meta.events.unregister('before-send.backup.StartBackupJob', throttle)
+    
+    # El throttling vuelve al limitador y a la cola en el primer intento
+    assert result['error_code'] == 'ThrottlingException'
+    assert len(sent) == 1
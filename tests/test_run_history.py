@@ -0,0 +1,67 @@
+from datetime import date
+
+import run_history
+
+def row(run_id, resource, outcome, **fields):
+    return dict(
+        run_id=run_id, ts=f"2026-01-0{run_id[-1]}T02:00:00", target='us-east-1/local',
+        resource=resource, resource_arn=f'arn:{resource}', outcome=outcome, **fields
+    )
+
+def test_streaks_count_trailing_failures_only():
+    rows = [
+        row('run-1', 'db-1', 'failed', error_code='ThrottlingException'),
+        row('run-2', 'db-1', 'successful'),
+        row('run-3', 'db-1', 'failed', error_code='ThrottlingException'),
+        row('run-4', 'db-1', 'failed', error_code='AccessDeniedException'),
+        row('run-3', 'db-2', 'failed'),
+        row('run-4', 'db-2', 'successful')
+    ]
+    
+    streaks = run_history.failure_streaks(rows, min_streak=2)
+    
+    assert streaks == [{
+        'resource': 'db-1', 'resource_arn': 'arn:db-1', 'target': 'us-east-1/local', 'streak': 2,
+        'runs': 4, 'last_run': 'run-4', 'last_error': 'AccessDeniedException'
+    }]
+
+def test_successful_hop_wins_within_a_run_and_tracking_corrects_it():
+    rows = [
+        # Dos saltos de la misma ejecución: el envío correcto gana
+        row('run-1', 'db-1', 'failed', error_code='ThrottlingException'),
+        row('run-1', 'db-1', 'successful', backup_job_id='job-1'),
+        row('run-2', 'db-1', 'successful', backup_job_id='job-2'),
+        # El seguimiento descubre que el job de run-2 falló
+        dict(row('run-9', 'db-1', 'tracked', backup_job_id='job-2'), state='FAILED')
+    ]
+    
+    runs, _ = run_history.resource_runs(rows)
+    
+    assert runs['arn:db-1']['run-1']['status'] == 'successful'
+    assert runs['arn:db-1']['run-2']['status'] == 'failed'
+    assert runs['arn:db-1']['run-2']['error_code'] == 'job FAILED'
+    assert 'run-9' not in runs['arn:db-1']
+    assert run_history.failure_streaks(rows, min_streak=1)[0]['streak'] == 1
+
+def test_coverage_by_day_and_missing_resources():
+    days = [date(2026, 1, 1), date(2026, 1, 2)]
+    rows_by_day = [
+        [row('run-1', 'db-1', 'successful'), row('run-1', 'db-2', 'failed'), row('run-1', 'db-3', 'skipped')],
+        [row('run-2', 'db-1', 'failed'), row('run-2', 'db-2', 'failed')]
+    ]
+    
+    report, missing = run_history.coverage_by_day(days, rows_by_day)
+    
+    assert report == [
+        {'day': '2026-01-01', 'resources': 3, 'covered': 2, 'coverage': 0.6667},
+        {'day': '2026-01-02', 'resources': 2, 'covered': 0, 'coverage': 0.0}
+    ]
+    assert missing == ['db-2']
+
+def test_percentile_and_empty_days():
+    assert run_history.percentile([5, 1, 3, 2, 4], 0.5) == 3
+    assert run_history.percentile([5, 1, 3, 2, 4], 0.95) == 5
+    assert run_history.percentile([], 0.5) is None
+    
+    [report] = run_history.latency_by_day([date(2026, 1, 1)], [[]])
+    assert report['submissions'] == 0 and report['latency_ms_p50'] is None
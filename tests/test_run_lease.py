@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import lambda_source as ls
+
+@pytest.fixture
+def leases(state_dir):
+    """
+    Crea RunLease independientes (una por invocación simulada) sobre el
+    mismo SQLite y las cierra al terminar
+    """
+    created = []
+    
+    def new_lease():
+        lease = ls.RunLease()
+        created.append(lease)
+        return lease
+    
+    yield new_lease
+    for lease in created:
+        lease.close()
+
+def resource(identifier):
+    return {'identifier': identifier, 'arn': f"arn:aws:rds:us-east-1:123456789012:db:{identifier}", 'engine': 'mysql'}
+
+def expire(pk, sk):
+    """
+    Adelanta la caducidad de una entrada como si su dueño hubiera muerto
+    """
+    store = ls.get_lease_store()
+    with store._transaction() as connection:
+        connection.execute('UPDATE lease SET expires_at = ? WHERE pk = ? AND sk = ?', (time.time() - 1, pk, sk))
+
+def test_second_invocation_sees_the_lease_held(leases):
+    run = ls.new_run()
+    assert leases().acquire(run) == ('acquired', run)
+    
+    status, holder = leases().acquire(ls.new_run())
+    
+    assert status == 'held'
+    assert holder['run_id'] == run['run_id']
+
+def test_continuation_hop_reacquires_its_own_lease(leases):
+    run = ls.new_run()
+    first = leases()
+    first.acquire(run)
+    first.close()
+    
+    status, _ = leases().acquire(dict(run, hop=1))
+    
+    assert status == 'acquired'
+
+def test_released_lease_can_be_taken_by_a_new_run(leases):
+    first = leases()
+    first.acquire(ls.new_run())
+    first.close(release=True)
+    
+    assert leases().acquire(ls.new_run())[0] == 'acquired'
+
+def test_expired_lease_of_a_recent_run_is_resumed(leases):
+    run = ls.new_run()
+    leases().acquire(run)
+    expire('lease', ls.RUN_LEASE_NAME)
+    
+    status, resumed = leases().acquire(ls.new_run())
+    
+    assert status == 'resumed'
+    assert (resumed['run_id'], resumed['run_timestamp'], resumed['hop']) == (run['run_id'], run['run_timestamp'], 1)
+
+def test_expired_lease_of_an_old_run_starts_a_new_run(leases, monkeypatch):
+    monkeypatch.setattr(ls, 'RUN_LEASE_RESUME_HOURS', 0)
+    leases().acquire(ls.new_run())
+    expire('lease', ls.RUN_LEASE_NAME)
+    run = ls.new_run()
+    
+    assert leases().acquire(run) == ('acquired', run)
+
+def test_ledger_claim_submission_and_release(leases):
+    run = ls.new_run()
+    holder, joiner = leases(), leases()
+    holder.acquire(run)
+    joiner.join(run)
+    db = resource('db-1')
+    
+    assert holder.claim(db) is None
+    assert joiner.claim(db)['state'] == 'claimed'
+    
+    holder.record_submission(db, 'job-1')
+    entry = joiner.claim(db)
+    assert (entry['state'], entry['data']['backup_job_id']) == ('submitted', 'job-1')
+    
+    # Un envío fallido libera la reclamación para reintentarlo en otra invocación
+    other = resource('db-2')
+    assert holder.claim(other) is None
+    holder.release_claim(other)
+    assert joiner.claim(other) is None
+
+def test_expired_claim_is_stolen_but_a_submission_is_not(leases):
+    run = ls.new_run()
+    dead, alive = leases(), leases()
+    dead.join(run)
+    alive.join(run)
+    claimed, submitted = resource('db-1'), resource('db-2')
+    dead.claim(claimed)
+    dead.claim(submitted)
+    dead.record_submission(submitted, 'job-2')
+    ledger = f"ledger#{run['run_id']}"
+    expire(ledger, claimed['arn'])
+    expire(ledger, submitted['arn'])
+    
+    assert alive.claim(claimed) is None
+    assert alive.claim(submitted)['state'] == 'submitted'
+
+def test_concurrent_invocations_claim_each_resource_once(leases):
+    run = ls.new_run()
+    resources = [resource(f"db-{i}") for i in range(60)]
+    invocations = [leases() for _ in range(6)]
+    won = {id(lease): [] for lease in invocations}
+    
+    def claim_all(lease):
+        lease.join(run)
+        won[id(lease)] = [r['identifier'] for r in resources if lease.claim(r) is None]
+    
+    threads = [threading.Thread(target=claim_all, args=(lease,)) for lease in invocations]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    claimed = [identifier for identifiers in won.values() for identifier in identifiers]
+    assert sorted(claimed) == sorted(r['identifier'] for r in resources)
+
+def test_ledger_errors_become_a_retryable_failure(monkeypatch):
+    def unavailable(resource):
+        raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}}, 'PutItem')
+    monkeypatch.setattr(ls.RUN_LEASE, 'claim', unavailable)
+    
+    result = ls.create_backup(ls.RESOURCE_DRIVERS['RDS'], resource('db-1'), run_timestamp='20260101-000000')
+    
+    assert not result['success']
+    assert result['error_code'] == 'LedgerUnavailable'
+    assert ls.classify_error(result['error_code']) == 'retryable'
+
+def test_handler_exits_when_the_lease_holder_cannot_be_read(state_dir, monkeypatch):
+    monkeypatch.setattr(ls, 'RUN_LEASE_ENABLED', True)
+    monkeypatch.setattr(ls.RUN_LEASE, 'acquire', lambda run: ('held', None))
+    
+    response = ls.lambda_handler({}, None)
+    
+    assert response['statusCode'] == 200
+    assert 'Run already in progress' in response['body']
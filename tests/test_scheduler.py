@@ -0,0 +1,110 @@
+import json
+import time
+
+import lambda_source as ls
+
+
+class FakeVault:
+    """
+    Destino cuyo vault lista como activos (RUNNING) los jobs de 'running'
+    """
+    
+    name = 'test'
+    
+    def __init__(self, running=()):
+        self.running = list(running)
+        self.polls = 0
+    
+    def client(self, service, config=None):
+        return self
+    
+    def get_paginator(self, operation):
+        return self
+    
+    def paginate(self, **params):
+        if params['ByState'] == 'RUNNING':
+            self.polls += 1
+            yield {'BackupJobs': [{'BackupJobId': job_id} for job_id in self.running]}
+        else:
+            yield {'BackupJobs': []}
+
+
+def submitted(job_id):
+    return {'success': True, 'backup_job_id': job_id}
+
+
+def test_vault_pinned_at_ceiling_blocks_until_deadline():
+    vault = FakeVault(running=['other-1', 'other-2'])
+    scheduler = ls.SubmissionScheduler(vault, max_in_flight=2, poll_interval=0.05)
+    
+    assert not scheduler.admit({}, deadline=time.monotonic() + 0.2)
+    assert scheduler.ceiling_blocked
+    assert scheduler.stats()['ceiling_blocked']
+    assert vault.polls >= 2
+
+
+def test_admitted_jobs_count_until_a_poll_lists_them():
+    vault = FakeVault(running=['other-1'])
+    scheduler = ls.SubmissionScheduler(vault, max_in_flight=3, poll_interval=0.05)
+    
+    # Cada admisión sondea de nuevo y el listado no muestra los enviados
+    for job_id in ('job-1', 'job-2'):
+        assert scheduler.admit({}, deadline=time.monotonic() + 1)
+        scheduler.release(submitted(job_id))
+        time.sleep(0.06)
+    assert not scheduler.admit({}, deadline=time.monotonic() + 0.03)
+    assert scheduler.peak_in_flight == 3
+    
+    # Cuando el listado los muestra dejan de contarse aparte
+    vault.running = ['job-1']
+    time.sleep(0.06)
+    assert scheduler.admit({}, deadline=time.monotonic() + 1)
+    assert scheduler.unlisted == {'job-2': 1}
+
+
+def test_failed_or_skipped_submissions_free_their_slot():
+    scheduler = ls.SubmissionScheduler(FakeVault(), max_in_flight=1, poll_interval=1e-9)
+    
+    assert scheduler.admit({}, deadline=time.monotonic() + 1)
+    scheduler.release({'success': False, 'error_code': 'InvalidParameterValueException'})
+    assert scheduler.admit({}, deadline=time.monotonic() + 1)
+    scheduler.release({'success': True, 'skipped': True})
+    assert scheduler.admit({}, deadline=time.monotonic() + 1)
+    assert scheduler.in_flight() == 1
+
+
+def test_ceiling_blocked_hops_do_not_use_the_continuation_budget(state_dir, monkeypatch):
+    monkeypatch.setattr(ls, 'MAX_CONTINUATIONS', 2)
+    resources = [{'identifier': 'db-1', 'arn': 'arn:db-1', 'engine': 'mysql'}]
+    blocked = dict(ls.new_plan(), RDS=resources, ceiling_blocked=True)
+    run = ls.new_run()
+    
+    # Ni siquiera un salto sin envíos detiene la continuación
+    for _ in range(4):
+        continuation = ls.schedule_continuation(run, {}, [{'target': None, 'plan': blocked}], False, 0, None)
+        assert continuation['scheduled']
+        run = json.loads(ls.get_state_store().get(continuation['checkpoint_key']))['run']
+    assert (run['hop'], run['counted_hops']) == (4, 0)
+    
+    # Pasado RUN_LEASE_RESUME_HOURS el salto bloqueado se trata como agotado
+    monkeypatch.setattr(ls, 'RUN_LEASE_RESUME_HOURS', 0)
+    assert not ls.schedule_continuation(run, {}, [{'target': None, 'plan': blocked}], False, 0, None)['scheduled']
+
+
+def test_submit_target_jobs_marks_ceiling_blocked_remaining(monkeypatch):
+    monkeypatch.setattr(ls, 'MAX_IN_FLIGHT_JOBS', 1)
+    monkeypatch.setattr(ls, 'SCHEDULE_POLL_SECONDS', 0.05)
+    vault = FakeVault(running=['other-1'])
+    driver = ls.RESOURCE_DRIVERS['RDS']
+    
+    def backup(driver, resource):
+        raise AssertionError('no debería enviarse nada con el vault en el techo')
+    
+    jobs = [(ls.partial(backup, driver), {'identifier': f'db-{i}', 'arn': f'arn:db-{i}'}) for i in range(3)]
+    results = ls.new_result_counts()
+    
+    results = ls.submit_target_jobs(vault, jobs, results, deadline=time.monotonic() + 0.2)
+    
+    assert results['remaining']['ceiling_blocked']
+    assert len(results['remaining']['RDS']) == 3
+    assert results['submission']['schedule']['ceiling_blocked']
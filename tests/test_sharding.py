@@ -0,0 +1,73 @@
+import lambda_source as ls
+
+def resources(prefix, count):
+    return [{'identifier': f'{prefix}-{i}', 'arn': f'arn:{prefix}-{i}', 'engine': 'mysql'} for i in range(count)]
+
+def plan_of(rds=(), aurora=()):
+    return dict(ls.new_plan(), RDS=list(rds), Aurora=list(aurora))
+
+def identifiers(plan):
+    return [resource['identifier'] for _, resource in ls.plan_resources(plan)]
+
+def test_shards_never_mix_targets_and_respect_the_size():
+    east, west = ls.BackupTarget(region='us-east-1'), ls.BackupTarget(region='us-west-2')
+    east_plan = dict(plan_of(resources('db', 5), resources('aurora', 2)), order='largest_first')
+    
+    shards = ls.build_shards([(east, east_plan), (west, plan_of(resources('west', 2)))], 3)
+    
+    assert [(target, identifiers(plan)) for target, plan in shards] == [
+        (east, ['db-0', 'db-1', 'db-2']),
+        (east, ['db-3', 'db-4', 'aurora-0']),
+        (east, ['aurora-1']),
+        (west, ['west-0', 'west-1'])
+    ]
+    # El orden elegido viaja con cada shard
+    assert all(plan['order'] == 'largest_first' for target, plan in shards[:3])
+
+class FakeDispatcher:
+    """
+    Devuelve para cada shard el resultado que indica `outcomes` por su primer recurso
+    """
+    
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+    
+    def dispatch(self, payloads):
+        results = []
+        for payload in payloads:
+            first = payload['plan']['RDS'][0]['identifier']
+            results.append(self.outcomes[first](payload['plan']))
+        return results
+
+def submitted(plan):
+    results = ls.new_result_counts()
+    for kind, resource in ls.plan_resources(plan):
+        ls.record_outcome(results, 'successful', {'resource': resource['identifier'], 'type': kind, 'engine': 'mysql'})
+    results['submission'] = {'throttled': 1, 'retries': {'retried': 2}}
+    return results
+
+def partially_submitted(plan):
+    results = submitted(dict(plan, RDS=plan['RDS'][:1]))
+    results['remaining'] = dict(plan, RDS=plan['RDS'][1:])
+    return results
+
+def test_coordinator_merges_shard_results_and_requeues_failures(monkeypatch):
+    plan = plan_of(resources('db', 6))
+    monkeypatch.setattr(ls, 'SHARD_SIZE', 2)
+    monkeypatch.setattr(ls, 'discover_target_plan', lambda target, force_scan=False: (ls.new_target_results(plan, {}), plan))
+    monkeypatch.setattr(ls, 'get_shard_dispatcher', lambda context: FakeDispatcher({
+        'db-0': submitted,
+        'db-2': lambda plan: {'error': 'worker timed out'},
+        'db-4': partially_submitted
+    }))
+    
+    results = ls.run_coordinator([ls.DEFAULT_TARGET], False, 'run-1')
+    
+    assert results['successful'] == results['total_processed'] == 3
+    assert results['by_type'] == {'RDS': {'successful': 3}}
+    assert results['submission'] == {'shards': 3, 'throttled': 2, 'retried': 4}
+    assert results['sharding']['worker_errors'] == [{'target': ls.DEFAULT_TARGET.name, 'error': 'worker timed out'}]
+    # El shard fallido y lo que no dio tiempo a enviar vuelven a la continuación
+    [entry] = results['remaining']
+    assert entry['target'] is None
+    assert identifiers(entry['plan']) == ['db-2', 'db-3', 'db-5']
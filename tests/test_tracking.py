@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+import lambda_source as ls
+
+class FailingVault:
+    """
+    Destino cuyo list_backup_jobs devuelve `pages` en los primeros sondeos
+    y después falla
+    """
+    
+    name = 'test'
+    
+    def __init__(self, pages=()):
+        self.pages = list(pages)
+    
+    def client(self, service, config=None):
+        return self
+    
+    def get_paginator(self, operation):
+        return self
+    
+    def paginate(self, **filters):
+        if not self.pages:
+            raise ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}}, 'ListBackupJobs')
+        yield {'BackupJobs': self.pages.pop(0)}
+
+def job(job_id, state):
+    created = datetime.now(timezone.utc)
+    return {'BackupJobId': job_id, 'State': state, 'CreationDate': created, 'ResourceArn': f"arn:{job_id}"}
+
+def test_poll_error_stops_tracking_with_last_known_state():
+    vault = FailingVault(pages=[[job('job-1', 'COMPLETED'), job('job-2', 'RUNNING')]])
+    tracker = ls.BackupJobTracker(vault, since=datetime.now(timezone.utc), job_ids=['job-1', 'job-2'])
+    
+    tracker.wait(time.monotonic() + 5, interval=0.01)
+    
+    summary = tracker.summary()
+    assert summary['error'] == '[AccessDeniedException] denied'
+    assert summary['pending'] == 1
+    assert summary['counts'] == {'COMPLETED': 1, 'RUNNING': 1}
+
+def test_tracking_error_does_not_fail_the_submission():
+    def backup(driver, resource):
+        return {'success': True, 'resource': resource['identifier'], 'type': 'RDS', 'engine': 'mysql', 'backup_job_id': f"job-{resource['identifier']}"}
+    
+    driver = ls.RESOURCE_DRIVERS['RDS']
+    jobs = [(ls.partial(backup, driver), {'identifier': f'db-{i}', 'arn': f'arn:db-{i}'}) for i in range(2)]
+    results = ls.new_result_counts()
+    
+    results = ls.submit_target_jobs(FailingVault(), jobs, results, track_until=time.monotonic() + 5)
+    
+    assert results['successful'] == 2
+    assert results['tracking']['error'] == '[AccessDeniedException] denied'
+    assert results['tracking']['pending'] == 2
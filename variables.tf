@@ -46,6 +46,316 @@ variable "backup_tag_value" {
   default     = "True"
 }
 
+variable "discovery_strategy" {
+  description = "Estrategia de descubrimiento de tags: inline (TagList de describe), tagging_api (Resource Groups Tagging API) o per_resource"
+  type        = string
+  default     = "inline"
+
+  validation {
+    condition     = contains(["inline", "tagging_api", "per_resource"], var.discovery_strategy)
+    error_message = "discovery_strategy debe ser inline, tagging_api o per_resource."
+  }
+}
+
+variable "backup_max_workers" {
+  description = "Número máximo de threads que envían backup jobs en paralelo"
+  type        = number
+  default     = 8
+}
+
+variable "backup_submit_rate" {
+  description = "Tasa inicial de llamadas start_backup_job por segundo (se ajusta ante throttling)"
+  type        = number
+  default     = 5
+}
+
+variable "target_regions" {
+  description = "Regiones donde descubrir y respaldar en paralelo (vacío = solo la región de la Lambda)"
+  type        = list(string)
+  default     = []
+}
+
+variable "target_role_arns" {
+  description = "Roles a asumir en otras cuentas para el fan-out ('local' = cuenta de la Lambda)"
+  type        = list(string)
+  default     = []
+}
+
+variable "min_backup_interval_hours" {
+  description = "Omitir recursos con un backup más reciente que estas horas en el vault (0 = desactivado)"
+  type        = number
+  default     = 0
+}
+
+variable "backup_resource_types" {
+  description = "Tipos de recurso a respaldar (RDS, Aurora, DocumentDB, Neptune)"
+  type        = list(string)
+  default     = ["RDS", "Aurora", "DocumentDB", "Neptune"]
+
+  validation {
+    condition     = alltrue([for t in var.backup_resource_types : contains(["RDS", "Aurora", "DocumentDB", "Neptune"], t)])
+    error_message = "backup_resource_types solo admite RDS, Aurora, DocumentDB y Neptune."
+  }
+}
+
+variable "dry_run" {
+  description = "Si es true, la Lambda solo registra el plan de backup sin iniciar jobs"
+  type        = bool
+  default     = false
+}
+
+variable "track_jobs_seconds" {
+  description = "Segundos que la Lambda sigue los jobs iniciados antes de terminar (0 = no seguir)"
+  type        = number
+  default     = 0
+}
+
+variable "tracking_schedule" {
+  description = "Expresión cron para una ejecución de seguimiento de jobs separada (vacío = desactivada)"
+  type        = string
+  default     = ""
+}
+
+variable "max_continuations" {
+  description = "Número máximo de auto-invocaciones encadenadas cuando una ejecución se queda sin tiempo"
+  type        = number
+  default     = 10
+}
+
+variable "coordinator_mode" {
+  description = "Si es true, la ejecución programada descubre una vez y reparte el plan en shards entre invocaciones worker"
+  type        = bool
+  default     = false
+}
+
+variable "shard_size" {
+  description = "Número máximo de recursos por shard en modo coordinador"
+  type        = number
+  default     = 200
+}
+
+variable "boto_retry_mode" {
+  description = "Modo de reintentos de botocore para los clientes de la Lambda (legacy, standard o adaptive)"
+  type        = string
+  default     = "adaptive"
+}
+
+variable "boto_max_attempts" {
+  description = "Intentos máximos por llamada API de botocore"
+  type        = number
+  default     = 5
+}
+
+variable "boto_submit_max_attempts" {
+  description = "Intentos HTTP totales de start_backup_job en botocore, incluida la llamada inicial (modo standard, 1 = sin reintentos de SDK); los reintentos los hacen el limitador adaptativo y la cola de reintentos"
+  type        = number
+  default     = 1
+}
+
+variable "boto_connect_timeout" {
+  description = "Timeout de conexión de los clientes AWS (segundos)"
+  type        = number
+  default     = 5
+}
+
+variable "boto_read_timeout" {
+  description = "Timeout de lectura de los clientes AWS (segundos)"
+  type        = number
+  default     = 30
+}
+
+variable "metrics_enabled" {
+  description = "Emitir métricas por operación API y por fase en CloudWatch Embedded Metric Format"
+  type        = bool
+  default     = true
+}
+
+variable "metrics_namespace" {
+  description = "Namespace de CloudWatch de las métricas EMF"
+  type        = string
+  default     = "RDSBackupAutomation"
+}
+
+variable "schedule_order" {
+  description = "Orden de envío de los backups: discovery, largest_first (menor makespan), smallest_first (más recursos respaldados) o longest_first (duración estimada por el modelo histórico)"
+  type        = string
+  default     = "discovery"
+
+  validation {
+    condition     = contains(["discovery", "largest_first", "smallest_first", "longest_first"], var.schedule_order)
+    error_message = "schedule_order debe ser discovery, largest_first, smallest_first o longest_first."
+  }
+}
+
+variable "schedule_window_minutes" {
+  description = "Ventana en minutos en la que se escalonan los envíos (0 = todos a la vez); cada 14 minutos de ventana es una invocación de continuación en espera"
+  type        = number
+  default     = 0
+}
+
+variable "max_in_flight_jobs" {
+  description = "Máximo de backup jobs activos (CREATED/PENDING/RUNNING) en el vault (0 = sin techo)"
+  type        = number
+  default     = 0
+}
+
+variable "backup_priority_tag_key" {
+  description = "Tag con la prioridad de envío de cada recurso (entero, mayor primero)"
+  type        = string
+  default     = "BackupPriority"
+}
+
+variable "retry_max_attempts" {
+  description = "Intentos máximos de start_backup_job por recurso ante errores reintentables o aplazados"
+  type        = number
+  default     = 4
+}
+
+variable "retry_budget" {
+  description = "Reintentos totales de start_backup_job por destino y ejecución"
+  type        = number
+  default     = 200
+}
+
+variable "result_sink" {
+  description = "Destino del registro por recurso en JSON Lines: log (CloudWatch Logs), store (bucket de estado) o none"
+  type        = string
+  default     = "log"
+
+  validation {
+    condition     = contains(["log", "store", "none"], var.result_sink)
+    error_message = "result_sink debe ser log, store o none."
+  }
+}
+
+variable "result_retention_days" {
+  description = "Días que se conservan los registros por recurso (results/) en el bucket de estado"
+  type        = number
+  default     = 30
+}
+
+variable "inventory_mode" {
+  description = "Descubrimiento: off (escaneo completo en cada ejecución) o incremental (inventario DynamoDB mantenido por eventos)"
+  type        = string
+  default     = "off"
+
+  validation {
+    condition     = contains(["off", "incremental"], var.inventory_mode)
+    error_message = "inventory_mode debe ser off o incremental."
+  }
+}
+
+variable "inventory_reconcile_hours" {
+  description = "Horas tras las que el inventario incremental se reconcilia con un escaneo completo"
+  type        = number
+  default     = 24
+}
+
+variable "discovery_cache_ttl_seconds" {
+  description = "Segundos que un contenedor caliente reutiliza los recursos descubiertos (0 = sin caché)"
+  type        = number
+  default     = 300
+}
+
+variable "discovery_cache_max_entries" {
+  description = "Entradas máximas (destino y tipo de recurso) de la caché de descubrimiento"
+  type        = number
+  default     = 16
+}
+
+variable "discovery_pipeline" {
+  description = "Enviar backups mientras el descubrimiento sigue paginando (orden de descubrimiento, sin ventana ni inventario)"
+  type        = bool
+  default     = false
+}
+
+variable "discovery_queue_size" {
+  description = "Recursos descubiertos que pueden esperar en la cola del pipeline"
+  type        = number
+  default     = 100
+}
+
+variable "retention_schedule" {
+  description = "Expresión de EventBridge para aplicar la retención a los recovery points existentes (vacío = sin programar)"
+  type        = string
+  default     = ""
+}
+
+variable "retention_action_rate" {
+  description = "Cambios de ciclo de vida o borrados de recovery points por segundo en el modo retention"
+  type        = number
+  default     = 10
+}
+
+variable "retention_delete_expired" {
+  description = "Borrar en el modo retention los recovery points que ya superan retention_days (opt-in; sin él se conservan)"
+  type        = bool
+  default     = false
+}
+
+variable "duration_model_mode" {
+  description = "Estimación del makespan con el historial de jobs: off, warn (avisa si pasa de run_finish_by_utc) o reorder (además reordena)"
+  type        = string
+  default     = "off"
+
+  validation {
+    condition     = contains(["off", "warn", "reorder"], var.duration_model_mode)
+    error_message = "duration_model_mode debe ser off, warn o reorder."
+  }
+}
+
+variable "duration_model_lookback_days" {
+  description = "Días de historial de list_backup_jobs con los que se aprende el modelo de duración"
+  type        = number
+  default     = 14
+}
+
+variable "run_finish_by_utc" {
+  description = "Hora UTC (HH:MM) a la que deben haber terminado los backup jobs de la ejecución (vacío = sin límite)"
+  type        = string
+  default     = ""
+
+  validation {
+    condition     = var.run_finish_by_utc == "" || can(regex("^([01][0-9]|2[0-3]):[0-5][0-9]$", var.run_finish_by_utc))
+    error_message = "run_finish_by_utc debe tener el formato HH:MM."
+  }
+}
+
+variable "run_history_enabled" {
+  description = "Escribir el historial comprimido por recurso de cada ejecución (history/dt=YYYY-MM-DD/) en el bucket de estado"
+  type        = bool
+  default     = true
+}
+
+variable "history_retention_days" {
+  description = "Días que se conserva el historial de ejecuciones (history/) en el bucket de estado"
+  type        = number
+  default     = 400
+}
+
+variable "run_lease_enabled" {
+  description = "Coordinar invocaciones solapadas con un lease de ejecución y un registro de envíos por recurso en DynamoDB"
+  type        = bool
+  default     = false
+}
+
+variable "run_lease_ttl_seconds" {
+  description = "Segundos de validez del lease sin latido; se renueva cada TTL/3 y caduca si la invocación muere"
+  type        = number
+  default     = 120
+}
+
+variable "run_lease_conflict" {
+  description = "Qué hace una invocación que encuentra el lease ocupado: exit (salir) o join (enviar lo pendiente de la ejecución en curso)"
+  type        = string
+  default     = "exit"
+
+  validation {
+    condition     = contains(["exit", "join"], var.run_lease_conflict)
+    error_message = "run_lease_conflict debe ser exit o join."
+  }
+}
+
 variable "tags" {
   description = "Tags comunes para todos los recursos"
   type        = map(string)